@@ -0,0 +1,142 @@
+"""
+Microbenchmark for repository row decoding.
+
+Compares the validating decoders (full pydantic validation, and for
+characters the map_flattened_fields validator) with the trusted-row fast
+path the repositories use, and prints rows/sec for each.
+
+Usage (from the repo root):
+    python scripts/benchmarks/row_decoding.py [--messages 20000] [--characters 2000]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from src.core.configs import DatabaseConfig  # noqa: E402
+from src.core.models.character import Character  # noqa: E402
+from src.core.models.message import Message, MessageType  # noqa: E402
+from src.infrastructure.database.connection import DatabaseConnection  # noqa: E402
+from src.infrastructure.database.repositories import (  # noqa: E402
+    CharacterRepository,
+    MessageRepository,
+)
+
+BOOL_COLUMNS = {"is_builtin", "segmenter_enable", "typo_enable", "recall_enable"}
+
+
+def validated_message(row) -> Message:
+    metadata = json.loads(row["metadata"]) if row["metadata"] else {}
+    return Message(
+        id=row["id"],
+        session_id=row["session_id"],
+        sender_id=row["sender_id"],
+        type=MessageType(row["type"]),
+        content=row["content"],
+        metadata=metadata,
+        is_recalled=bool(row["is_recalled"]),
+        is_read=bool(row["is_read"]),
+        timestamp=row["timestamp"],
+    )
+
+
+def validated_character(row) -> Character:
+    data = dict(row)
+    data["sticker_packs"] = json.loads(data["sticker_packs"]) if data["sticker_packs"] else []
+    for column in BOOL_COLUMNS:
+        data[column] = bool(data[column])
+    for column in ("created_at", "updated_at"):
+        data[column] = datetime.fromisoformat(data[column]) if data[column] else None
+    return Character(**data)
+
+
+def seed_messages(conn: DatabaseConnection, messages: int):
+    with conn.transaction() as db:
+        db.executemany(
+            """
+            INSERT INTO messages (id, session_id, sender_id, type, content, metadata, timestamp)
+            VALUES (?, 'bench', ?, 'text', ?, ?, ?)
+            """,
+            [
+                (
+                    f"msg-{i}",
+                    "user" if i % 2 else "assistant",
+                    f"message body {i} " * 4,
+                    json.dumps({"segment": i % 5}),
+                    float(i),
+                )
+                for i in range(messages)
+            ],
+        )
+
+
+async def seed_characters(conn: DatabaseConnection, characters: int):
+    repo = CharacterRepository(conn)
+    for i in range(characters):
+        await repo.create(
+            Character(
+                id=f"char-{i}",
+                name=f"Character {i}",
+                avatar="",
+                persona="persona " * 20,
+                sticker_packs=["general"],
+            )
+        )
+
+
+def fetch(conn: DatabaseConnection, table: str):
+    with conn.get_connection() as db:
+        return db.execute(f"SELECT * FROM {table}").fetchall()
+
+
+def measure(decode, rows, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for row in rows:
+            decode(row)
+        best = min(best, time.perf_counter() - started)
+    return len(rows) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--characters", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = DatabaseConnection(
+            os.path.join(tmp, "bench.db"), DatabaseConfig(maintenance_enabled=False)
+        )
+        seed_messages(conn, args.messages)
+        asyncio.run(seed_characters(conn, args.characters))
+        message_rows = fetch(conn, "messages")
+        character_rows = fetch(conn, "characters")
+
+        message_repo = MessageRepository(conn)
+        character_repo = CharacterRepository(conn)
+        cases = [
+            ("Message", message_rows, validated_message, message_repo._row_to_message),
+            ("Character", character_rows, validated_character, character_repo._row_to_character),
+        ]
+
+        print(f"{'model':<10} {'rows':>7} {'validated rows/s':>18} {'fast path rows/s':>18} {'speedup':>8}")
+        for name, rows, slow, fast in cases:
+            before = measure(slow, rows, args.repeat)
+            after = measure(fast, rows, args.repeat)
+            print(f"{name:<10} {len(rows):>7} {before:>18,.0f} {after:>18,.0f} {after / before:>7.1f}x")
+
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,35 @@
 from functools import lru_cache
+from src.infrastructure.database.backup import DatabaseBackup
 from src.infrastructure.database.connection import DatabaseConnection
+from src.infrastructure.database.export import MessageExporter
+from src.infrastructure.database.maintenance import DatabaseMaintenance
 from src.infrastructure.database.repositories import (
     MessageRepository,
+    ShardedMessageRepository,
     CharacterRepository,
     SessionRepository,
-    ConfigRepository
+    ConfigRepository,
+    SessionStateRepository,
+)
+from src.infrastructure.memory import (
+    MemoryStore,
+    MemoryMessageRepository,
+    MemoryCharacterRepository,
+    MemorySessionRepository,
+    MemoryConfigRepository,
+    MemorySessionStateRepository,
 )
 from src.services.messaging.message_service import MessageService
 from src.services.character.character_service import CharacterService
 from src.services.configurations.config_service import ConfigService
 from src.core.configs import database_config
+from src.core.interfaces.repositories import (
+    IMessageRepository,
+    ICharacterRepository,
+    ISessionRepository,
+    IConfigRepository,
+    ISessionStateRepository,
+)
 
 
 # Database connection singleton
@@ -18,32 +38,91 @@ def get_db_connection() -> DatabaseConnection:
     return DatabaseConnection(database_config.path)
 
 
+@lru_cache()
+def get_memory_store() -> MemoryStore:
+    """Shared store for DB_BACKEND=memory."""
+    return MemoryStore()
+
+
+def use_memory_backend() -> bool:
+    """DB_BACKEND=memory: no SQLite file is opened and its /api/db/* tools are off."""
+    return database_config.backend == "memory"
+
+
+@lru_cache()
+def get_db_maintenance() -> DatabaseMaintenance:
+    return DatabaseMaintenance(get_db_connection())
+
+
+@lru_cache()
+def get_db_backup() -> DatabaseBackup:
+    return DatabaseBackup(get_db_connection())
+
+
+@lru_cache()
+def get_message_exporter() -> MessageExporter:
+    return MessageExporter(get_db_connection())
+
+
+async def close_db_connection() -> None:
+    """Flush buffered writes and close pooled connections, if ever opened."""
+    if get_db_maintenance.cache_info().currsize:
+        await get_db_maintenance().stop()
+        get_db_maintenance.cache_clear()
+    if get_db_backup.cache_info().currsize:
+        await get_db_backup().stop()
+        get_db_backup.cache_clear()
+    if get_db_connection.cache_info().currsize:
+        conn = get_db_connection()
+        await conn.drain()
+        conn.close()
+        get_db_connection.cache_clear()
+
+
 # Repository dependencies
-def get_message_repository() -> MessageRepository:
+def get_message_repository() -> IMessageRepository:
+    if use_memory_backend():
+        return MemoryMessageRepository(get_memory_store())
     conn = get_db_connection()
+    if conn.message_shards:
+        return ShardedMessageRepository(conn.message_shards)
     return MessageRepository(conn)
 
 
-def get_character_repository() -> CharacterRepository:
+def get_character_repository() -> ICharacterRepository:
+    if use_memory_backend():
+        return MemoryCharacterRepository(get_memory_store())
     conn = get_db_connection()
     return CharacterRepository(conn)
 
 
-def get_session_repository() -> SessionRepository:
+def get_session_repository() -> ISessionRepository:
+    if use_memory_backend():
+        return MemorySessionRepository(get_memory_store())
     conn = get_db_connection()
     return SessionRepository(conn)
 
 
-def get_config_repository() -> ConfigRepository:
+def get_config_repository() -> IConfigRepository:
+    if use_memory_backend():
+        return MemoryConfigRepository(get_memory_store())
     conn = get_db_connection()
     return ConfigRepository(conn)
 
 
+def get_session_state_repository() -> ISessionStateRepository:
+    if use_memory_backend():
+        return MemorySessionStateRepository(get_memory_store())
+    conn = get_db_connection()
+    return SessionStateRepository(conn)
+
+
 # Service dependencies
 @lru_cache()
 def get_message_service() -> MessageService:
     message_repo = get_message_repository()
-    return MessageService(message_repo)
+    state_repo = get_session_state_repository()
+    return MessageService(message_repo, state_repo)
 
 
 @lru_cache()
@@ -6,16 +6,23 @@ from pydantic import BaseModel
 from typing import Optional, Dict, Any, List, get_args, get_origin
 from pydantic_core import PydanticUndefined
 from src.infrastructure.database.connection import DatabaseConnection
+from src.api.dependencies import (
+    get_db_backup,
+    get_db_connection,
+    get_db_maintenance,
+    get_message_exporter,
+    get_message_repository,
+    get_character_repository,
+    get_session_repository,
+    get_config_repository,
+    get_session_state_repository,
+    use_memory_backend,
+)
 from src.services.character.character_service import CharacterService
 from src.services.configurations.config_service import ConfigService
 from src.services.messaging.message_service import MessageService
-from src.infrastructure.database.repositories import (
-    MessageRepository,
-    CharacterRepository,
-    SessionRepository,
-    ConfigRepository,
-)
-from src.core.configs import database_config
+from src.core.interfaces.repositories import ISessionRepository
+from src.core.configs import websocket_config
 from src.core.models.constants import DEFAULT_USER_ID
 from src.core.models.character import Character
 from src.utils.url_utils import sanitize_base_url
@@ -48,24 +55,26 @@ db_connection: Optional[DatabaseConnection] = None
 character_service: Optional[CharacterService] = None
 config_service: Optional[ConfigService] = None
 message_service: Optional[MessageService] = None
-session_repo: Optional[SessionRepository] = None
+session_repo: Optional[ISessionRepository] = None
 
 
 async def initialize_services():
     global db_connection, character_service, config_service, message_service, session_repo
 
-    if db_connection is None:
+    if message_service is None:
         try:
-            db_connection = DatabaseConnection(database_config.path)
+            if not use_memory_backend():
+                db_connection = get_db_connection()
 
             # Create repositories
-            message_repo = MessageRepository(db_connection)
-            character_repo = CharacterRepository(db_connection)
-            session_repo = SessionRepository(db_connection)
-            config_repo = ConfigRepository(db_connection)
+            message_repo = get_message_repository()
+            character_repo = get_character_repository()
+            session_repo = get_session_repository()
+            config_repo = get_config_repository()
+            state_repo = get_session_state_repository()
 
             # Create services
-            message_service = MessageService(message_repo)
+            message_service = MessageService(message_repo, state_repo)
             config_service = ConfigService(config_repo)
             character_service = CharacterService(
                 character_repo, session_repo, message_service, config_service
@@ -108,6 +117,10 @@ class AvatarUpdate(BaseModel):
     avatar: Optional[str] = None
 
 
+class BranchCreate(BaseModel):
+    at_seq: Optional[int] = None
+
+
 def _pydantic_field_default(field) -> Any:
     if field.default is not PydanticUndefined:
         return field.default
@@ -384,7 +397,12 @@ async def delete_character(character_id: str):
 async def get_sessions():
     await initialize_services()
     sessions = await session_repo.get_all()
-    return {"sessions": [sess.model_dump() for sess in sessions]}
+    # Branches are listed per session, under /sessions/{id}/branches.
+    return {
+        "sessions": [
+            sess.model_dump() for sess in sessions if sess.parent_session_id is None
+        ]
+    }
 
 
 @router.get("/sessions/active")
@@ -407,15 +425,74 @@ async def activate_session(session_id: str):
     return {"success": True}
 
 
+@router.get("/sessions/{session_id}/branches")
+async def get_session_branches(session_id: str):
+    await initialize_services()
+    branches = await character_service.get_branches(session_id)
+    return {"branches": [branch.model_dump() for branch in branches]}
+
+
+@router.post("/sessions/{session_id}/branches")
+async def create_session_branch(session_id: str, data: BranchCreate):
+    """
+    Fork a session after message `at_seq` (default: its newest message).
+    The branch shares the parent's messages up to there without copying
+    them; messages sent to it afterwards are stored on the branch only.
+    """
+    await initialize_services()
+    try:
+        branch = await character_service.fork_session(session_id, data.at_seq)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not branch:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"session": branch.model_dump()}
+
+
+@router.delete("/sessions/{session_id}")
+async def delete_session_branch(session_id: str):
+    """Delete a branch session; root sessions go with their character."""
+    await initialize_services()
+    success = await character_service.delete_branch(session_id)
+    if not success:
+        raise HTTPException(status_code=404, detail="Branch not found")
+    return {"success": True}
+
+
 @router.get("/sessions/{session_id}/messages")
-async def get_session_messages(session_id: str, after: float = 0):
+async def get_session_messages(
+    session_id: str,
+    after: Optional[float] = None,
+    before: Optional[float] = None,
+    limit: Optional[int] = None,
+    after_seq: Optional[int] = None,
+    before_seq: Optional[int] = None,
+):
     """
-    Incremental message sync over HTTP.
-    Returns all messages with timestamp > after.
+    Paginated message sync over HTTP.
+    With `after_seq` (or `after`), returns the oldest page of messages with
+    seq > after_seq (timestamp > after); otherwise the newest page with
+    seq < before_seq (timestamp < before, for older clients), or the latest
+    page.
     """
     await initialize_services()
-    messages = await message_service.get_messages(session_id, after)
+    limit = max(
+        1,
+        min(
+            limit or websocket_config.history_page_size,
+            websocket_config.history_max_page_size,
+        ),
+    )
+    messages, has_more = await message_service.get_message_page(
+        session_id,
+        limit=limit,
+        before_timestamp=before,
+        after_timestamp=after,
+        after_seq=after_seq,
+        before_seq=before_seq,
+    )
     return {
+        "has_more": has_more,
         "messages": [
             {
                 "id": msg.id,
@@ -427,12 +504,110 @@ async def get_session_messages(session_id: str, after: float = 0):
                 "is_recalled": msg.is_recalled,
                 "is_read": msg.is_read,
                 "timestamp": msg.timestamp,
+                "seq": msg.seq,
             }
             for msg in messages
         ]
     }
 
 
+@router.get("/sessions/{session_id}/changes")
+async def get_session_changes(
+    session_id: str,
+    after: int = 0,
+    limit: Optional[int] = None,
+):
+    """
+    Delta sync over HTTP: messages inserted or updated and ids deleted since
+    change cursor `after`. If `reset` is true the cursor is too old and the
+    client should reload via /messages.
+    """
+    await initialize_services()
+    limit = max(
+        1,
+        min(
+            limit or websocket_config.history_page_size,
+            websocket_config.history_max_page_size,
+        ),
+    )
+    changes = await message_service.get_message_changes(session_id, after, limit)
+    return {
+        "cursor": changes.cursor,
+        "has_more": changes.has_more,
+        "reset": changes.reset,
+        "deleted_ids": changes.deleted_ids,
+        "messages": [
+            {
+                "id": msg.id,
+                "session_id": msg.session_id,
+                "sender_id": msg.sender_id,
+                "type": msg.type,
+                "content": msg.content,
+                "metadata": msg.metadata,
+                "is_recalled": msg.is_recalled,
+                "is_read": msg.is_read,
+                "timestamp": msg.timestamp,
+                "seq": msg.seq,
+            }
+            for msg in changes.messages
+        ]
+    }
+
+
+@router.get("/sessions/{session_id}/stats")
+async def get_session_stats(session_id: str, days: int = 30):
+    """
+    Message, sticker, recall and emotion counts for a session, read from the
+    rollup tables rather than by scanning its messages. `days` limits the
+    per-day breakdown to the most recent days.
+    """
+    await initialize_services()
+    stats = await message_service.get_session_stats(session_id, max(0, min(days, 366)))
+    return stats.model_dump()
+
+
+@router.get("/sessions/{session_id}/search")
+async def search_session_messages(
+    session_id: str,
+    q: str,
+    before: Optional[float] = None,
+    limit: Optional[int] = None,
+):
+    """
+    Full-text search over a session's text messages, newest first.
+    Pass the timestamp of the last hit as `before` to get the next page.
+    """
+    await initialize_services()
+    limit = max(
+        1,
+        min(
+            limit or websocket_config.history_page_size,
+            websocket_config.history_max_page_size,
+        ),
+    )
+    messages, has_more = await message_service.search_messages(
+        session_id, q, limit=limit, before_timestamp=before
+    )
+    return {
+        "has_more": has_more,
+        "messages": [
+            {
+                "id": msg.id,
+                "session_id": msg.session_id,
+                "sender_id": msg.sender_id,
+                "type": msg.type,
+                "content": msg.content,
+                "metadata": msg.metadata,
+                "is_recalled": msg.is_recalled,
+                "is_read": msg.is_read,
+                "timestamp": msg.timestamp,
+                "seq": msg.seq,
+            }
+            for msg in messages
+        ],
+    }
+
+
 @router.get("/config")
 async def get_config():
     await initialize_services()
@@ -462,6 +637,92 @@ async def get_hash():
     return {"hash": hash_value}
 
 
+def _require_sqlite():
+    """The /db/* tools only exist for the SQLite backend."""
+    if use_memory_backend():
+        raise HTTPException(status_code=404, detail="Not available with DB_BACKEND=memory")
+
+
+@router.get("/db/stats")
+async def get_db_stats():
+    """Connection pool and executor statistics for the shared database."""
+    _require_sqlite()
+    await initialize_services()
+    return {"stats": db_connection.stats()}
+
+
+@router.get("/db/profile")
+async def get_db_profile():
+    """Per-statement latency, row counts and queries per user turn (DB_PROFILE_QUERIES)."""
+    _require_sqlite()
+    await initialize_services()
+    return {"profile": db_connection.profile()}
+
+
+@router.get("/db/profile/plans")
+async def get_db_query_plans():
+    """EXPLAIN QUERY PLAN of every profiled statement, full table scans first."""
+    _require_sqlite()
+    await initialize_services()
+    return {"plans": await db_connection.explain_queries()}
+
+
+@router.get("/db/compression")
+async def get_db_compression():
+    """Space used and saved by compressed metadata and avatar columns."""
+    _require_sqlite()
+    await initialize_services()
+    return {"compression": await db_connection.compression_report()}
+
+
+@router.get("/db/maintenance")
+async def get_db_maintenance_stats():
+    """Counters and last report of the background maintenance job."""
+    _require_sqlite()
+    return {"maintenance": get_db_maintenance().stats()}
+
+
+@router.post("/db/maintenance")
+async def run_db_maintenance():
+    """Run a maintenance pass now, including VACUUM/ANALYZE."""
+    _require_sqlite()
+    report = await get_db_maintenance().run_once(force=True)
+    return {"report": report}
+
+
+@router.get("/db/backup")
+async def get_db_backup_stats():
+    """Backup sets on disk, progress of a running backup and the last report."""
+    _require_sqlite()
+    return {"backup": get_db_backup().stats()}
+
+
+@router.post("/db/backup")
+async def run_db_backup():
+    """Take an online backup of every database file now."""
+    _require_sqlite()
+    report = await get_db_backup().run_once()
+    return {"report": report}
+
+
+@router.get("/db/export")
+async def get_db_export_stats():
+    """Whether Parquet export is available and the last export report."""
+    _require_sqlite()
+    return {"export": get_message_exporter().stats()}
+
+
+@router.post("/db/export")
+async def run_db_export():
+    """Export all messages to partitioned Parquet files under export_dir."""
+    _require_sqlite()
+    try:
+        report = await get_message_exporter().export()
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"report": report}
+
+
 @router.get("/avatar")
 async def get_user_avatar(user_id: str = DEFAULT_USER_ID):
     await initialize_services()
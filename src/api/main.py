@@ -10,7 +10,7 @@ from src.core.utils.logger import (
     configure_unified_logging,
     get_uvicorn_log_config,
 )
-from src.core.configs import app_config, websocket_config
+from src.core.configs import app_config, websocket_config, database_config
 
 logger = logging.getLogger(__name__)
 
@@ -25,13 +25,22 @@ async def lifespan(app: FastAPI):
     """Manage application lifecycle: startup and shutdown events"""
     # Startup
     logger.info("Application starting up...")
+    from src.api.dependencies import use_memory_backend
+    if database_config.maintenance_enabled and not use_memory_backend():
+        from src.api.dependencies import get_db_maintenance
+        get_db_maintenance().start()
+    if database_config.backup_enabled and not use_memory_backend():
+        from src.api.dependencies import get_db_backup
+        get_db_backup().start()
     yield
     # Shutdown
     logger.info("Application shutting down...")
     try:
         # Import here to avoid circular dependencies
         from src.api.websocket_session import cleanup_resources
+        from src.api.dependencies import close_db_connection
         await cleanup_resources()
+        await close_db_connection()
         logger.info("Application shutdown complete")
     except Exception as e:
         logger.error(f"Error during shutdown cleanup: {e}", exc_info=True)
@@ -2,11 +2,14 @@ from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from typing import Optional, Dict, Any
 
 from src.infrastructure.database.connection import DatabaseConnection
-from src.infrastructure.database.repositories import (
-    MessageRepository,
-    CharacterRepository,
-    SessionRepository,
-    ConfigRepository,
+from src.api.dependencies import (
+    get_db_connection,
+    get_message_repository,
+    get_character_repository,
+    get_session_repository,
+    get_config_repository,
+    get_session_state_repository,
+    use_memory_backend,
 )
 from src.services.messaging.message_service import MessageService
 from src.services.character.character_service import CharacterService
@@ -17,7 +20,6 @@ from src.core.utils.logger import (
     broadcast_log_if_needed,
     LogCategory,
 )
-from src.core.configs import database_config
 
 router = APIRouter()
 
@@ -31,16 +33,17 @@ ws_manager: Optional[WebSocketManager] = None
 async def initialize_services():
     global conn_mgr, message_service, character_service, config_service, ws_manager
 
-    if conn_mgr is None:
-        conn_mgr = DatabaseConnection(database_config.path)
+    if conn_mgr is None and not use_memory_backend():
+        conn_mgr = get_db_connection()
 
-    message_repo = MessageRepository(conn_mgr)
-    character_repo = CharacterRepository(conn_mgr)
-    session_repo = SessionRepository(conn_mgr)
-    config_repo = ConfigRepository(conn_mgr)
+    message_repo = get_message_repository()
+    character_repo = get_character_repository()
+    session_repo = get_session_repository()
+    config_repo = get_config_repository()
+    state_repo = get_session_state_repository()
 
     if message_service is None:
-        message_service = MessageService(message_repo)
+        message_service = MessageService(message_repo, state_repo)
     if config_service is None:
         config_service = ConfigService(config_repo)
     if character_service is None:
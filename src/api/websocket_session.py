@@ -1,18 +1,30 @@
+from contextlib import nullcontext
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
 from typing import Dict, Any, Optional
 
 from src.infrastructure.database.connection import DatabaseConnection
-from src.infrastructure.database.repositories import (
-    MessageRepository,
-    CharacterRepository,
-    SessionRepository,
-    ConfigRepository,
+from src.infrastructure.database.profiler import user_turn
+from src.api.dependencies import (
+    get_db_connection,
+    get_message_repository,
+    get_character_repository,
+    get_session_repository,
+    get_config_repository,
+    get_session_state_repository,
+    use_memory_backend,
 )
 from src.services.messaging.message_service import MessageService
 from src.services.character.character_service import CharacterService
 from src.services.configurations.config_service import ConfigService
 from src.services.session.session_service import SessionService
 from src.infrastructure.network.websocket_manager import WebSocketManager
+from src.core.interfaces.repositories import (
+    IMessageRepository,
+    ICharacterRepository,
+    ISessionRepository,
+    IConfigRepository,
+    ISessionStateRepository,
+)
 from src.core.models.message import MessageType
 from src.core.schemas import LLMConfig
 from src.core.utils.logger import (
@@ -20,17 +32,18 @@ from src.core.utils.logger import (
     broadcast_log_if_needed,
     LogCategory,
 )
-from src.core.configs import database_config, llm_defaults
+from src.core.configs import llm_defaults, websocket_config
 from src.core.models.constants import DEFAULT_USER_ID
 from src.utils.url_utils import sanitize_base_url
 
 router = APIRouter()
 
 conn_mgr: Optional[DatabaseConnection] = None
-message_repo: Optional[MessageRepository] = None
-character_repo: Optional[CharacterRepository] = None
-session_repo: Optional[SessionRepository] = None
-config_repo: Optional[ConfigRepository] = None
+message_repo: Optional[IMessageRepository] = None
+character_repo: Optional[ICharacterRepository] = None
+session_repo: Optional[ISessionRepository] = None
+config_repo: Optional[IConfigRepository] = None
+state_repo: Optional[ISessionStateRepository] = None
 message_service: Optional[MessageService] = None
 character_service: Optional[CharacterService] = None
 config_service: Optional[ConfigService] = None
@@ -39,24 +52,26 @@ session_clients: Dict[str, SessionService] = {}
 
 
 async def initialize_services():
-    global conn_mgr, message_repo, character_repo, session_repo, config_repo
+    global conn_mgr, message_repo, character_repo, session_repo, config_repo, state_repo
     global message_service, character_service, config_service, ws_manager
 
-    if conn_mgr is None:
-        conn_mgr = DatabaseConnection(database_config.path)
+    if conn_mgr is None and not use_memory_backend():
+        conn_mgr = get_db_connection()
 
     # Initialize repos/services if missing (supports init order with global WS first).
     if message_repo is None:
-        message_repo = MessageRepository(conn_mgr)
+        message_repo = get_message_repository()
     if character_repo is None:
-        character_repo = CharacterRepository(conn_mgr)
+        character_repo = get_character_repository()
     if session_repo is None:
-        session_repo = SessionRepository(conn_mgr)
+        session_repo = get_session_repository()
     if config_repo is None:
-        config_repo = ConfigRepository(conn_mgr)
+        config_repo = get_config_repository()
+    if state_repo is None:
+        state_repo = get_session_state_repository()
 
     if message_service is None:
-        message_service = MessageService(message_repo)
+        message_service = MessageService(message_repo, state_repo)
     if config_service is None:
         config_service = ConfigService(config_repo)
     if character_service is None:
@@ -98,10 +113,19 @@ async def websocket_endpoint(
     await ws_manager.connect(websocket, session_id, user_id)
 
     try:
-        messages = await message_service.get_messages(session_id)
+        # Only the newest page goes out on connect; the client backfills older
+        # pages with load_history as the user scrolls up. The change cursor is
+        # read first so nothing written meanwhile is missed by the next sync.
+        change_cursor = await message_service.get_change_cursor(session_id)
+        messages, has_more = await message_service.get_message_page(
+            session_id, limit=websocket_config.history_page_size
+        )
         history_event = {
             "type": "history",
             "data": {
+                "page": "latest",
+                "has_more": has_more,
+                "change_cursor": change_cursor,
                 "messages": [
                     {
                         "id": msg.id,
@@ -113,6 +137,7 @@ async def websocket_endpoint(
                         "is_recalled": msg.is_recalled,
                         "is_read": msg.is_read,
                         "timestamp": msg.timestamp,
+                        "seq": msg.seq,
                     }
                     for msg in messages
                 ]
@@ -151,7 +176,9 @@ async def handle_client_message(
         msg_type = data.get("type")
 
         if msg_type == "send_message":
-            await handle_send_message(session_id, user_id, data)
+            # A user turn: the send plus the reply timeline it starts.
+            with user_turn() if conn_mgr and conn_mgr.profiler else nullcontext():
+                await handle_send_message(session_id, user_id, data)
 
         elif msg_type == "set_typing":
             await handle_set_typing(session_id, user_id, data)
@@ -162,6 +189,9 @@ async def handle_client_message(
         elif msg_type == "sync_messages":
             await handle_sync_messages(websocket, session_id, data)
 
+        elif msg_type == "load_history":
+            await handle_load_history(websocket, session_id, data)
+
         elif msg_type == "switch_session":
             await handle_switch_session(data)
 
@@ -200,14 +230,49 @@ async def handle_send_message(session_id: str, user_id: str, data: Dict[str, Any
     # Check if session is blocked
     is_blocked = await message_service.is_session_blocked(session_id)
 
-    messages = await message_service.send_message_with_time(
+    messages, created = await message_service.send_message_idempotent(
         session_id=session_id,
         sender_id=user_id,
         message_type=MessageType.TEXT,
         content=content,
         metadata=data.get("metadata", {}),
+        idempotency_key=data.get("idempotency_key"),
     )
 
+    if not messages:
+        # Nothing was stored: no broadcast and no LLM turn for this message.
+        await ws_manager.send_to_user(session_id, user_id, {
+            "type": "error",
+            "data": {
+                "message": "Failed to send message",
+                "idempotency_key": data.get("idempotency_key"),
+            },
+        })
+        return
+
+    if not created:
+        # A resend of a message we already have (e.g. after a reconnect):
+        # echo the stored message back to the sender and stop here, so the
+        # hint and the LLM turn are not repeated.
+        message = messages[-1]
+        await ws_manager.send_to_user(session_id, user_id, {
+            "type": "message",
+            "data": {
+                "id": message.id,
+                "session_id": message.session_id,
+                "sender_id": message.sender_id,
+                "type": message.type,
+                "content": message.content,
+                "metadata": message.metadata,
+                "is_recalled": message.is_recalled,
+                "is_read": message.is_read,
+                "timestamp": message.timestamp,
+                "seq": message.seq,
+                "idempotency_key": message.idempotency_key,
+            },
+        })
+        return
+
     for message in messages:
         event = {
             "type": "message",
@@ -221,6 +286,8 @@ async def handle_send_message(session_id: str, user_id: str, data: Dict[str, Any
                 "is_recalled": message.is_recalled,
                 "is_read": message.is_read,
                 "timestamp": message.timestamp,
+                "seq": message.seq,
+                "idempotency_key": message.idempotency_key,
             },
         }
         # If blocked, only send to user, not to character_client
@@ -239,6 +306,8 @@ async def handle_send_message(session_id: str, user_id: str, data: Dict[str, Any
             content="消息已发出，但被对方拒收了。",
             metadata={},
         )
+        if not hint_msg:
+            return
 
         hint_event = {
             "type": "message",
@@ -252,6 +321,7 @@ async def handle_send_message(session_id: str, user_id: str, data: Dict[str, Any
                 "is_recalled": hint_msg.is_recalled,
                 "is_read": hint_msg.is_read,
                 "timestamp": hint_msg.timestamp,
+                "seq": hint_msg.seq,
             },
         }
         # Send hint only to user
@@ -312,21 +382,115 @@ async def handle_recall_message(session_id: str, user_id: str, data: Dict[str, A
                 "is_recalled": recall_msg.is_recalled,
                 "is_read": recall_msg.is_read,
                 "timestamp": recall_msg.timestamp,
+                "seq": recall_msg.seq,
             },
         }
         await ws_manager.send_to_conversation(session_id, event)
 
 
+def _history_limit(data: Dict[str, Any]) -> int:
+    try:
+        limit = int(data.get("limit") or websocket_config.history_page_size)
+    except (TypeError, ValueError):
+        limit = websocket_config.history_page_size
+    return max(1, min(limit, websocket_config.history_max_page_size))
+
+
 async def handle_sync_messages(
     websocket: WebSocket, session_id: str, data: Dict[str, Any]
 ):
-    after_timestamp = data.get("after_timestamp", 0)
+    if data.get("after_change") is not None:
+        await _send_changes(websocket, session_id, data)
+        return
+
+    # Clients that track ``seq`` resync exactly from it; ``after_timestamp``
+    # is still accepted from older clients.
+    if data.get("after_seq") is not None:
+        cursor = {"after_seq": int(data["after_seq"])}
+    else:
+        cursor = {"after_timestamp": float(data.get("after_timestamp") or 0)}
+
+    messages, has_more = await message_service.get_message_page(
+        session_id, limit=_history_limit(data), **cursor
+    )
 
-    messages = await message_service.get_messages(session_id, after_timestamp)
+    history_event = {
+        "type": "history",
+        "data": {
+            "page": "after",
+            "has_more": has_more,
+            "messages": [
+                {
+                    "id": msg.id,
+                    "session_id": msg.session_id,
+                    "sender_id": msg.sender_id,
+                    "type": msg.type,
+                    "content": msg.content,
+                    "metadata": msg.metadata,
+                    "is_recalled": msg.is_recalled,
+                    "is_read": msg.is_read,
+                    "timestamp": msg.timestamp,
+                    "seq": msg.seq,
+                }
+                for msg in messages
+            ]
+        },
+    }
+    await ws_manager.send_to_websocket(websocket, history_event)
+
+
+async def _send_changes(websocket: WebSocket, session_id: str, data: Dict[str, Any]):
+    changes = await message_service.get_message_changes(
+        session_id, int(data["after_change"]), limit=_history_limit(data)
+    )
+    changes_event = {
+        "type": "changes",
+        "data": {
+            "cursor": changes.cursor,
+            "has_more": changes.has_more,
+            "reset": changes.reset,
+            "deleted_ids": changes.deleted_ids,
+            "messages": [
+                {
+                    "id": msg.id,
+                    "session_id": msg.session_id,
+                    "sender_id": msg.sender_id,
+                    "type": msg.type,
+                    "content": msg.content,
+                    "metadata": msg.metadata,
+                    "is_recalled": msg.is_recalled,
+                    "is_read": msg.is_read,
+                    "timestamp": msg.timestamp,
+                    "seq": msg.seq,
+                }
+                for msg in changes.messages
+            ]
+        },
+    }
+    await ws_manager.send_to_websocket(websocket, changes_event)
+
+
+async def handle_load_history(
+    websocket: WebSocket, session_id: str, data: Dict[str, Any]
+):
+    # Clients that track ``seq`` page back exactly from it;
+    # ``before_timestamp`` is still accepted from older clients.
+    if data.get("before_seq") is not None:
+        cursor = {"before_seq": int(data["before_seq"])}
+    elif data.get("before_timestamp") is not None:
+        cursor = {"before_timestamp": float(data["before_timestamp"])}
+    else:
+        cursor = {}
+
+    messages, has_more = await message_service.get_message_page(
+        session_id, limit=_history_limit(data), **cursor
+    )
 
     history_event = {
         "type": "history",
         "data": {
+            "page": "before",
+            "has_more": has_more,
             "messages": [
                 {
                     "id": msg.id,
@@ -338,6 +502,7 @@ async def handle_sync_messages(
                     "is_recalled": msg.is_recalled,
                     "is_read": msg.is_read,
                     "timestamp": msg.timestamp,
+                    "seq": msg.seq,
                 }
                 for msg in messages
             ]
@@ -76,6 +76,10 @@ class WebSocketConfig(BaseSettings):
     ping_interval: float = 20.0
     ping_timeout: float = 10.0
 
+    # Message history paging for the WS history frame and HTTP sync
+    history_page_size: int = 50
+    history_max_page_size: int = 500
+
     class Config:
         env_file = ".env"
         env_prefix = "WS_"
@@ -84,6 +88,69 @@ class WebSocketConfig(BaseSettings):
 class DatabaseConfig(BaseSettings):
     path: str = "data/database/rin_app.db"
 
+    # Connection pool: long-lived connections shared by all repositories
+    pool_size: int = 8
+    pool_timeout: float = 30.0  # Seconds to wait for a free connection
+    busy_timeout_ms: int = 30000
+    cache_size_kb: int = 16384  # Page cache per connection
+    mmap_size: int = 268435456  # 256 MiB memory-mapped I/O
+    read_workers: int = 4  # Reader threads; writes always use one writer thread
+
+    # Storage backend: "sqlite", or "memory" to keep everything in process
+    # (nothing is persisted; meant for benchmarks and perf runs)
+    backend: str = "sqlite"
+
+    # Per-statement timing, row counts and query plans (see /api/db/profile)
+    profile_queries: bool = False
+
+    # In-process cache of characters, sessions and config, dropped on writes
+    read_cache: bool = True
+
+    # Message sharding: 0 keeps messages in the main file; N > 0 moves them into
+    # N shard files chosen by session id hash. Do not change N once shards hold data.
+    message_shards: int = 0
+
+    # Group commit: buffer message writes from all sessions into one transaction
+    group_commit: bool = False
+    group_commit_window_ms: float = 5.0
+    group_commit_max_batch: int = 256
+
+    # Background maintenance: purge superseded/orphaned rows, vacuum when quiet
+    maintenance_enabled: bool = True
+    maintenance_interval: float = 600.0  # Seconds between runs
+    maintenance_quiet_seconds: float = 30.0  # Idle time required before VACUUM/ANALYZE
+    maintenance_batch_size: int = 500  # Rows deleted per write transaction
+    maintenance_vacuum_pages: int = 0  # Pages freed per incremental vacuum; 0 = all
+
+    # Online backups with the SQLite backup API (see /api/db/backup)
+    backup_enabled: bool = False
+    backup_dir: str = "data/database/backups"
+    backup_interval: float = 24 * 3600.0  # Seconds between backup sets
+    backup_keep: int = 7  # Newest backup sets kept; older ones are deleted
+    backup_pages_per_step: int = 256  # Pages copied per step
+    backup_step_sleep_ms: float = 5.0  # Pause between steps
+    backup_max_restarts: int = 10  # Then copy the rest in one step from a read snapshot
+
+    # Parquet export of messages for offline analysis (see /api/db/export; needs pyarrow)
+    export_dir: str = "data/exports"
+    export_batch_rows: int = 10000  # Rows per read and per Parquet row group
+    export_max_metadata_columns: int = 256  # Flattened metadata keys; the rest stay in "metadata"
+    export_compression: str = "zstd"  # Parquet codec: zstd, snappy, gzip or none
+
+    # Large values (tool-result metadata, avatar data URLs) are stored compressed
+    compress_threshold_bytes: int = 1024  # 0 disables
+    compress_codec: str = "gzip"  # "gzip" or "zstd" (needs the zstandard package)
+
+    # Change feed: per-session log of message inserts/updates/deletes for delta sync
+    change_feed_retention_seconds: float = 7 * 24 * 3600.0  # Older changes are pruned
+
+    # Cold archive: idle sessions are moved to compressed blobs in a second file
+    archive_enabled: bool = True
+    archive_path: str = "data/database/rin_archive.db"
+    archive_after_seconds: float = 30 * 24 * 3600.0  # Idle time before a session is archived
+    archive_codec: str = "gzip"  # "gzip" or "zstd" (needs the zstandard package)
+    archive_batch_sessions: int = 20  # Sessions archived per maintenance run
+
     class Config:
         env_file = ".env"
         env_prefix = "DB_"
@@ -4,6 +4,7 @@ from src.core.interfaces.repositories import (
     ISessionRepository,
     IMessageRepository,
     IConfigRepository,
+    ISessionStateRepository,
 )
 
 __all__ = [
@@ -11,4 +12,5 @@ __all__ = [
     "ISessionRepository",
     "IMessageRepository",
     "IConfigRepository",
+    "ISessionStateRepository",
 ]
@@ -1,9 +1,9 @@
 """Repository interfaces for dependency inversion"""
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from src.core.models.character import Character
 from src.core.models.session import Session
-from src.core.models.message import Message
+from src.core.models.message import Message, MessageChanges, SessionStats
 
 
 class ICharacterRepository(ABC):
@@ -45,7 +45,7 @@ class ISessionRepository(ABC):
     
     @abstractmethod
     async def get_by_character(self, character_id: str) -> Optional[Session]:
-        """Get session by character ID"""
+        """Get the root (non-branch) session of a character"""
         pass
     
     @abstractmethod
@@ -73,6 +73,11 @@ class ISessionRepository(ABC):
         """Set active session"""
         pass
 
+    @abstractmethod
+    async def get_branches(self, session_id: str) -> List[Session]:
+        """Get every branch forked from a session, at any depth"""
+        pass
+
 
 class IMessageRepository(ABC):
     """Interface for message repository"""
@@ -84,9 +89,64 @@ class IMessageRepository(ABC):
     
     @abstractmethod
     async def get_by_session(
-        self, session_id: str, after_timestamp: Optional[float] = None
+        self,
+        session_id: str,
+        after_timestamp: Optional[float] = None,
+        limit: Optional[int] = None,
+        before_timestamp: Optional[float] = None,
+        after_seq: Optional[int] = None,
+        before_seq: Optional[int] = None,
+    ) -> List[Message]:
+        """Get messages for a session in seq order, optionally one page between cursors"""
+        pass
+    
+    @abstractmethod
+    async def search(
+        self,
+        session_id: str,
+        query: str,
+        limit: int,
+        before_timestamp: Optional[float] = None,
     ) -> List[Message]:
-        """Get messages for a session"""
+        """Full-text search a session's messages, newest first"""
+        pass
+    
+    @abstractmethod
+    async def get_by_idempotency_key(
+        self, session_id: str, idempotency_key: str
+    ) -> Optional[Message]:
+        """Get the message a client sent with this idempotency key, if any"""
+        pass
+    
+    @abstractmethod
+    async def get_latest(self, session_id: str) -> Optional[Message]:
+        """Get the newest message in a session"""
+        pass
+    
+    @abstractmethod
+    async def get_latest_by_type(
+        self, session_id: str, message_type: str
+    ) -> Optional[Message]:
+        """Get the newest message of a type in a session"""
+        pass
+    
+    @abstractmethod
+    async def exists_by_type(self, session_id: str, message_type: str) -> bool:
+        """Check whether a session has any message of a type"""
+        pass
+    
+    @abstractmethod
+    async def get_by_type(
+        self, session_id: str, message_type: str, include_recalled: bool = True
+    ) -> List[Message]:
+        """Get all messages of a type in a session"""
+        pass
+    
+    @abstractmethod
+    async def get_by_sender_since(
+        self, session_id: str, sender_id: str, since_timestamp: float
+    ) -> List[Message]:
+        """Get a sender's messages in a session since a timestamp"""
         pass
     
     @abstractmethod
@@ -95,8 +155,22 @@ class IMessageRepository(ABC):
         pass
     
     @abstractmethod
-    async def update_recalled_status(self, message_id: str, is_recalled: bool) -> bool:
-        """Update recalled status of a message"""
+    async def create_many(self, messages: List[Message]) -> bool:
+        """Create several messages in one transaction"""
+        pass
+    
+    @abstractmethod
+    async def update_recalled_status(
+        self, message_id: str, is_recalled: bool, session_id: Optional[str] = None
+    ) -> bool:
+        """Update recalled status of a message, as seen from ``session_id`` if given"""
+        pass
+    
+    @abstractmethod
+    async def supersede_state_messages(
+        self, session_id: str, message_type: str, keep_id: str
+    ) -> int:
+        """Mark every older unrecalled message of a type as recalled, keeping keep_id"""
         pass
     
     @abstractmethod
@@ -115,6 +189,23 @@ class IMessageRepository(ABC):
     async def get_last_read_timestamp(self, session_id: str) -> float:
         """Get the last read timestamp for a session"""
         pass
+    
+    @abstractmethod
+    async def get_changes(
+        self, session_id: str, after_change: int, limit: int
+    ) -> MessageChanges:
+        """Get messages inserted, updated or deleted after a change-feed cursor"""
+        pass
+    
+    @abstractmethod
+    async def get_change_cursor(self, session_id: str) -> int:
+        """Get the current change-feed cursor for a session"""
+        pass
+
+    @abstractmethod
+    async def get_stats(self, session_id: str, days: int = 30) -> SessionStats:
+        """Get a session's message rollups, with up to `days` most recent days"""
+        pass
 
 
 class IConfigRepository(ABC):
@@ -134,3 +225,32 @@ class IConfigRepository(ABC):
     async def delete(self, key: str) -> bool:
         """Delete configuration by key"""
         pass
+    
+    @abstractmethod
+    async def get_table_versions(self) -> Dict[str, int]:
+        """Get change counters for the client-cached tables"""
+        pass
+
+
+class ISessionStateRepository(ABC):
+    """Interface for keyed per-session state (typing, emotion, blocked)"""
+    
+    @abstractmethod
+    async def get_state(self, session_id: str, key: str) -> Optional[Any]:
+        """Get a state value, or None if unset"""
+        pass
+    
+    @abstractmethod
+    async def get_all_state(self, session_id: str) -> Dict[str, Any]:
+        """Get all state values for a session"""
+        pass
+    
+    @abstractmethod
+    async def set_state(self, session_id: str, key: str, value: Any) -> bool:
+        """Insert or replace a state value"""
+        pass
+    
+    @abstractmethod
+    async def delete_by_session(self, session_id: str) -> bool:
+        """Delete all state for a session"""
+        pass
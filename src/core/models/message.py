@@ -1,6 +1,6 @@
 from enum import Enum
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from datetime import datetime
 
 
@@ -40,11 +40,58 @@ class Message(BaseModel):
     is_recalled: bool = False
     is_read: bool = False
     timestamp: float
+    # Per-session position, assigned by the repository on insert.
+    seq: Optional[int] = None
+    # Client-supplied key of a user send; unique per session.
+    idempotency_key: Optional[str] = None
 
     class Config:
         use_enum_values = True
 
 
+class MessageChanges(BaseModel):
+    """Changes to a session's messages after a change-feed cursor."""
+
+    # Current state of every message inserted or updated since the cursor
+    messages: List[Message] = Field(default_factory=list)
+    deleted_ids: List[str] = Field(default_factory=list)
+    # Cursor to pass back for the next page
+    cursor: int
+    has_more: bool = False
+    # The cursor is older than the retained feed; reload the history instead
+    reset: bool = False
+
+
+class MessageCounts(BaseModel):
+    """Counters kept by the message rollups."""
+
+    # Text, image, video and audio messages
+    message_count: int = 0
+    user_message_count: int = 0
+    sticker_count: int = 0
+    recall_count: int = 0
+    # Messages re-sent to fix a recalled typo
+    correction_count: int = 0
+    emotion_count: int = 0
+
+
+class DailyMessageStats(MessageCounts):
+    # UTC date, YYYY-MM-DD
+    day: str
+
+
+class SessionStats(MessageCounts):
+    """Rollup of everything written to a session."""
+
+    session_id: str
+    first_timestamp: Optional[float] = None
+    last_timestamp: Optional[float] = None
+    # emotion -> level -> number of emotion updates
+    emotions: Dict[str, Dict[str, int]] = Field(default_factory=dict)
+    # Most recent days first
+    days: List[DailyMessageStats] = Field(default_factory=list)
+
+
 class TypingState(BaseModel):
     user_id: str
     conversation_id: str
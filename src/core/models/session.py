@@ -8,3 +8,6 @@ class Session(BaseModel):
     character_id: str
     is_active: bool = False
     created_at: Optional[datetime] = None
+    # Branches share their parent's messages up to and including fork_seq.
+    parent_session_id: Optional[str] = None
+    fork_seq: Optional[int] = None
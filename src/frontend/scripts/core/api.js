@@ -41,15 +41,18 @@ export async function fetchSessions() {
 }
 
 /**
- * Incremental message sync over HTTP.
+ * Paginated message sync over HTTP.
+ * With afterTimestamp, returns the page right after it; otherwise the latest page.
  * @param {string} sessionId
- * @param {number} afterTimestamp
+ * @param {number} [afterTimestamp]
+ * @returns {Promise<{messages: any[], hasMore: boolean}>}
  */
 export async function fetchMessages(sessionId, afterTimestamp) {
-  const data = await fetchJson(
-    `/api/sessions/${sessionId}/messages?after=${encodeURIComponent(afterTimestamp || 0)}`,
-  );
-  return data.messages || [];
+  const query = afterTimestamp
+    ? `?after=${encodeURIComponent(afterTimestamp)}`
+    : "";
+  const data = await fetchJson(`/api/sessions/${sessionId}/messages${query}`);
+  return { messages: data.messages || [], hasMore: data.has_more === true };
 }
 
 export async function fetchConfig() {
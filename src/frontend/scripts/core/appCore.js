@@ -7,6 +7,7 @@ import {
   setLastServerHash,
   upsertMessages,
   setReadTimestamp,
+  setHistoryHasMore,
 } from "./state.js";
 import * as api from "./api.js";
 import { WsClient } from "./ws.js";
@@ -104,16 +105,30 @@ export function createApp() {
         cached.length > 0 ? Math.max(...cached.map((m) => m.timestamp)) : 0;
 
       try {
-        const messages = await api.fetchMessages(session.id, lastTs);
-        if (messages.length > 0) {
+        // Walk forward from the newest cached message one page at a time.
+        // An empty cache only gets the latest page; older pages are
+        // backfilled on demand as the user scrolls up.
+        let fetched = 0;
+        let afterTs = lastTs;
+        while (true) {
+          const { messages, hasMore } = await api.fetchMessages(session.id, afterTs);
+          if (!lastTs) setHistoryHasMore(session.id, hasMore);
+          if (messages.length > 0) {
+            upsertMessages(session.id, messages);
+            fetched += messages.length;
+          }
+          if (!afterTs || !hasMore || messages.length === 0) break;
+          afterTs = messages[messages.length - 1].timestamp;
+        }
+
+        if (fetched > 0) {
           appendDebugLog({
             timestamp: Date.now() / 1000,
             level: "info",
             category: "sync",
-            message: `Incremental sync fetched ${messages.length} message(s) for session ${session.id}`,
+            message: `Incremental sync fetched ${fetched} message(s) for session ${session.id}`,
           });
-          upsertMessages(session.id, messages);
-          
+
           // Re-render the session if it's currently active
           if (session.id === state.activeSessionId && !isChatViewHidden()) {
             ensureChatSessionContainer(session.id);
@@ -220,14 +235,22 @@ export function createApp() {
     switch (event.type) {
       case "history": {
         const messages = event.data.messages || [];
+        // "latest" arrives on connect, "before" answers load_history.
+        const page = event.data.page;
         if (sourceSessionId) {
           upsertMessages(sourceSessionId, messages);
+          if (page === "latest" || page === "before") {
+            setHistoryHasMore(sourceSessionId, event.data.has_more === true);
+          }
         }
         if (sourceSessionId) {
           ensureChatSessionContainer(sourceSessionId);
         }
         if (sourceSessionId === state.activeSessionId && !isChatViewHidden()) {
-          renderChatSession(sourceSessionId, { scrollOnEnter: true });
+          renderChatSession(
+            sourceSessionId,
+            page === "before" ? { keepScrollAnchor: true } : { scrollOnEnter: true },
+          );
         } else {
           renderSessionListView();
         }
@@ -30,6 +30,8 @@ let readTimestampBySession = new Map();
 let userAvatar = null;
 /** @type {boolean} */
 let debugEnabled = false;
+/** @type {Map<string, boolean>} */
+let historyHasMoreBySession = new Map();
 
 export const state = {
   get characters() {
@@ -62,6 +64,9 @@ export const state = {
   get readTimestampBySession() {
     return readTimestampBySession;
   },
+  get historyHasMoreBySession() {
+    return historyHasMoreBySession;
+  },
   get userAvatar() {
     return userAvatar;
   },
@@ -189,12 +194,24 @@ export function upsertMessages(sessionId, messages) {
     }
   }
   
+  // seq breaks timestamp ties in the order the server stored them.
   const merged = Array.from(map.values()).sort(
-    (a, b) => a.timestamp - b.timestamp,
+    (a, b) => a.timestamp - b.timestamp || (a.seq ?? 0) - (b.seq ?? 0),
   );
   messageCache.set(sessionId, merged);
 }
 
+/**
+ * Whether the server has messages older than the oldest cached one.
+ * Not persisted; refreshed by the history frame on every connect.
+ * @param {string} sessionId
+ * @param {boolean} hasMore
+ */
+export function setHistoryHasMore(sessionId, hasMore) {
+  if (!sessionId) return;
+  historyHasMoreBySession.set(sessionId, Boolean(hasMore));
+}
+
 /**
  * @param {string} sessionId
  * @param {number} timestamp
@@ -10,6 +10,13 @@ export class WsClient {
     this.messageHandlers = [];
     this.openHandlers = [];
     this.closeHandlers = [];
+    /**
+     * Text sends the server has not answered yet, idempotency key -> content.
+     * Resent with the same key on every (re)connect until the server echoes
+     * the stored message or reports the send as failed.
+     * @type {Map<string, string>}
+     */
+    this.pending = new Map();
   }
 
   connect() {
@@ -18,6 +25,7 @@ export class WsClient {
 
     this.ws.addEventListener("open", () => {
       for (const h of this.openHandlers) h();
+      this.resendPending();
     });
     this.ws.addEventListener("close", () => {
       for (const h of this.closeHandlers) h();
@@ -29,6 +37,7 @@ export class WsClient {
     this.ws.addEventListener("message", (ev) => {
       try {
         const data = JSON.parse(ev.data);
+        this.settlePending(data);
         for (const h of this.messageHandlers) h(data);
       } catch {
         // ignore
@@ -89,10 +98,40 @@ export class WsClient {
   }
 
   /**
+   * Send a text message. It stays pending, and is resent with the same key
+   * after a reconnect, until the server answers it; the server ignores
+   * sends whose key it has seen. Pass the key returned by an earlier call
+   * to resend the same message by hand.
    * @param {string} content
+   * @param {string} [idempotencyKey]
+   * @returns {string} the idempotency key used
    */
-  sendText(content) {
-    this.send("send_message", { content, metadata: {} });
+  sendText(content, idempotencyKey) {
+    const key =
+      idempotencyKey ||
+      // randomUUID needs a secure context; plain-http LAN access falls back.
+      (crypto.randomUUID?.() ?? `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`);
+    this.pending.set(key, content);
+    this.send("send_message", { content, metadata: {}, idempotency_key: key });
+    return key;
+  }
+
+  resendPending() {
+    for (const [key, content] of this.pending) {
+      this.send("send_message", { content, metadata: {}, idempotency_key: key });
+    }
+  }
+
+  /**
+   * Drop the pending send a server event answers: the echoed message, or
+   * an error for a send that could not be stored.
+   * @param {any} event
+   */
+  settlePending(event) {
+    const key = event?.data?.idempotency_key;
+    if (key && (event.type === "message" || event.type === "error")) {
+      this.pending.delete(key);
+    }
   }
 
   /**
@@ -102,6 +141,21 @@ export class WsClient {
     this.send("sync_messages", { after_timestamp: afterTimestamp });
   }
 
+  /**
+   * Request the page of messages before the oldest one we have. Pages on
+   * its seq when known; timestamps can tie, so the timestamp is only a
+   * fallback for messages cached before seq existed.
+   * @param {number} beforeTimestamp
+   * @param {number} [beforeSeq]
+   */
+  loadHistory(beforeTimestamp, beforeSeq) {
+    if (typeof beforeSeq === "number") {
+      this.send("load_history", { before_seq: beforeSeq });
+    } else {
+      this.send("load_history", { before_timestamp: beforeTimestamp });
+    }
+  }
+
   clearSession() {
     this.send("clear_session", {});
   }
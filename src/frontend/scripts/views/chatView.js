@@ -14,6 +14,14 @@ const typingStateBySession = new Map();
 const messageContainersBySession = new Map();
 let activeMessageContainer = /** @type {HTMLElement | null} */ (null);
 
+/** @type {Map<string, {before: number, at: number}>} */
+const historyRequestBySession = new Map();
+
+// Backfill older history when scrolled within this distance of the top.
+const HISTORY_LOAD_THRESHOLD_PX = 80;
+// Re-send an unanswered history request for the same cursor after this long.
+const HISTORY_RETRY_MS = 5000;
+
 const DEFAULT_CHARACTER_AVATAR = "/static/images/avatar/default.webp";
 const DEFAULT_USER_AVATAR = "/static/images/avatar/user.webp";
 
@@ -64,6 +72,7 @@ export function dropChatSessionContainer(sessionId) {
   if (el) el.remove();
   messageContainersBySession.delete(sessionId);
   typingStateBySession.delete(sessionId);
+  historyRequestBySession.delete(sessionId);
   if (activeMessageContainer?.dataset.sessionId === sessionId) {
     activeMessageContainer = null;
   }
@@ -137,7 +146,8 @@ export function showChatSession(sessionId, scrollToBottomOnEnter) {
 /**
  * Render (or re-render) a specific session's messages container.
  * @param {string} sessionId
- * @param {{scrollOnEnter?: boolean, forceScrollBehavior?: "instant" | "smooth"}} opts
+ * @param {{scrollOnEnter?: boolean, forceScrollBehavior?: "instant" | "smooth", keepScrollAnchor?: boolean}} opts
+ *   keepScrollAnchor keeps the visible messages in place after older ones are prepended.
  */
 export function renderChatSession(sessionId, opts = {}) {
   const container = ensureChatSessionContainer(sessionId);
@@ -236,7 +246,10 @@ export function renderChatSession(sessionId, opts = {}) {
     setupScrollReadTracking(container);
     applyEmotionForSession(sessionId, latestEmotionMap);
 
-    if (opts.scrollOnEnter) {
+    if (opts.keepScrollAnchor) {
+      container.scrollTop = prevScrollTop + (container.scrollHeight - prevScrollHeight);
+      requestAnimationFrame(() => handleScroll(container));
+    } else if (opts.scrollOnEnter) {
       scrollToBottom(container, { behavior: "instant" });
       markAllRead(sessionId);
       updateNewMessageIndicator(sessionId, container);
@@ -614,6 +627,31 @@ function handleScroll(container) {
   }
 
   updateNewMessageIndicator(sessionId, container);
+  maybeLoadOlderHistory(sessionId, container);
+}
+
+/**
+ * Ask the server for the page before the oldest cached message once the
+ * user scrolls near the top and the server reported more history.
+ * @param {string} sessionId
+ * @param {HTMLElement} container
+ */
+function maybeLoadOlderHistory(sessionId, container) {
+  if (!wsClient || container.scrollTop > HISTORY_LOAD_THRESHOLD_PX) return;
+  if (state.historyHasMoreBySession.get(sessionId) !== true) return;
+  const msgs = state.messageCache.get(sessionId) || [];
+  if (msgs.length === 0) return;
+
+  const oldestTs = msgs[0].timestamp;
+  const seqs = msgs.map((m) => m.seq).filter((seq) => typeof seq === "number");
+  const oldestSeq = seqs.length === msgs.length ? Math.min(...seqs) : undefined;
+  const before = oldestSeq ?? oldestTs;
+  const pending = historyRequestBySession.get(sessionId);
+  if (pending && pending.before === before && Date.now() - pending.at < HISTORY_RETRY_MS) {
+    return;
+  }
+  historyRequestBySession.set(sessionId, { before, at: Date.now() });
+  wsClient.loadHistory(oldestTs, oldestSeq);
 }
 
 function markAllRead(sessionId) {
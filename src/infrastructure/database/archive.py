@@ -0,0 +1,326 @@
+import asyncio
+import gzip
+import json
+import logging
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from src.core.configs import DatabaseConfig, database_config
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SCHEMA = "archive"
+
+# Column order of the rows packed into an archive blob.
+ARCHIVED_COLUMNS = (
+    "id", "session_id", "sender_id", "type", "content",
+    "metadata", "is_recalled", "is_read", "timestamp", "created_at", "seq",
+)
+
+# Inserts an archived row back into ``messages``. Rows packed before ``seq``
+# existed carry NULL there (see restore_params) and are numbered on insert.
+RESTORE_MESSAGE_SQL = f"""
+    INSERT OR IGNORE INTO messages ({", ".join(ARCHIVED_COLUMNS)})
+    VALUES ({", ".join("?" for _ in ARCHIVED_COLUMNS[:-1])}, COALESCE(?, (
+        SELECT COALESCE(MAX(seq), 0) + 1 FROM messages WHERE session_id = ?
+    )))
+"""
+
+
+def restore_params(values: List[Any], compressor=None) -> List[Any]:
+    """RESTORE_MESSAGE_SQL parameters for one archived row."""
+    values = list(values)
+    values += [None] * (len(ARCHIVED_COLUMNS) - len(values))
+    if compressor is not None:
+        metadata = ARCHIVED_COLUMNS.index("metadata")
+        values[metadata] = compressor.pack(values[metadata])
+    return values + [values[1]]
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def compress(payload: bytes, codec: str) -> Tuple[bytes, str]:
+    """Compress ``payload``; returns the blob and the codec actually used."""
+    if codec == "zstd":
+        zstandard = _zstd()
+        if zstandard is not None:
+            return zstandard.ZstdCompressor(level=10).compress(payload), "zstd"
+        logger.warning("zstandard is not installed, archiving with gzip instead")
+    return gzip.compress(payload, compresslevel=6), "gzip"
+
+
+def decompress(blob: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        zstandard = _zstd()
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-archived sessions")
+        return zstandard.ZstdDecompressor().decompress(blob)
+    if codec == "gzip":
+        return gzip.decompress(blob)
+    raise ValueError(f"Unknown archive codec: {codec}")
+
+
+class SessionArchive:
+    """
+    Cold tier for idle sessions.
+
+    Sessions whose newest message is older than ``archive_after_seconds`` have
+    their messages packed into one compressed blob in the attached archive
+    database and removed from the hot ``messages`` table, which keeps its
+    indexes small. :meth:`ensure_hot` moves a session back the first time it
+    is read again.
+
+    Attached databases in WAL mode are not committed atomically together, so
+    each move is two transactions ordered so that a crash in between leaves
+    the rows in both tiers rather than in neither; rehydration uses INSERT OR
+    IGNORE and tolerates that.
+    """
+
+    def __init__(self, conn_mgr, config: Optional[DatabaseConfig] = None):
+        self.conn_mgr = conn_mgr
+        self.config = config or database_config
+        self._archived: Optional[Set[str]] = None
+        self._rehydrate_lock: Optional[asyncio.Lock] = None
+
+        self._archived_sessions = 0
+        self._archived_messages = 0
+        self._rehydrated_sessions = 0
+        self._rehydrated_messages = 0
+        self._raw_bytes = 0
+        self._stored_bytes = 0
+
+    @staticmethod
+    def ensure_schema(cursor: sqlite3.Cursor):
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.archived_sessions (
+                session_id TEXT PRIMARY KEY,
+                codec TEXT NOT NULL,
+                message_count INTEGER NOT NULL,
+                first_timestamp REAL,
+                last_timestamp REAL,
+                raw_bytes INTEGER NOT NULL,
+                archived_at REAL NOT NULL,
+                payload BLOB NOT NULL
+            )
+        """)
+
+    def load(self, conn: sqlite3.Connection):
+        """Cache the archived session ids; called once when the schema is ready."""
+        cursor = conn.execute(f"SELECT session_id FROM {ARCHIVE_SCHEMA}.archived_sessions")
+        self._archived = {row[0] for row in cursor.fetchall()}
+
+    def is_archived(self, session_id: str) -> bool:
+        return bool(self._archived) and session_id in self._archived
+
+    async def ensure_hot(self, session_id: str) -> int:
+        """Move an archived session back into ``messages``; returns rows restored."""
+        if not self.is_archived(session_id):
+            return 0
+        if self._rehydrate_lock is None:
+            self._rehydrate_lock = asyncio.Lock()
+
+        async with self._rehydrate_lock:
+            if not self.is_archived(session_id):
+                return 0
+            restored = await self.conn_mgr.run(
+                lambda conn: self._restore_rows(conn, session_id), write=True
+            )
+            await self.conn_mgr.run(
+                lambda conn: self._drop_archive_row(conn, session_id), write=True
+            )
+            self._archived.discard(session_id)
+            self._rehydrated_sessions += 1
+            self._rehydrated_messages += restored
+            logger.info(f"Rehydrated {restored} archived messages for session {session_id}")
+            return restored
+
+    async def forget(self, session_id: str):
+        """Drop a session's archived messages, e.g. when the session is deleted."""
+        if not self.is_archived(session_id):
+            return
+        await self.conn_mgr.run(
+            lambda conn: self._drop_archive_row(conn, session_id), write=True
+        )
+        self._archived.discard(session_id)
+
+    async def archive_idle(self) -> int:
+        """Archive up to ``archive_batch_sessions`` idle sessions; returns how many."""
+        cutoff = time.time() - self.config.archive_after_seconds
+        limit = max(1, self.config.archive_batch_sessions)
+
+        def find(conn: sqlite3.Connection) -> List[str]:
+            # Sessions whose prefix a live branch still reads stay hot, or
+            # they would be archived and rehydrated on every cycle.
+            cursor = conn.execute("""
+                WITH RECURSIVE shared(id) AS (
+                    SELECT b.parent_session_id FROM sessions b
+                    WHERE b.parent_session_id IS NOT NULL
+                      AND (b.is_active = TRUE OR EXISTS (
+                          SELECT 1 FROM messages bm
+                          WHERE bm.session_id = b.id AND bm.timestamp >= ?
+                      ))
+                    UNION
+                    SELECT s.parent_session_id FROM sessions s
+                    JOIN shared ON s.id = shared.id
+                    WHERE s.parent_session_id IS NOT NULL
+                )
+                SELECT m.session_id FROM messages m
+                JOIN sessions s ON s.id = m.session_id
+                WHERE s.is_active = FALSE
+                  AND m.session_id NOT IN (SELECT id FROM shared)
+                GROUP BY m.session_id
+                HAVING MAX(m.timestamp) < ?
+                LIMIT ?
+            """, (cutoff, cutoff, limit))
+            return [row[0] for row in cursor.fetchall()]
+
+        archived = 0
+        for session_id in await self.conn_mgr.run(find):
+            if await self._archive_session(session_id):
+                archived += 1
+        return archived
+
+    async def purge_orphaned(self) -> int:
+        """Delete archived blobs whose session no longer exists."""
+        def op(conn: sqlite3.Connection) -> List[str]:
+            cursor = conn.execute(f"""
+                DELETE FROM {ARCHIVE_SCHEMA}.archived_sessions
+                WHERE session_id NOT IN (SELECT id FROM sessions)
+                RETURNING session_id
+            """)
+            return [row[0] for row in cursor.fetchall()]
+
+        removed = await self.conn_mgr.run(op, write=True)
+        if self._archived:
+            self._archived.difference_update(removed)
+        return len(removed)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": str(self.config.archive_path),
+            "codec": self.config.archive_codec,
+            "archive_after_seconds": self.config.archive_after_seconds,
+            "archived": len(self._archived or ()),
+            "archived_sessions": self._archived_sessions,
+            "archived_messages": self._archived_messages,
+            "rehydrated_sessions": self._rehydrated_sessions,
+            "rehydrated_messages": self._rehydrated_messages,
+            "compression_ratio": (
+                round(self._raw_bytes / self._stored_bytes, 2) if self._stored_bytes else None
+            ),
+        }
+
+    async def _archive_session(self, session_id: str) -> bool:
+        # Step 1: write the blob. Step 2: drop the hot rows, unless a message
+        # arrived in between, in which case the blob is discarded instead.
+        packed = await self.conn_mgr.run(
+            lambda conn: self._pack(conn, session_id), write=True
+        )
+        if packed is None:
+            return False
+        count, last_timestamp, raw_bytes, stored_bytes = packed
+
+        def drop_hot(conn: sqlite3.Connection) -> bool:
+            newest = conn.execute(
+                "SELECT MAX(timestamp) FROM messages WHERE session_id = ?", (session_id,)
+            ).fetchone()[0]
+            if newest is not None and newest > last_timestamp:
+                self._drop_archive_row(conn, session_id)
+                return False
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            return True
+
+        if not await self.conn_mgr.run(drop_hot, write=True):
+            return False
+
+        if self._archived is None:
+            self._archived = set()
+        self._archived.add(session_id)
+        self._archived_sessions += 1
+        self._archived_messages += count
+        self._raw_bytes += raw_bytes
+        self._stored_bytes += stored_bytes
+        return True
+
+    def _pack(
+        self, conn: sqlite3.Connection, session_id: str
+    ) -> Optional[Tuple[int, float, int, int]]:
+        columns = ", ".join(ARCHIVED_COLUMNS)
+        rows = conn.execute(
+            f"SELECT {columns} FROM messages WHERE session_id = ? ORDER BY seq ASC",
+            (session_id,),
+        ).fetchall()
+        if not rows:
+            return None
+
+        # Imported here: compression builds on this module's codecs. Values are
+        # stored plain in the blob, which is compressed as a whole.
+        from src.infrastructure.database.compression import unpack
+
+        raw = json.dumps(
+            [[unpack(value) for value in row] for row in rows], ensure_ascii=False
+        ).encode("utf-8")
+        blob, codec = compress(raw, self.config.archive_codec)
+        first_timestamp = rows[0]["timestamp"]
+        last_timestamp = rows[-1]["timestamp"]
+        conn.execute(f"""
+            INSERT OR REPLACE INTO {ARCHIVE_SCHEMA}.archived_sessions (
+                session_id, codec, message_count, first_timestamp, last_timestamp,
+                raw_bytes, archived_at, payload
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            session_id, codec, len(rows), first_timestamp, last_timestamp,
+            len(raw), time.time(), blob,
+        ))
+        return len(rows), last_timestamp, len(raw), len(blob)
+
+    def _restore_rows(self, conn: sqlite3.Connection, session_id: str) -> int:
+        # Imported here: the search tokenizer pulls in jieba.
+        from src.utils.search_tokenizer import tokenize_for_index
+
+        row = conn.execute(
+            f"SELECT codec, payload FROM {ARCHIVE_SCHEMA}.archived_sessions WHERE session_id = ?",
+            (session_id,),
+        ).fetchone()
+        if row is None:
+            return 0
+
+        rows = json.loads(decompress(row["payload"], row["codec"]))
+        cursor = conn.cursor()
+        head = cursor.execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'message_changes'"
+        ).fetchone()
+        restored = 0
+        for values in rows:
+            cursor.execute(
+                RESTORE_MESSAGE_SQL, restore_params(values, self.conn_mgr.compressor)
+            )
+            if cursor.rowcount == 0:
+                continue
+            restored += 1
+            message_type, content = values[3], values[4]
+            if message_type == "text" and content:
+                cursor.execute(
+                    "INSERT INTO messages_fts (rowid, session_key, body) VALUES (?, ?, ?)",
+                    (cursor.lastrowid, session_id, tokenize_for_index(content)),
+                )
+        # Restored rows are not news to clients; drop the inserts the change
+        # feed triggers logged for them.
+        cursor.execute(
+            "DELETE FROM message_changes WHERE change_id > ?", (head[0] if head else 0,)
+        )
+        return restored
+
+    @staticmethod
+    def _drop_archive_row(conn: sqlite3.Connection, session_id: str):
+        conn.execute(
+            f"DELETE FROM {ARCHIVE_SCHEMA}.archived_sessions WHERE session_id = ?",
+            (session_id,),
+        )
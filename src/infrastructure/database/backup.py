@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import re
+import shutil
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from src.core.configs import DatabaseConfig, database_config
+
+logger = logging.getLogger(__name__)
+
+# Backup sets are directories named after their start time; retention only
+# ever deletes directories that match this pattern.
+SET_NAME_FORMAT = "%Y%m%d-%H%M%S"
+_SET_NAME = re.compile(r"^\d{8}-\d{6}$")
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+class DatabaseBackup:
+    """
+    Scheduled online backups with the SQLite backup API.
+
+    Each run copies every database file (the main file, the cold archive and
+    any message shards with their archives) into a new directory under
+    ``backup_dir``, ``backup_pages_per_step`` pages at a time with a short
+    sleep between steps. The copy reads through its own connection, so it
+    only ever holds a read lock, and in WAL mode readers never block the
+    writer.
+
+    SQLite restarts a stepped backup whenever another connection writes to
+    the source. After ``backup_max_restarts`` restarts the rest of the file
+    is copied in a single step instead, from one read snapshot, so a busy
+    database still gets backed up. Files are written under a temporary name
+    and renamed once complete. Only the newest ``backup_keep`` sets are kept.
+    """
+
+    def __init__(self, conn_mgr, config: Optional[DatabaseConfig] = None):
+        self.conn_mgr = conn_mgr
+        self.config = config or database_config
+        self._task: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+        self._runs = 0
+        self._failures = 0
+        self._progress: Optional[Dict[str, Any]] = None
+        self._last_report: Optional[Dict[str, Any]] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run_once(self) -> Dict[str, Any]:
+        """Take one backup set now and return its report."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            started = time.perf_counter()
+            target_dir = Path(self.config.backup_dir) / time.strftime(SET_NAME_FORMAT)
+            loop = asyncio.get_running_loop()
+            try:
+                target_dir.mkdir(parents=True, exist_ok=True)
+                files = []
+                for source in self._sources():
+                    # Not on the DB executors: a backup can take a while and
+                    # would otherwise hold up regular reads.
+                    files.append(await loop.run_in_executor(
+                        None, self._copy, source, target_dir / source.name
+                    ))
+                removed = await loop.run_in_executor(None, self._apply_retention)
+            except Exception:
+                self._failures += 1
+                raise
+            finally:
+                self._progress = None
+
+            report = {
+                "started_at": time.time(),
+                "path": str(target_dir),
+                "files": files,
+                "bytes": sum(f["bytes"] for f in files),
+                "removed_sets": removed,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+            }
+            self._runs += 1
+            self._last_report = report
+            return report
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.config.backup_enabled,
+            "running": self._task is not None and not self._task.done(),
+            "interval": self.config.backup_interval,
+            "dir": str(self.config.backup_dir),
+            "in_progress": self._progress,
+            "runs": self._runs,
+            "failures": self._failures,
+            "sets": self._list_sets(),
+            "last_run": self._last_report,
+        }
+
+    async def _run_forever(self):
+        while True:
+            await asyncio.sleep(self.config.backup_interval)
+            try:
+                report = await self.run_once()
+                logger.info(
+                    f"Database backup: {len(report['files'])} files, {report['bytes']} bytes "
+                    f"to {report['path']} in {report['duration_ms']} ms"
+                )
+            except Exception as e:
+                logger.error(f"Database backup failed: {e}", exc_info=True)
+
+    def _sources(self) -> List[Path]:
+        connections = [self.conn_mgr]
+        shards = getattr(self.conn_mgr, "message_shards", None)
+        if shards:
+            connections += shards.connections
+        sources = []
+        for conn in connections:
+            sources.append(conn.db_path)
+            if conn.archive:
+                sources.append(Path(conn.config.archive_path))
+        return [path for path in sources if path.exists()]
+
+    def _copy(self, source: Path, target: Path) -> Dict[str, Any]:
+        started = time.perf_counter()
+        partial = target.with_name(target.name + ".partial")
+        partial.unlink(missing_ok=True)
+        restarts = 0
+        last_remaining: Optional[int] = None
+        single_step = False
+
+        def progress(status: int, remaining: int, total: int):
+            nonlocal restarts, last_remaining
+            if last_remaining is not None and remaining > last_remaining:
+                restarts += 1
+            last_remaining = remaining
+            self._progress = {
+                "file": source.name,
+                "pages_done": total - remaining,
+                "pages_total": total,
+                "restarts": restarts,
+            }
+            if restarts > self.config.backup_max_restarts:
+                raise _TooManyRestarts()
+
+        src = sqlite3.connect(str(source))
+        dst = sqlite3.connect(str(partial))
+        try:
+            try:
+                src.backup(
+                    dst,
+                    pages=max(1, self.config.backup_pages_per_step),
+                    progress=progress,
+                    sleep=self.config.backup_step_sleep_ms / 1000,
+                )
+            except _TooManyRestarts:
+                single_step = True
+                src.backup(dst, pages=-1)
+            pages = dst.execute("PRAGMA page_count").fetchone()[0]
+        finally:
+            dst.close()
+            src.close()
+        partial.replace(target)
+
+        return {
+            "file": source.name,
+            "pages": pages,
+            "bytes": target.stat().st_size,
+            "restarts": restarts,
+            "single_step": single_step,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+
+    def _list_sets(self) -> List[str]:
+        root = Path(self.config.backup_dir)
+        if not root.is_dir():
+            return []
+        return sorted(p.name for p in root.iterdir() if p.is_dir() and _SET_NAME.match(p.name))
+
+    def _apply_retention(self) -> List[str]:
+        keep = max(1, self.config.backup_keep)
+        expired = self._list_sets()[:-keep]
+        for name in expired:
+            shutil.rmtree(Path(self.config.backup_dir) / name, ignore_errors=True)
+        return expired
@@ -0,0 +1,115 @@
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+# (session_id, last seq read from it or None for all of its rows)
+Segment = Tuple[str, Optional[int]]
+
+CHAIN_SQL = """
+    WITH RECURSIVE chain(id, parent_session_id, fork_seq, depth) AS (
+        SELECT id, parent_session_id, fork_seq, 0 FROM sessions WHERE id = ?
+        UNION ALL
+        SELECT s.id, s.parent_session_id, s.fork_seq, chain.depth + 1
+        FROM sessions AS s JOIN chain ON s.id = chain.parent_session_id
+    )
+    SELECT id, fork_seq FROM chain ORDER BY depth
+"""
+
+# Matches the rows of ``messages`` that no branch reads through its session:
+# those above the highest fork point of the session's live branches.
+# Maintenance only purges superseded rows that match it.
+UNSHARED_SQL = """
+    messages.seq > COALESCE((
+        SELECT MAX(b.fork_seq) FROM sessions AS b
+        WHERE b.parent_session_id = messages.session_id
+    ), 0)
+"""
+
+# A branch's own recalled status for a row of its shared prefix. Before a
+# session changes the recalled status of rows its direct branches read, each
+# branch without an override gets one holding the status it saw, so the
+# change stays in that session (append a WHERE clause on ``messages``).
+# Branches of those branches inherit the override (see :func:`override_sql`).
+SNAPSHOT_OVERRIDES_SQL = """
+    INSERT OR IGNORE INTO branch_overrides (message_id, session_id, is_recalled)
+    SELECT messages.id, b.id, messages.is_recalled
+    FROM messages JOIN sessions AS b
+      ON b.parent_session_id = messages.session_id AND messages.seq <= b.fork_seq
+"""
+
+def chain_segments(chain: List[Tuple[str, Optional[int]]]) -> List[Segment]:
+    """
+    Turn a branch chain into the segments its history is read from.
+
+    ``chain`` is ``(session_id, fork_seq)`` from the branch up to its root.
+    Every session contributes its own rows up to the lowest fork point below
+    it in the chain, so the segments' ``seq`` ranges are disjoint and come
+    out newest first.
+    """
+    segments: List[Segment] = []
+    upto: Optional[int] = None
+    for session_id, fork_seq in chain:
+        segments.append((session_id, upto))
+        if fork_seq is not None:
+            upto = fork_seq if upto is None else min(upto, fork_seq)
+    return segments
+
+
+def override_sql(viewers: List[str]) -> Tuple[str, List[str]]:
+    """
+    SQL expression and parameters for the recalled override of
+    ``messages.id`` that ``viewers[0]`` sees.
+
+    ``viewers`` are the sessions of a chain, branch first; the nearest one
+    with an override wins. The expression is NULL if there is none, in which
+    case the row's own ``is_recalled`` applies.
+    """
+    marks = ", ".join("?" for _ in viewers)
+    order = " ".join(f"WHEN ? THEN {depth}" for depth in range(len(viewers)))
+    sql = f"""(
+        SELECT o.is_recalled FROM branch_overrides AS o
+        WHERE o.message_id = messages.id AND o.session_id IN ({marks})
+        ORDER BY CASE o.session_id {order} END
+        LIMIT 1
+    )"""
+    return sql, [*viewers, *viewers]
+
+
+class SessionBranches:
+    """
+    Resolves branch sessions to the parent prefixes they share.
+
+    A branch stores only the messages written after it forked; the rows up
+    to ``fork_seq`` are read from its parent (and, for a branch of a branch,
+    from further up). Recalls on either side of a fork stay on their side:
+    the branch keeps its own status for prefix rows in ``branch_overrides``. The chain of a session never changes once it exists,
+    so it is read once from ``sessions`` and then kept in memory. Sessions
+    without a row are treated as roots but not cached, as their row may
+    still be on its way.
+    """
+
+    def __init__(self, conn_mgr):
+        self.conn_mgr = conn_mgr
+        self._segments: Dict[str, List[Segment]] = {}
+
+    async def segments(self, session_id: str) -> List[Segment]:
+        cached = self._segments.get(session_id)
+        if cached is not None:
+            return cached
+        chain = await self.conn_mgr.run(lambda conn: self._read_chain(conn, session_id))
+        if not chain:
+            return [(session_id, None)]
+        segments = self._segments[session_id] = chain_segments(chain)
+        return segments
+
+    def forget(self, session_id: str):
+        self._segments.pop(session_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "tracked_sessions": len(self._segments),
+            "branches": sum(1 for s in self._segments.values() if len(s) > 1),
+        }
+
+    @staticmethod
+    def _read_chain(conn: sqlite3.Connection, session_id: str) -> List[Tuple[str, Optional[int]]]:
+        return [(row[0], row[1]) for row in conn.execute(CHAIN_SQL, (session_id,))]
@@ -0,0 +1,91 @@
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+from pydantic import BaseModel
+
+T = TypeVar("T")
+
+
+def _clone(value: Any) -> Any:
+    """Copy a cached value so callers can mutate what they get back."""
+    if isinstance(value, BaseModel):
+        return value.model_copy(deep=True)
+    if isinstance(value, list):
+        return [_clone(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _clone(item) for key, item in value.items()}
+    return value
+
+
+class _Region:
+    __slots__ = ("entries", "generation", "hits", "misses", "invalidations")
+
+    def __init__(self):
+        self.entries: Dict[Hashable, Any] = {}
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+
+class ReadCache:
+    """
+    In-process read-through cache for catalog rows (characters, sessions, config).
+
+    One instance is shared by every repository on a :class:`DatabaseConnection`.
+    Entries are grouped in regions, usually one per table, and a write drops
+    its whole region; these tables are small and rarely written. Each region
+    has a generation counter, so a load that raced with a write is returned
+    to its caller but not stored. Values are copied on the way in and out.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._regions: Dict[str, _Region] = {}
+
+    def _region(self, name: str) -> _Region:
+        region = self._regions.get(name)
+        if region is None:
+            region = self._regions.setdefault(name, _Region())
+        return region
+
+    async def get_or_load(
+        self, region_name: str, key: Hashable, load: Callable[[], Awaitable[T]]
+    ) -> T:
+        region = self._region(region_name)
+        with self._lock:
+            if key in region.entries:
+                region.hits += 1
+                return _clone(region.entries[key])
+            region.misses += 1
+            generation = region.generation
+
+        value = await load()
+
+        with self._lock:
+            if region.generation == generation:
+                region.entries[key] = _clone(value)
+        return value
+
+    def invalidate(self, *region_names: str):
+        with self._lock:
+            for name in region_names:
+                region = self._region(name)
+                region.entries.clear()
+                region.generation += 1
+                region.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                name: {
+                    "entries": len(region.entries),
+                    "hits": region.hits,
+                    "misses": region.misses,
+                    "hit_rate": (
+                        round(region.hits / (region.hits + region.misses), 4)
+                        if region.hits + region.misses else 0.0
+                    ),
+                    "invalidations": region.invalidations,
+                }
+                for name, region in self._regions.items()
+            }
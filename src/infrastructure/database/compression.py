@@ -0,0 +1,116 @@
+import logging
+import sqlite3
+import threading
+from typing import Any, Dict, Optional, Union
+
+from src.infrastructure.database.archive import compress, decompress
+
+logger = logging.getLogger(__name__)
+
+# Compressed values are stored as BLOBs: one codec tag byte, then the
+# compressed UTF-8 text. Uncompressed values stay TEXT, so rows written
+# before compression was enabled read back unchanged.
+_TAGS = {"gzip": b"g", "zstd": b"z"}
+_CODECS = {tag: codec for codec, tag in _TAGS.items()}
+
+# (table, column) pairs that hold compressible values, and which file they live in.
+MESSAGE_COLUMNS = (("messages", "metadata"),)
+CATALOG_COLUMNS = (("user_settings", "avatar_data"),)
+
+
+def unpack(value: Union[str, bytes, None]) -> Optional[str]:
+    """Inverse of :meth:`ValueCompressor.pack`; plain text passes through."""
+    if isinstance(value, bytes):
+        return decompress(value[1:], _CODECS[value[:1]]).decode("utf-8")
+    return value
+
+
+class ValueCompressor:
+    """
+    Transparent compression of large TEXT values.
+
+    Values of at least ``compress_threshold_bytes`` (UTF-8) are compressed
+    with ``compress_codec`` on the way in; :func:`unpack` restores them on the
+    way out. Values that do not shrink are stored as they are. Only columns
+    that SQL never looks inside are compressed: tool-result metadata and
+    avatar data URLs, not message content, which feeds the search index.
+    """
+
+    def __init__(self, threshold: int, codec: str):
+        self.threshold = threshold
+        self.codec = codec
+        self._lock = threading.Lock()
+        self._packed = 0
+        self._raw_bytes = 0
+        self._stored_bytes = 0
+
+    def pack(self, value: Union[str, bytes, None]) -> Union[str, bytes, None]:
+        if not isinstance(value, str) or self.threshold <= 0:
+            return value
+        raw = value.encode("utf-8")
+        if len(raw) < self.threshold:
+            return value
+        blob, codec = compress(raw, self.codec)
+        if len(blob) + 1 >= len(raw):
+            return value
+        with self._lock:
+            self._packed += 1
+            self._raw_bytes += len(raw)
+            self._stored_bytes += len(blob) + 1
+        return _TAGS[codec] + blob
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "threshold_bytes": self.threshold,
+                "codec": self.codec,
+                "packed_values": self._packed,
+                "saved_bytes": self._raw_bytes - self._stored_bytes,
+            }
+
+    def compress_existing(self, cursor: sqlite3.Cursor, table: str, column: str) -> int:
+        """Compress the large plain values already stored in ``table.column``."""
+        if self.threshold <= 0:
+            return 0
+        rowids = [row[0] for row in cursor.execute(
+            f"SELECT rowid FROM {table} "
+            f"WHERE typeof({column}) = 'text' AND length(CAST({column} AS BLOB)) >= ?",
+            (self.threshold,),
+        ).fetchall()]
+        packed = 0
+        for rowid in rowids:
+            value = cursor.execute(
+                f"SELECT {column} FROM {table} WHERE rowid = ?", (rowid,)
+            ).fetchone()[0]
+            stored = self.pack(value)
+            if stored is not value:
+                cursor.execute(f"UPDATE {table} SET {column} = ? WHERE rowid = ?", (stored, rowid))
+                packed += 1
+        if packed:
+            logger.info(f"Compressed {packed} values in {table}.{column}")
+        return packed
+
+    @staticmethod
+    def report(conn: sqlite3.Connection, table: str, column: str) -> Dict[str, Any]:
+        """Space used by ``table.column`` and what compression saves in it."""
+        row = conn.execute(
+            f"SELECT COUNT(*), COALESCE(SUM(length(CAST({column} AS BLOB))), 0) "
+            f"FROM {table} WHERE typeof({column}) = 'text'"
+        ).fetchone()
+        plain_values, plain_bytes = row[0], row[1]
+        compressed_values = stored_bytes = raw_bytes = 0
+        blobs = conn.execute(
+            f"SELECT {column} FROM {table} WHERE typeof({column}) = 'blob'"
+        )
+        for (value,) in blobs:
+            compressed_values += 1
+            stored_bytes += len(value)
+            raw_bytes += len(unpack(value).encode("utf-8"))
+        return {
+            "plain_values": plain_values,
+            "plain_bytes": plain_bytes,
+            "compressed_values": compressed_values,
+            "compressed_bytes": stored_bytes,
+            "uncompressed_bytes": raw_bytes,
+            "saved_bytes": raw_bytes - stored_bytes,
+        }
@@ -1,185 +1,946 @@
+import asyncio
+import contextvars
 import sqlite3
 import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from contextlib import contextmanager
-from typing import Generator
+from typing import Any, Callable, Dict, Generator, List, Optional, TypeVar
+from src.core.configs import DatabaseConfig, database_config
+from src.infrastructure.database.archive import ARCHIVE_SCHEMA, SessionArchive
+from src.infrastructure.database.branches import SessionBranches
+from src.infrastructure.database.cache import ReadCache
+from src.infrastructure.database.compression import (
+    CATALOG_COLUMNS,
+    MESSAGE_COLUMNS,
+    ValueCompressor,
+)
+from src.infrastructure.database.group_commit import GroupCommitBuffer
+from src.infrastructure.database.profiler import ProfiledConnection, QueryProfiler, turn_stats
+from src.infrastructure.database import rollups
+from src.infrastructure.database.sequences import MessageSequences
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+# Tables whose changes must invalidate the client's cached copy (see /api/hash).
+VERSIONED_TABLES = ("app_config", "user_settings", "characters", "sessions")
+
+# Schema name a message shard attaches its catalog database under.
+CATALOG_SCHEMA = "catalog"
+
+
+class ConnectionPool:
+    """
+    Bounded pool of long-lived SQLite connections for a single database file.
+
+    Connections are created lazily up to ``max_size`` and per-connection PRAGMAs
+    are applied exactly once, when the connection is opened. Connections are
+    opened with ``check_same_thread=False`` so they can be handed between
+    threads, but each one is only ever used by one borrower at a time.
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        max_size: int,
+        acquire_timeout: float,
+        pragmas: List[str],
+        attachments: Optional[Dict[str, Path]] = None,
+        profiler: Optional[QueryProfiler] = None,
+    ):
+        self.db_path = db_path
+        self.max_size = max(1, max_size)
+        self.acquire_timeout = acquire_timeout
+        self._pragmas = pragmas
+        self._attachments = attachments or {}
+        self._profiler = profiler
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._size = 0
+        self._in_use = 0
+        self._closed = False
+
+        self._created = 0
+        self._discarded = 0
+        self._acquired = 0
+        self._waits = 0
+        self._wait_time = 0.0
+
+    def _open(self) -> sqlite3.Connection:
+        factory = ProfiledConnection if self._profiler else sqlite3.Connection
+        conn = sqlite3.connect(
+            str(self.db_path), timeout=30, check_same_thread=False, factory=factory
+        )
+        if self._profiler:
+            conn.profiler = self._profiler
+        conn.row_factory = sqlite3.Row
+        for schema, path in self._attachments.items():
+            conn.execute(f"ATTACH DATABASE ? AS {schema}", (str(path),))
+        for pragma in self._pragmas:
+            try:
+                conn.execute(pragma)
+            except sqlite3.DatabaseError as e:
+                logger.warning(f"Failed to apply '{pragma}': {e}")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+
+        if conn is None:
+            with self._lock:
+                can_grow = self._size < self.max_size
+                if can_grow:
+                    self._size += 1
+            if can_grow:
+                try:
+                    conn = self._open()
+                except Exception:
+                    with self._lock:
+                        self._size -= 1
+                    raise
+                with self._lock:
+                    self._created += 1
+            else:
+                started = time.perf_counter()
+                try:
+                    conn = self._idle.get(timeout=self.acquire_timeout)
+                except queue.Empty:
+                    raise TimeoutError(
+                        f"Timed out after {self.acquire_timeout}s waiting for a database connection"
+                    )
+                with self._lock:
+                    self._waits += 1
+                    self._wait_time += time.perf_counter() - started
+
+        with self._lock:
+            self._acquired += 1
+            self._in_use += 1
+        return conn
+
+    def release(self, conn: sqlite3.Connection, discard: bool = False):
+        with self._lock:
+            self._in_use -= 1
+
+        if not discard and not self._closed:
+            try:
+                # Never hand out a connection with a dangling implicit transaction.
+                if conn.in_transaction:
+                    conn.rollback()
+            except sqlite3.Error:
+                discard = True
+
+        if discard or self._closed:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+            with self._lock:
+                self._size -= 1
+                self._discarded += 1
+            return
+
+        self._idle.put(conn)
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+            with self._lock:
+                self._size -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "size": self._size,
+                "in_use": self._in_use,
+                "idle": self._idle.qsize(),
+                "created": self._created,
+                "discarded": self._discarded,
+                "acquired": self._acquired,
+                "reused": self._acquired - self._created,
+                "waits": self._waits,
+                "wait_time_ms": round(self._wait_time * 1000, 3),
+            }
+
+
+class ExecutorStats:
+    """Queue-depth and latency counters for one DB executor."""
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.max_queued = 0
+        self.completed = 0
+        self.failed = 0
+        self.queue_time = 0.0
+        self.run_time = 0.0
+        self.last_finished = time.monotonic()
+
+    def submitted(self):
+        with self._lock:
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+
+    def started(self, waited: float):
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+            self.queue_time += waited
+
+    def finished(self, elapsed: float, ok: bool):
+        with self._lock:
+            self.active -= 1
+            self.run_time += elapsed
+            self.last_finished = time.monotonic()
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            done = self.completed + self.failed
+            return {
+                "workers": self.workers,
+                "queued": self.queued,
+                "active": self.active,
+                "max_queued": self.max_queued,
+                "completed": self.completed,
+                "failed": self.failed,
+                "avg_queue_ms": round(self.queue_time / done * 1000, 3) if done else 0.0,
+                "avg_run_ms": round(self.run_time / done * 1000, 3) if done else 0.0,
+            }
+
 
 class DatabaseConnection:
-    def __init__(self, db_path: str):
+    """
+    Owns the connection pool and the executors that run SQLite work.
+
+    Repositories must go through :meth:`run`, which executes a callable on a
+    DB thread so the asyncio event loop never blocks on SQLite. Writes are
+    serialized on a single writer thread (SQLite allows one writer at a
+    time anyway), reads fan out over a small reader pool.
+
+    With ``message_shards`` set, this connection is the catalog (characters,
+    sessions, config) and messages live in :class:`MessageShards`, each shard
+    a ``DatabaseConnection`` of its own with ``catalog_path`` pointing back
+    here. A shard holds only the message tables and attaches the catalog so
+    that maintenance queries against ``sessions`` resolve there; it never
+    writes to the catalog.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        config: Optional[DatabaseConfig] = None,
+        catalog_path: Optional[Path] = None,
+    ):
         self.db_path = Path(db_path)
+        self.config = config or database_config
+        self.catalog_path = Path(catalog_path) if catalog_path else None
         self._prepare_database_path()
+        attachments: Dict[str, Path] = {}
+        if self.catalog_path:
+            attachments[CATALOG_SCHEMA] = self.catalog_path
+        self.archive: Optional[SessionArchive] = None
+        if self.config.archive_enabled and self.holds_messages:
+            archive_path = Path(self.config.archive_path)
+            archive_path.parent.mkdir(parents=True, exist_ok=True)
+            attachments[ARCHIVE_SCHEMA] = archive_path
+            self.archive = SessionArchive(self, self.config)
+        self.compressor = ValueCompressor(
+            self.config.compress_threshold_bytes, self.config.compress_codec
+        )
+        self.profiler: Optional[QueryProfiler] = None
+        if self.config.profile_queries:
+            self.profiler = QueryProfiler()
+        self.pool = ConnectionPool(
+            self.db_path,
+            max_size=self.config.pool_size,
+            acquire_timeout=self.config.pool_timeout,
+            pragmas=self._connection_pragmas(),
+            attachments=attachments,
+            profiler=self.profiler,
+        )
+        read_workers = max(1, self.config.read_workers)
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self._readers = ThreadPoolExecutor(
+            max_workers=read_workers, thread_name_prefix="db-reader"
+        )
+        self._writer_stats = ExecutorStats("writer", 1)
+        self._reader_stats = ExecutorStats("reader", read_workers)
+        self.read_cache: Optional[ReadCache] = None
+        if self.config.read_cache and self.holds_catalog:
+            self.read_cache = ReadCache()
+        self.sequences: Optional[MessageSequences] = None
+        self.branches: Optional[SessionBranches] = None
+        if self.holds_messages:
+            self.sequences = MessageSequences(self)
+            self.branches = SessionBranches(self)
+        self.write_buffer: Optional[GroupCommitBuffer] = None
+        if self.config.group_commit:
+            self.write_buffer = GroupCommitBuffer(
+                self,
+                window_ms=self.config.group_commit_window_ms,
+                max_batch=self.config.group_commit_max_batch,
+            )
+        self._enable_wal()
         self._ensure_schema()
+        self.message_shards = None
+        if not self.holds_messages:
+            from src.infrastructure.database.sharding import MessageShards
+            self.message_shards = MessageShards(self)
+
+    @property
+    def holds_catalog(self) -> bool:
+        """Whether characters, sessions and config live in this file."""
+        return self.catalog_path is None
+
+    @property
+    def holds_messages(self) -> bool:
+        """Whether messages live in this file rather than in shards."""
+        return self.catalog_path is not None or self.config.message_shards <= 0
 
     def _prepare_database_path(self):
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
 
+    def _connection_pragmas(self) -> List[str]:
+        """PRAGMAs that are scoped to a connection and applied once when it opens."""
+        return [
+            f"PRAGMA busy_timeout = {int(self.config.busy_timeout_ms)}",
+            "PRAGMA foreign_keys = ON",
+            "PRAGMA synchronous = NORMAL",
+            f"PRAGMA cache_size = -{int(self.config.cache_size_kb)}",
+            f"PRAGMA mmap_size = {int(self.config.mmap_size)}",
+            "PRAGMA temp_store = MEMORY",
+        ]
+
+    def _enable_wal(self):
+        # journal_mode is persistent in the database file, so it only needs setting once.
+        with self._borrow() as conn:
+            # auto_vacuum only takes effect on a fresh file, so it must come
+            # first; existing files are converted by DatabaseMaintenance.
+            schemas = ["main"] + ([ARCHIVE_SCHEMA] if self.archive else [])
+            for schema in schemas:
+                conn.execute(f"PRAGMA {schema}.auto_vacuum = INCREMENTAL")
+                row = conn.execute(f"PRAGMA {schema}.journal_mode = WAL").fetchone()
+                mode = row[0] if row else None
+                if str(mode).lower() != "wal":
+                    logger.warning(f"WAL mode not available for {schema}, journal_mode={mode}")
+
     def _ensure_schema(self):
-        with self.transaction() as conn:
+        with self._borrow(write=True) as conn:
             cursor = conn.cursor()
 
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS messages (
-                    id TEXT PRIMARY KEY,
-                    session_id TEXT NOT NULL,
-                    sender_id TEXT NOT NULL,
-                    type TEXT NOT NULL,
-                    content TEXT NOT NULL,
-                    metadata TEXT,
-                    is_recalled BOOLEAN DEFAULT FALSE,
-                    is_read BOOLEAN DEFAULT FALSE,
-                    timestamp REAL NOT NULL,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_session_timestamp
-                ON messages(session_id, timestamp)
-            """)
-
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_sender
-                ON messages(sender_id)
-            """)
-
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_type
-                ON messages(type)
-            """)
-
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS characters (
-                    id TEXT PRIMARY KEY,
-                    name TEXT NOT NULL,
-                    avatar TEXT,
-                    persona TEXT NOT NULL,
-                    is_builtin BOOLEAN,
-
-                    timeline_hesitation_probability REAL,
-                    timeline_hesitation_cycles_min INTEGER,
-                    timeline_hesitation_cycles_max INTEGER,
-                    timeline_hesitation_duration_min INTEGER,
-                    timeline_hesitation_duration_max INTEGER,
-                    timeline_hesitation_gap_min INTEGER,
-                    timeline_hesitation_gap_max INTEGER,
-
-                    timeline_typing_lead_time_threshold_1 INTEGER,
-                    timeline_typing_lead_time_1 INTEGER,
-                    timeline_typing_lead_time_threshold_2 INTEGER,
-                    timeline_typing_lead_time_2 INTEGER,
-                    timeline_typing_lead_time_threshold_3 INTEGER,
-                    timeline_typing_lead_time_3 INTEGER,
-                    timeline_typing_lead_time_threshold_4 INTEGER,
-                    timeline_typing_lead_time_4 INTEGER,
-                    timeline_typing_lead_time_threshold_5 INTEGER,
-                    timeline_typing_lead_time_5 INTEGER,
-                    timeline_typing_lead_time_default INTEGER,
-
-                    timeline_entry_delay_min INTEGER,
-                    timeline_entry_delay_max INTEGER,
-
-                    timeline_initial_delay_weight_1 REAL,
-                    timeline_initial_delay_range_1_min INTEGER,
-                    timeline_initial_delay_range_1_max INTEGER,
-                    timeline_initial_delay_weight_2 REAL,
-                    timeline_initial_delay_range_2_min INTEGER,
-                    timeline_initial_delay_range_2_max INTEGER,
-                    timeline_initial_delay_weight_3 REAL,
-                    timeline_initial_delay_range_3_min INTEGER,
-                    timeline_initial_delay_range_3_max INTEGER,
-                    timeline_initial_delay_range_4_min INTEGER,
-                    timeline_initial_delay_range_4_max INTEGER,
-
-                    segmenter_enable BOOLEAN,
-                    segmenter_max_length INTEGER,
-
-                    typo_enable BOOLEAN,
-                    typo_base_rate REAL,
-                    typo_recall_rate REAL,
-
-                    recall_enable BOOLEAN,
-                    recall_delay REAL,
-                    recall_retype_delay REAL,
-
-                    pause_min_duration REAL,
-                    pause_max_duration REAL,
-
-                    sticker_packs TEXT,
-                    sticker_send_probability REAL,
-                    sticker_confidence_threshold_positive REAL,
-                    sticker_confidence_threshold_neutral REAL,
-                    sticker_confidence_threshold_negative REAL,
-
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS sessions (
-                    id TEXT PRIMARY KEY,
-                    character_id TEXT NOT NULL,
-                    is_active BOOLEAN DEFAULT FALSE,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (character_id) REFERENCES characters(id) ON DELETE CASCADE,
-                    UNIQUE(character_id)
-                )
-            """)
-
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_active_session
-                ON sessions(is_active)
-            """)
-
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS app_config (
-                    key TEXT PRIMARY KEY,
-                    value TEXT NOT NULL,
-                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS user_settings (
-                    user_id TEXT PRIMARY KEY,
-                    avatar_data TEXT,
-                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
+            self._ensure_message_schema(cursor)
+
+            if self.holds_catalog:
+                self._ensure_catalog_schema(cursor)
+                self._ensure_version_counters(cursor)
+
+            if self.archive:
+                SessionArchive.ensure_schema(cursor)
+
+            self._run_migrations(cursor)
 
             conn.commit()
 
+            if self.archive:
+                self.archive.load(conn)
+
+    def _ensure_message_schema(self, cursor: sqlite3.Cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS messages (
+                id TEXT PRIMARY KEY,
+                session_id TEXT NOT NULL,
+                sender_id TEXT NOT NULL,
+                type TEXT NOT NULL,
+                content TEXT NOT NULL,
+                metadata TEXT,
+                is_recalled BOOLEAN DEFAULT FALSE,
+                is_read BOOLEAN DEFAULT FALSE,
+                timestamp REAL NOT NULL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                seq INTEGER,
+                idempotency_key TEXT
+            )
+        """)
+
+        columns = {row[1] for row in cursor.execute("PRAGMA table_info(messages)")}
+        if "seq" not in columns:
+            # Filled in by _assign_message_seq.
+            cursor.execute("ALTER TABLE messages ADD COLUMN seq INTEGER")
+        if "idempotency_key" not in columns:
+            cursor.execute("ALTER TABLE messages ADD COLUMN idempotency_key TEXT")
+
+        cursor.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_session_seq
+            ON messages(session_id, seq)
+        """)
+
+        # Client-supplied keys of user sends; a resend with the same key is a no-op.
+        cursor.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_session_idempotency
+            ON messages(session_id, idempotency_key)
+            WHERE idempotency_key IS NOT NULL
+        """)
+
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_session_timestamp
+            ON messages(session_id, timestamp)
+        """)
+
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_sender
+            ON messages(sender_id)
+        """)
+
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_type
+            ON messages(type)
+        """)
+
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_session_type_timestamp
+            ON messages(session_id, type, timestamp)
+        """)
+
+
+        # Full-text index over text messages. Bodies are pre-segmented
+        # with jieba (see src.utils.search_tokenizer), so unicode61 only
+        # has to split on spaces; rowid matches messages.rowid.
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+                session_key,
+                body,
+                tokenize = "unicode61 remove_diacritics 2 tokenchars '-_'"
+            )
+        """)
+
+        # Change feed for delta sync: inserts and updates are logged by
+        # triggers; MessageRepository logs deletes itself so that archiving
+        # a session does not show up as deleting its messages.
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS message_changes (
+                change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                message_id TEXT NOT NULL,
+                op TEXT NOT NULL,
+                changed_at REAL NOT NULL
+            )
+        """)
+
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_changes_session
+            ON message_changes(session_id, change_id)
+        """)
+
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_messages_change_insert
+            AFTER INSERT ON messages
+            BEGIN
+                INSERT INTO message_changes (session_id, message_id, op, changed_at)
+                VALUES (new.session_id, new.id, 'insert', (julianday('now') - 2440587.5) * 86400.0);
+            END
+        """)
+
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_messages_change_update
+            AFTER UPDATE OF type, content, metadata, is_recalled, is_read ON messages
+            WHEN old.type IS NOT new.type
+              OR old.content IS NOT new.content
+              OR old.metadata IS NOT new.metadata
+              OR old.is_recalled IS NOT new.is_recalled
+              OR old.is_read IS NOT new.is_read
+            BEGIN
+                INSERT INTO message_changes (session_id, message_id, op, changed_at)
+                VALUES (new.session_id, new.id, 'update', (julianday('now') - 2440587.5) * 86400.0);
+            END
+        """)
+
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_messages_fts_delete
+            AFTER DELETE ON messages
+            BEGIN
+                DELETE FROM messages_fts WHERE rowid = old.rowid;
+            END
+        """)
+
+        # A branch's own recalled status for rows of its shared prefix, so
+        # recalls on either side of a fork stay on that side (see branches.py).
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS branch_overrides (
+                message_id TEXT NOT NULL,
+                session_id TEXT NOT NULL,
+                is_recalled BOOLEAN NOT NULL,
+                PRIMARY KEY (message_id, session_id)
+            ) WITHOUT ROWID
+        """)
+
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_branch_overrides_session
+            ON branch_overrides(session_id)
+        """)
+
+        rollups.ensure_schema(cursor)
+
+    def _ensure_catalog_schema(self, cursor: sqlite3.Cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS characters (
+                id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                avatar TEXT,
+                persona TEXT NOT NULL,
+                is_builtin BOOLEAN,
+
+                timeline_hesitation_probability REAL,
+                timeline_hesitation_cycles_min INTEGER,
+                timeline_hesitation_cycles_max INTEGER,
+                timeline_hesitation_duration_min INTEGER,
+                timeline_hesitation_duration_max INTEGER,
+                timeline_hesitation_gap_min INTEGER,
+                timeline_hesitation_gap_max INTEGER,
+
+                timeline_typing_lead_time_threshold_1 INTEGER,
+                timeline_typing_lead_time_1 INTEGER,
+                timeline_typing_lead_time_threshold_2 INTEGER,
+                timeline_typing_lead_time_2 INTEGER,
+                timeline_typing_lead_time_threshold_3 INTEGER,
+                timeline_typing_lead_time_3 INTEGER,
+                timeline_typing_lead_time_threshold_4 INTEGER,
+                timeline_typing_lead_time_4 INTEGER,
+                timeline_typing_lead_time_threshold_5 INTEGER,
+                timeline_typing_lead_time_5 INTEGER,
+                timeline_typing_lead_time_default INTEGER,
+
+                timeline_entry_delay_min INTEGER,
+                timeline_entry_delay_max INTEGER,
+
+                timeline_initial_delay_weight_1 REAL,
+                timeline_initial_delay_range_1_min INTEGER,
+                timeline_initial_delay_range_1_max INTEGER,
+                timeline_initial_delay_weight_2 REAL,
+                timeline_initial_delay_range_2_min INTEGER,
+                timeline_initial_delay_range_2_max INTEGER,
+                timeline_initial_delay_weight_3 REAL,
+                timeline_initial_delay_range_3_min INTEGER,
+                timeline_initial_delay_range_3_max INTEGER,
+                timeline_initial_delay_range_4_min INTEGER,
+                timeline_initial_delay_range_4_max INTEGER,
+
+                segmenter_enable BOOLEAN,
+                segmenter_max_length INTEGER,
+
+                typo_enable BOOLEAN,
+                typo_base_rate REAL,
+                typo_recall_rate REAL,
+
+                recall_enable BOOLEAN,
+                recall_delay REAL,
+                recall_retype_delay REAL,
+
+                pause_min_duration REAL,
+                pause_max_duration REAL,
+
+                sticker_packs TEXT,
+                sticker_send_probability REAL,
+                sticker_confidence_threshold_positive REAL,
+                sticker_confidence_threshold_neutral REAL,
+                sticker_confidence_threshold_negative REAL,
+
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        self._ensure_sessions_table(cursor)
+
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_active_session
+            ON sessions(is_active)
+        """)
+
+        # One root session per character; branches share its character.
+        cursor.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_character_session
+            ON sessions(character_id) WHERE parent_session_id IS NULL
+        """)
+
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_session_parent
+            ON sessions(parent_session_id)
+        """)
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS app_config (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS user_settings (
+                user_id TEXT PRIMARY KEY,
+                avatar_data TEXT,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS session_state (
+                session_id TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (session_id, key)
+            ) WITHOUT ROWID
+        """)
+
+    def _ensure_sessions_table(self, cursor: sqlite3.Cursor):
+        create = """
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                character_id TEXT NOT NULL,
+                is_active BOOLEAN DEFAULT FALSE,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                parent_session_id TEXT,
+                fork_seq INTEGER,
+                FOREIGN KEY (character_id) REFERENCES characters(id) ON DELETE CASCADE,
+                FOREIGN KEY (parent_session_id) REFERENCES sessions(id) ON DELETE CASCADE
+            )
+        """
+        columns = {row[1] for row in cursor.execute("PRAGMA table_info(sessions)")}
+        if not columns or "parent_session_id" in columns:
+            cursor.execute(create)
+            return
+
+        # Older files have UNIQUE(character_id) in the table definition, which
+        # only a rebuild can drop. Nothing references sessions by foreign key,
+        # and its triggers and indexes are recreated right after.
+        cursor.execute("ALTER TABLE sessions RENAME TO sessions_legacy")
+        cursor.execute(create)
+        cursor.execute("""
+            INSERT INTO sessions (id, character_id, is_active, created_at)
+            SELECT id, character_id, is_active, created_at FROM sessions_legacy
+        """)
+        cursor.execute("DROP TABLE sessions_legacy")
+        logger.info("Rebuilt sessions table for branching")
+
+    def _ensure_version_counters(self, cursor: sqlite3.Cursor):
+        """
+        Per-table change counters behind /api/hash, bumped by triggers.
+
+        The ``epoch`` row is random per database file so counters restarting
+        in a recreated file cannot reproduce an old hash.
+        """
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS table_versions (
+                table_name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("""
+            INSERT OR IGNORE INTO table_versions (table_name, version)
+            VALUES ('epoch', abs(random()))
+        """)
+        for table in VERSIONED_TABLES:
+            cursor.execute(
+                "INSERT OR IGNORE INTO table_versions (table_name, version) VALUES (?, 0)",
+                (table,),
+            )
+            for event in ("INSERT", "UPDATE", "DELETE"):
+                cursor.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_{table}_version_{event.lower()}
+                    AFTER {event} ON {table}
+                    BEGIN
+                        UPDATE table_versions SET version = version + 1
+                        WHERE table_name = '{table}';
+                    END
+                """)
+
+    def _run_migrations(self, cursor: sqlite3.Cursor):
+        """Apply data migrations newer than the file's PRAGMA user_version."""
+        migrations = [
+            self._migrate_state_messages,
+            self._backfill_message_search,
+            self._assign_message_seq,
+            self._compress_large_values,
+            self._backfill_message_rollups,
+        ]
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        for target, migrate in enumerate(migrations, start=1):
+            if version < target:
+                migrate(cursor)
+                cursor.execute(f"PRAGMA user_version = {target}")
+                logger.info(f"Database migrated to schema version {target}")
+
+    def _assign_message_seq(self, cursor: sqlite3.Cursor):
+        # Number existing messages per session in the order they used to be
+        # sorted in; rowid breaks timestamp ties in insertion order.
+        cursor.execute("""
+            UPDATE messages SET seq = numbered.seq
+            FROM (
+                SELECT rowid AS row_id,
+                       ROW_NUMBER() OVER (
+                           PARTITION BY session_id ORDER BY timestamp, rowid
+                       ) AS seq
+                FROM messages
+            ) AS numbered
+            WHERE messages.rowid = numbered.row_id
+        """)
+        logger.info(f"Assigned seq to {cursor.rowcount} messages")
+
+    def _compress_large_values(self, cursor: sqlite3.Cursor):
+        head = cursor.execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'message_changes'"
+        ).fetchone()
+        columns = MESSAGE_COLUMNS + (CATALOG_COLUMNS if self.holds_catalog else ())
+        for table, column in columns:
+            self.compressor.compress_existing(cursor, table, column)
+        # Re-encoding is not a change clients need to sync.
+        cursor.execute(
+            "DELETE FROM message_changes WHERE change_id > ?", (head[0] if head else 0,)
+        )
+
+    def _backfill_message_rollups(self, cursor: sqlite3.Cursor):
+        rollups.rebuild(cursor, include_archive=self.archive is not None)
+
+    def _backfill_message_search(self, cursor: sqlite3.Cursor):
+        from src.utils.search_tokenizer import tokenize_for_index
+
+        cursor.execute("DELETE FROM messages_fts")
+        rows = cursor.execute(
+            "SELECT rowid, session_id, content FROM messages WHERE type = 'text'"
+        )
+        indexed = 0
+        while True:
+            batch = rows.fetchmany(1000)
+            if not batch:
+                break
+            cursor.connection.executemany(
+                "INSERT INTO messages_fts (rowid, session_key, body) VALUES (?, ?, ?)",
+                [(row[0], row[1], tokenize_for_index(row[2])) for row in batch],
+            )
+            indexed += len(batch)
+        logger.info(f"Indexed {indexed} messages for full-text search")
+
+    def _migrate_state_messages(self, cursor: sqlite3.Cursor):
+        if not self.holds_catalog:
+            # Shard files are created after session_state existed.
+            return
+        # Latest emotion per session
+        cursor.execute("""
+            INSERT OR IGNORE INTO session_state (session_id, key, value, updated_at)
+            SELECT m.session_id, 'emotion', m.metadata, m.timestamp
+            FROM messages m
+            WHERE m.type = 'system-emotion'
+              AND m.timestamp = (
+                  SELECT MAX(timestamp) FROM messages
+                  WHERE session_id = m.session_id AND type = 'system-emotion'
+              )
+        """)
+        # Latest typing flag per (session, user)
+        cursor.execute("""
+            INSERT OR IGNORE INTO session_state (session_id, key, value, updated_at)
+            SELECT m.session_id,
+                   'typing:' || json_extract(m.metadata, '$.user_id'),
+                   CASE WHEN json_extract(m.metadata, '$.is_typing') THEN 'true' ELSE 'false' END,
+                   m.timestamp
+            FROM messages m
+            WHERE m.type = 'system-typing'
+              AND json_extract(m.metadata, '$.user_id') IS NOT NULL
+              AND m.timestamp = (
+                  SELECT MAX(timestamp) FROM messages
+                  WHERE session_id = m.session_id
+                    AND type = 'system-typing'
+                    AND json_extract(metadata, '$.user_id') = json_extract(m.metadata, '$.user_id')
+              )
+        """)
+        # Blocked sessions
+        cursor.execute("""
+            INSERT OR IGNORE INTO session_state (session_id, key, value, updated_at)
+            SELECT session_id, 'blocked', 'true', MIN(timestamp)
+            FROM messages
+            WHERE type = 'system-blocked'
+            GROUP BY session_id
+        """)
+        # Typing state now lives only in session_state
+        cursor.execute("DELETE FROM messages WHERE type = 'system-typing'")
+
     @contextmanager
-    def transaction(self) -> Generator[sqlite3.Connection, None, None]:
-        conn = sqlite3.connect(str(self.db_path), timeout=30)
-        conn.row_factory = sqlite3.Row
-        try:
-            conn.execute("PRAGMA busy_timeout = 30000")
-            conn.execute("PRAGMA foreign_keys = ON")
-        except Exception:
-            pass
+    def _borrow(self, write: bool = False) -> Generator[sqlite3.Connection, None, None]:
+        conn = self.pool.acquire()
+        broken = False
         try:
             yield conn
-            conn.commit()
+            if write:
+                conn.commit()
         except Exception as e:
-            conn.rollback()
+            if write:
+                try:
+                    conn.rollback()
+                except sqlite3.Error:
+                    broken = True
             raise e
         finally:
-            conn.close()
+            self.pool.release(conn, discard=broken)
+
+    @staticmethod
+    def _assert_off_event_loop():
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        raise RuntimeError(
+            "Blocking SQLite access on the event loop thread; use DatabaseConnection.run()"
+        )
+
+    @contextmanager
+    def transaction(self) -> Generator[sqlite3.Connection, None, None]:
+        self._assert_off_event_loop()
+        with self._borrow(write=True) as conn:
+            yield conn
 
     @contextmanager
     def get_connection(self) -> Generator[sqlite3.Connection, None, None]:
-        conn = sqlite3.connect(str(self.db_path), timeout=30)
-        conn.row_factory = sqlite3.Row
-        try:
-            conn.execute("PRAGMA busy_timeout = 30000")
-            conn.execute("PRAGMA foreign_keys = ON")
-        except Exception:
-            pass
-        try:
+        self._assert_off_event_loop()
+        with self._borrow() as conn:
             yield conn
-        finally:
-            conn.close()
+
+    async def run(
+        self, fn: Callable[[sqlite3.Connection], T], write: bool = False
+    ) -> T:
+        """
+        Run ``fn(conn)`` on a DB thread and await its result.
+
+        With ``write=True`` the callable runs on the writer thread inside a
+        transaction that is committed on success and rolled back on error.
+        """
+        executor = self._writer if write else self._readers
+        stats = self._writer_stats if write else self._reader_stats
+        submitted_at = time.perf_counter()
+        stats.submitted()
+
+        def task() -> T:
+            started = time.perf_counter()
+            stats.started(started - submitted_at)
+            ok = False
+            try:
+                with self._borrow(write=write) as conn:
+                    result = fn(conn)
+                ok = True
+                return result
+            finally:
+                stats.finished(time.perf_counter() - started, ok)
+
+        loop = asyncio.get_running_loop()
+        if self.profiler:
+            # Carry the caller's user turn (see profiler.user_turn) to the DB thread.
+            return await loop.run_in_executor(executor, contextvars.copy_context().run, task)
+        return await loop.run_in_executor(executor, task)
+
+    def idle_seconds(self) -> float:
+        """Seconds since the last DB task finished, or 0 while any is queued/running."""
+        executors = (self._writer_stats, self._reader_stats)
+        if any(s.queued or s.active for s in executors):
+            return 0.0
+        if self.write_buffer and self.write_buffer.stats()["pending"]:
+            return 0.0
+        return time.monotonic() - max(s.last_finished for s in executors)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": str(self.db_path),
+            "pool": self.pool.stats(),
+            "executors": {
+                "writer": self._writer_stats.snapshot(),
+                "reader": self._reader_stats.snapshot(),
+            },
+            "group_commit": self.write_buffer.stats() if self.write_buffer else None,
+            "archive": self.archive.stats() if self.archive else None,
+            "read_cache": self.read_cache.stats() if self.read_cache else None,
+            "sequences": self.sequences.stats() if self.sequences else None,
+            "branches": self.branches.stats() if self.branches else None,
+            "compression": self.compressor.stats(),
+            "profiling": self.profiler is not None,
+            "shards": self.message_shards.stats() if self.message_shards else None,
+        }
+
+    def profile(self) -> Dict[str, Any]:
+        """Per-statement profile of this file and its shards; empty unless profiling."""
+        return {
+            "path": str(self.db_path),
+            "statements": self.profiler.stats() if self.profiler else [],
+            "turns": turn_stats(),
+            "shards": (
+                [shard.profile() for shard in self.message_shards.connections]
+                if self.message_shards else None
+            ),
+        }
+
+    async def explain_queries(self) -> List[Dict[str, Any]]:
+        """EXPLAIN QUERY PLAN for every statement profiled here and in the shards."""
+        plans = await self.run(self.profiler.explain) if self.profiler else []
+        if self.message_shards:
+            for shard in self.message_shards.connections:
+                plans.extend(await shard.explain_queries())
+        return plans
+
+    async def compression_report(self) -> Dict[str, Any]:
+        """Space saved by value compression in this file and its shards."""
+        columns = (MESSAGE_COLUMNS if self.holds_messages else ()) + (
+            CATALOG_COLUMNS if self.holds_catalog else ()
+        )
+
+        def op(conn: sqlite3.Connection) -> Dict[str, Any]:
+            return {
+                f"{table}.{column}": ValueCompressor.report(conn, table, column)
+                for table, column in columns
+            }
+
+        return {
+            "path": str(self.db_path),
+            "columns": await self.run(op),
+            "since_start": self.compressor.stats(),
+            "shards": (
+                [await shard.compression_report() for shard in self.message_shards.connections]
+                if self.message_shards else None
+            ),
+        }
+
+    async def drain(self):
+        """Commit any writes still sitting in the group-commit buffer."""
+        if self.write_buffer:
+            await self.write_buffer.close()
+        if self.message_shards:
+            await self.message_shards.drain()
+
+    def close(self):
+        if self.message_shards:
+            self.message_shards.close()
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+        self.pool.close()
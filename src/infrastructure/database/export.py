@@ -0,0 +1,421 @@
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import re
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from src.core.configs import DatabaseConfig, database_config
+from src.infrastructure.database.archive import ARCHIVED_COLUMNS, decompress
+from src.infrastructure.database.compression import unpack
+
+logger = logging.getLogger(__name__)
+
+# Exports are directories named after their start time, like backup sets.
+EXPORT_NAME_FORMAT = "%Y%m%d-%H%M%S"
+
+# Flattened metadata keys become "meta.<key>" columns; nested objects are
+# joined with dots ("meta.tool_call.name"). Lists stay JSON text.
+META_PREFIX = "meta."
+
+_PARTITION_UNSAFE = re.compile(r"[^A-Za-z0-9_.-]")
+# Messages whose session row is gone; Hive tools read this as a NULL key.
+_NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        return None
+    return pyarrow
+
+
+def _flatten(metadata: Any, prefix: str = "") -> Iterator[Tuple[str, Any]]:
+    if not isinstance(metadata, dict):
+        return
+    for key, value in metadata.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict) and value:
+            yield from _flatten(value, f"{path}.")
+        else:
+            yield path, value
+
+
+def _kind(value: Any) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "int"
+    if isinstance(value, float):
+        return "float"
+    return "string"
+
+
+def _merge_kinds(current: Optional[str], new: str) -> str:
+    if new == "null" or current == new:
+        return current or new
+    if current in (None, "null"):
+        return new
+    if {current, new} == {"int", "float"}:
+        return "float"
+    return "string"
+
+
+def _load_metadata(value: Any) -> Any:
+    text = unpack(value)
+    if not text:
+        return None
+    try:
+        return json.loads(text)
+    except (TypeError, ValueError):
+        return None
+
+
+class MessageExporter:
+    """
+    Streams ``messages`` into partitioned Parquet files for offline analysis.
+
+    Every message file (the main file or each shard, plus its cold archive)
+    is read through its own read-only connection inside one read
+    transaction, so the export is a consistent snapshot of that file and
+    never holds up the writer. Rows are read and written
+    ``export_batch_rows`` at a time, one Parquet row group per batch, so
+    memory stays bounded by the batch size rather than by the table;
+    archived sessions are decompressed one session at a time.
+
+    Metadata is flattened into ``meta.<key>`` columns. A first pass over the
+    metadata of every file collects the keys and their value types so the
+    whole export shares one schema; at most ``export_max_metadata_columns`` keys are
+    flattened, the rest are only in the raw ``metadata`` column.
+
+    Output is Hive-partitioned by character::
+
+        <export_dir>/<timestamp>/messages/character_id=<id>/part-<file>.parquet
+
+    The export is written under ``<timestamp>.partial`` and renamed once
+    complete. Needs ``pyarrow``.
+    """
+
+    def __init__(self, conn_mgr, config: Optional[DatabaseConfig] = None):
+        self.conn_mgr = conn_mgr
+        self.config = config or database_config
+        self._lock: Optional[asyncio.Lock] = None
+        self._runs = 0
+        self._last_report: Optional[Dict[str, Any]] = None
+
+    async def export(self, target_dir: Optional[str] = None) -> Dict[str, Any]:
+        """Write one export now and return its report."""
+        if _pyarrow() is None:
+            raise RuntimeError("pyarrow is required to export messages to Parquet")
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            # Make buffered message writes visible to the export.
+            await self.conn_mgr.drain()
+            loop = asyncio.get_running_loop()
+            # Not on the DB executors, for the same reason as backups.
+            report = await loop.run_in_executor(None, self._export, target_dir)
+            logger.info(
+                f"Exported {report['rows']} messages in {len(report['files'])} files "
+                f"to {report['path']} in {report['duration_ms']} ms"
+            )
+            self._runs += 1
+            self._last_report = report
+            return report
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "available": _pyarrow() is not None,
+            "dir": str(self.config.export_dir),
+            "runs": self._runs,
+            "last_run": self._last_report,
+        }
+
+    def _export(self, target_dir: Optional[str]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        root = Path(target_dir or self.config.export_dir)
+        name = time.strftime(EXPORT_NAME_FORMAT)
+        partial = root / f"{name}.partial"
+        partial.mkdir(parents=True, exist_ok=False)
+
+        sources = self._sources()
+        characters = self._session_characters()
+        kinds: Dict[str, str] = {}
+        for db_path, archive_path in sources:
+            self._collect_metadata_kinds(db_path, archive_path, kinds)
+        schema = self._schema(_pyarrow(), dict(sorted(kinds.items())))
+
+        files = []
+        for db_path, archive_path in sources:
+            files += self._export_file(
+                db_path, archive_path, characters, kinds, schema, partial / "messages"
+            )
+
+        target = root / name
+        partial.rename(target)
+        for entry in files:
+            entry["path"] = str(target / entry.pop("relative_path"))
+        return {
+            "path": str(target),
+            "files": files,
+            "rows": sum(f["rows"] for f in files),
+            "bytes": sum(Path(f["path"]).stat().st_size for f in files),
+            "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+
+    def _sources(self) -> List[Tuple[Path, Optional[Path]]]:
+        shards = getattr(self.conn_mgr, "message_shards", None)
+        connections = shards.connections if shards else [self.conn_mgr]
+        sources = []
+        for conn in connections:
+            archive_path = Path(conn.config.archive_path) if conn.archive else None
+            if archive_path is not None and not archive_path.exists():
+                archive_path = None
+            sources.append((conn.db_path, archive_path))
+        return sources
+
+    def _connect(self, db_path: Path, archive_path: Optional[Path] = None) -> sqlite3.Connection:
+        conn = sqlite3.connect(f"{db_path.resolve().as_uri()}?mode=ro", uri=True)
+        if archive_path is not None:
+            conn.execute(
+                "ATTACH DATABASE ? AS archive", (f"{archive_path.resolve().as_uri()}?mode=ro",)
+            )
+        return conn
+
+    def _session_characters(self) -> Dict[str, str]:
+        conn = self._connect(self.conn_mgr.db_path)
+        try:
+            return dict(conn.execute("SELECT id, character_id FROM sessions").fetchall())
+        finally:
+            conn.close()
+
+    def _export_file(
+        self,
+        db_path: Path,
+        archive_path: Optional[Path],
+        characters: Dict[str, str],
+        kinds: Dict[str, str],
+        schema,
+        out_dir: Path,
+    ) -> List[Dict[str, Any]]:
+        pyarrow = _pyarrow()
+        conn = self._connect(db_path, archive_path)
+        writers: Dict[str, Any] = {}
+        paths: Dict[str, Path] = {}
+        counts: Dict[str, int] = {}
+        try:
+            # One read transaction, so the hot rows and the archive are read
+            # from the same snapshot.
+            conn.execute("BEGIN")
+            archived = self._archived_sessions(conn) if archive_path else []
+
+            def write(batch: List[Dict[str, Any]]):
+                by_character: Dict[str, List[Dict[str, Any]]] = {}
+                for record in batch:
+                    by_character.setdefault(record["character_id"], []).append(record)
+                for character_id, records in by_character.items():
+                    writer = writers.get(character_id)
+                    if writer is None:
+                        key = _PARTITION_UNSAFE.sub("_", character_id) if character_id else _NULL_PARTITION
+                        partition = f"character_id={key}"
+                        path = Path(partition) / f"part-{db_path.stem}.parquet"
+                        (out_dir / partition).mkdir(parents=True, exist_ok=True)
+                        writer = pyarrow.parquet.ParquetWriter(
+                            str(out_dir / path), schema,
+                            compression=self.config.export_compression,
+                        )
+                        writers[character_id] = writer
+                        paths[character_id] = out_dir.name / path
+                        counts[character_id] = 0
+                    writer.write_table(pyarrow.Table.from_pylist(records, schema=schema))
+                    counts[character_id] += len(records)
+
+            batch_rows = max(1, self.config.export_batch_rows)
+            batch: List[Dict[str, Any]] = []
+            for record in self._rows(conn, archived, characters, kinds):
+                batch.append(record)
+                if len(batch) >= batch_rows:
+                    write(batch)
+                    batch = []
+            if batch:
+                write(batch)
+        finally:
+            for writer in writers.values():
+                writer.close()
+            conn.close()
+
+        return [
+            {
+                "relative_path": paths[character_id],
+                "character_id": character_id,
+                "rows": counts[character_id],
+            }
+            for character_id in writers
+        ]
+
+    @staticmethod
+    def _archived_sessions(conn: sqlite3.Connection) -> List[str]:
+        hot_sessions = {
+            row[0] for row in conn.execute("SELECT DISTINCT session_id FROM messages")
+        }
+        # A session caught mid-move can be in both tiers; the hot copy wins.
+        return [
+            row[0] for row in conn.execute(
+                "SELECT session_id FROM archive.archived_sessions ORDER BY session_id"
+            )
+            if row[0] not in hot_sessions
+        ]
+
+    def _archived_rows(self, conn: sqlite3.Connection, session_ids: List[str]) -> Iterator[Dict[str, Any]]:
+        for session_id in session_ids:
+            row = conn.execute(
+                "SELECT codec, payload FROM archive.archived_sessions WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+            if row is None:
+                continue
+            for values in json.loads(decompress(row[1], row[0])):
+                values = list(values) + [None] * (len(ARCHIVED_COLUMNS) - len(values))
+                yield dict(zip(ARCHIVED_COLUMNS, values))
+
+    def _hot_rows(self, conn: sqlite3.Connection, columns: Tuple[str, ...]) -> Iterator[Dict[str, Any]]:
+        # Keyset pagination on rowid keeps each read bounded.
+        last_rowid = 0
+        select = ", ".join(("rowid",) + columns)
+        while True:
+            rows = conn.execute(
+                f"SELECT {select} FROM messages WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                (last_rowid, max(1, self.config.export_batch_rows)),
+            ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield dict(zip(columns, row[1:]))
+            last_rowid = rows[-1][0]
+
+    def _collect_metadata_kinds(
+        self, db_path: Path, archive_path: Optional[Path], kinds: Dict[str, str]
+    ):
+        limit = max(0, self.config.export_max_metadata_columns)
+        conn = self._connect(db_path, archive_path)
+        try:
+            conn.execute("BEGIN")
+            archived = self._archived_sessions(conn) if archive_path else []
+            for rows in (
+                self._hot_rows(conn, ("metadata",)), self._archived_rows(conn, archived)
+            ):
+                for row in rows:
+                    for key, value in _flatten(_load_metadata(row["metadata"])):
+                        if key in kinds or len(kinds) < limit:
+                            kinds[key] = _merge_kinds(kinds.get(key), _kind(value))
+        finally:
+            conn.close()
+
+    def _rows(
+        self,
+        conn: sqlite3.Connection,
+        archived: List[str],
+        characters: Dict[str, str],
+        kinds: Dict[str, str],
+    ) -> Iterator[Dict[str, Any]]:
+        def convert(row: Dict[str, Any], is_archived: bool) -> Dict[str, Any]:
+            metadata_text = unpack(row["metadata"])
+            metadata = _load_metadata(metadata_text)
+            timestamp = row["timestamp"]
+            record = {
+                "id": row["id"],
+                "session_id": row["session_id"],
+                "character_id": characters.get(row["session_id"]),
+                "seq": row["seq"],
+                "sender_id": row["sender_id"],
+                "type": row["type"],
+                "content": row["content"],
+                "is_recalled": bool(row["is_recalled"]),
+                "is_read": bool(row["is_read"]),
+                "timestamp": timestamp,
+                "date": datetime.datetime.fromtimestamp(
+                    timestamp, datetime.timezone.utc
+                ).date() if timestamp is not None else None,
+                "created_at": row["created_at"],
+                "archived": is_archived,
+                "metadata": metadata_text,
+            }
+            for key, value in _flatten(metadata):
+                kind = kinds.get(key)
+                if kind is None or value is None:
+                    continue
+                if kind == "string":
+                    if not isinstance(value, str):
+                        value = json.dumps(value, ensure_ascii=False)
+                elif _merge_kinds(kind, _kind(value)) != kind:
+                    # Written after the metadata pass with another type.
+                    continue
+                record[META_PREFIX + key] = value
+            return record
+
+        for row in self._hot_rows(conn, ARCHIVED_COLUMNS):
+            yield convert(row, False)
+        for row in self._archived_rows(conn, archived):
+            yield convert(row, True)
+
+    @staticmethod
+    def _schema(pyarrow, kinds: Dict[str, str]):
+        types = {
+            "bool": pyarrow.bool_(),
+            "int": pyarrow.int64(),
+            "float": pyarrow.float64(),
+            "string": pyarrow.string(),
+            "null": pyarrow.string(),
+        }
+        fields = [
+            ("id", pyarrow.string()),
+            ("session_id", pyarrow.string()),
+            ("character_id", pyarrow.string()),
+            ("seq", pyarrow.int64()),
+            ("sender_id", pyarrow.string()),
+            ("type", pyarrow.string()),
+            ("content", pyarrow.string()),
+            ("is_recalled", pyarrow.bool_()),
+            ("is_read", pyarrow.bool_()),
+            ("timestamp", pyarrow.float64()),
+            ("date", pyarrow.date32()),
+            ("created_at", pyarrow.string()),
+            ("archived", pyarrow.bool_()),
+            ("metadata", pyarrow.string()),
+        ]
+        fields += [(META_PREFIX + key, types[kind]) for key, kind in kinds.items()]
+        return pyarrow.schema(fields)
+
+
+async def _main(args: argparse.Namespace):
+    # Imported here: opening the connection runs schema setup and migrations.
+    from src.infrastructure.database.connection import DatabaseConnection
+
+    config = database_config
+    if args.batch_rows:
+        config = config.model_copy(update={"export_batch_rows": args.batch_rows})
+    conn = DatabaseConnection(config.path, config)
+    try:
+        report = await MessageExporter(conn, config).export(args.out)
+    finally:
+        await conn.drain()
+        conn.close()
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Export messages to partitioned Parquet files for offline analysis."
+    )
+    parser.add_argument("--out", help=f"Export directory (default: {database_config.export_dir})")
+    parser.add_argument("--batch-rows", type=int, help="Rows per read and per Parquet row group")
+    asyncio.run(_main(parser.parse_args()))
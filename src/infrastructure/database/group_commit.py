@@ -0,0 +1,212 @@
+import asyncio
+import logging
+import sqlite3
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingWrite:
+    __slots__ = ("session_id", "fn", "future")
+
+    def __init__(
+        self,
+        session_id: Optional[str],
+        fn: Callable[[sqlite3.Connection], Any],
+        future: asyncio.Future,
+    ):
+        self.session_id = session_id
+        self.fn = fn
+        self.future = future
+
+
+class GroupCommitBuffer:
+    """
+    Write-behind buffer that commits writes from all sessions together.
+
+    Writes are queued with :meth:`submit` and flushed after ``window_ms`` (or
+    as soon as ``max_batch`` writes are queued) in a single transaction on the
+    DB writer thread. Each write runs inside its own SAVEPOINT so a failing
+    write only rolls back itself, not the rest of the batch.
+
+    Readers call :meth:`barrier` before querying a session; it forces an
+    immediate flush of that session's queued writes, which gives the writing
+    session read-your-writes consistency.
+    """
+
+    def __init__(self, conn_mgr, window_ms: float, max_batch: int):
+        self.conn_mgr = conn_mgr
+        self.window = max(0.0, window_ms) / 1000
+        self.max_batch = max(1, max_batch)
+
+        self._pending: List[_PendingWrite] = []
+        self._in_flight: List[_PendingWrite] = []
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._timer: Optional[asyncio.Task] = None
+
+        self._flushes = 0
+        self._writes = 0
+        self._failed = 0
+        self._max_batch_seen = 0
+        self._last_batch = 0
+        self._flush_time = 0.0
+        self._max_flush_time = 0.0
+        self._last_flush_time = 0.0
+
+    def submit(
+        self, session_id: Optional[str], fn: Callable[[sqlite3.Connection], Any]
+    ) -> asyncio.Future:
+        """
+        Queue ``fn(conn)`` for the next group commit.
+
+        Returns a future resolved with ``fn``'s result once the batch has been
+        committed. Callers that do not need the result may ignore it; errors
+        are logged either way.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        future.add_done_callback(self._log_failure)
+        self._pending.append(_PendingWrite(session_id, fn, future))
+
+        if len(self._pending) >= self.max_batch:
+            self._schedule(0)
+        elif self._timer is None:
+            self._schedule(self.window)
+        return future
+
+    async def barrier(self, session_id: Optional[str] = None):
+        """
+        Wait until queued writes are committed.
+
+        With a session id only that session's writes (and writes not tied to
+        a session) are waited for; with ``None`` every queued write is.
+        """
+        def matches(write: _PendingWrite) -> bool:
+            return (
+                session_id is None
+                or write.session_id is None
+                or write.session_id == session_id
+            )
+
+        queued = [w.future for w in self._pending if matches(w)]
+        flushing = [w.future for w in self._in_flight if matches(w)]
+        if not queued and not flushing:
+            return
+        if queued:
+            self._schedule(0)
+        await asyncio.gather(*queued, *flushing, return_exceptions=True)
+
+    async def flush(self):
+        """Commit everything queued so far, ``max_batch`` writes per transaction."""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            while self._pending:
+                await self._flush_batch()
+
+    async def _flush_batch(self):
+        batch = self._pending[: self.max_batch]
+        self._pending = self._pending[self.max_batch:]
+        self._in_flight = batch
+        started = time.perf_counter()
+        try:
+            results = await self.conn_mgr.run(
+                lambda conn: self._apply(conn, batch), write=True
+            )
+        except Exception as e:
+            results = [(False, e)] * len(batch)
+        finally:
+            self._in_flight = []
+
+        elapsed = time.perf_counter() - started
+        self._record(len(batch), elapsed, results)
+        for write, (ok, value) in zip(batch, results):
+            if write.future.done():
+                continue
+            if ok:
+                write.future.set_result(value)
+            else:
+                write.future.set_exception(value)
+
+    async def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "window_ms": round(self.window * 1000, 3),
+            "max_batch": self.max_batch,
+            "pending": len(self._pending),
+            "flushes": self._flushes,
+            "writes": self._writes,
+            "failed": self._failed,
+            "last_batch_size": self._last_batch,
+            "avg_batch_size": round(self._writes / self._flushes, 2) if self._flushes else 0.0,
+            "max_batch_size": self._max_batch_seen,
+            "last_flush_ms": round(self._last_flush_time * 1000, 3),
+            "avg_flush_ms": round(self._flush_time / self._flushes * 1000, 3) if self._flushes else 0.0,
+            "max_flush_ms": round(self._max_flush_time * 1000, 3),
+        }
+
+    def _schedule(self, delay: float):
+        if self._timer is not None:
+            if delay > 0:
+                return
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().create_task(self._flush_after(delay))
+
+    async def _flush_after(self, delay: float):
+        try:
+            if delay > 0:
+                await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            return
+        self._timer = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Group commit flush failed: {e}", exc_info=True)
+        if self._pending and self._timer is None:
+            self._schedule(self.window)
+
+    @staticmethod
+    def _apply(
+        conn: sqlite3.Connection, batch: List[_PendingWrite]
+    ) -> List[Tuple[bool, Any]]:
+        if not conn.in_transaction:
+            conn.execute("BEGIN")
+        results: List[Tuple[bool, Any]] = []
+        for write in batch:
+            conn.execute("SAVEPOINT group_write")
+            try:
+                value = write.fn(conn)
+                conn.execute("RELEASE group_write")
+                results.append((True, value))
+            except Exception as e:
+                conn.execute("ROLLBACK TO group_write")
+                conn.execute("RELEASE group_write")
+                results.append((False, e))
+        return results
+
+    def _record(self, size: int, elapsed: float, results: List[Tuple[bool, Any]]):
+        self._flushes += 1
+        self._writes += size
+        self._failed += sum(1 for ok, _ in results if not ok)
+        self._last_batch = size
+        self._max_batch_seen = max(self._max_batch_seen, size)
+        self._last_flush_time = elapsed
+        self._flush_time += elapsed
+        self._max_flush_time = max(self._max_flush_time, elapsed)
+
+    @staticmethod
+    def _log_failure(future: asyncio.Future):
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            logger.error(f"Buffered database write failed: {error}", exc_info=error)
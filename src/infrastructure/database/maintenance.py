@@ -0,0 +1,294 @@
+import asyncio
+import logging
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional
+
+from src.core.configs import DatabaseConfig, database_config
+from src.core.models.message import MessageType
+from src.infrastructure.database import rollups
+from src.infrastructure.database.branches import UNSHARED_SQL
+
+logger = logging.getLogger(__name__)
+
+# State rows that are superseded (marked recalled) when a newer one is written.
+SUPERSEDED_STATE_TYPES = (
+    MessageType.SYSTEM_EMOTION.value,
+    MessageType.SYSTEM_TYPING.value,
+)
+
+
+class DatabaseMaintenance:
+    """
+    Periodic compaction of the messages database.
+
+    Every run purges superseded state rows that no branch reads as part of
+    its shared prefix, rows and rollups left behind by
+    deleted sessions and change-feed entries older than ``change_feed_retention_seconds``,
+    in small batches so regular writes can interleave, then moves
+    idle sessions to the cold archive (see :class:`SessionArchive`). Incremental
+    VACUUM and ANALYZE only run once the database has been idle for
+    ``maintenance_quiet_seconds``.
+
+    With message shards, each shard gets its own job and the catalog's
+    report sums theirs.
+    """
+
+    def __init__(self, conn_mgr, config: Optional[DatabaseConfig] = None):
+        self.conn_mgr = conn_mgr
+        self.config = config or database_config
+        shards = getattr(conn_mgr, "message_shards", None)
+        self._shard_jobs = [
+            DatabaseMaintenance(shard, shard.config)
+            for shard in (shards.connections if shards else [])
+        ]
+        self._task: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+        self._runs = 0
+        self._vacuums = 0
+        self._purged_rows = 0
+        self._reclaimed_bytes = 0
+        self._last_report: Optional[Dict[str, Any]] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run_once(self, force: bool = False) -> Dict[str, Any]:
+        """
+        Run one maintenance pass and return its report.
+
+        ``force`` runs VACUUM/ANALYZE even if the database is not quiet.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            started = time.perf_counter()
+            quiet = force or self.conn_mgr.idle_seconds() >= self.config.maintenance_quiet_seconds
+
+            if self.conn_mgr.write_buffer:
+                await self.conn_mgr.write_buffer.barrier()
+
+            report: Dict[str, Any] = {
+                "started_at": time.time(),
+                "superseded_messages": await self._purge_superseded(),
+                "orphaned_messages": await self._purge_orphaned_messages(),
+                "pruned_changes": (
+                    await self._prune_changes()
+                    if getattr(self.conn_mgr, "holds_messages", True)
+                    else 0
+                ),
+                "orphaned_state": (
+                    await self.conn_mgr.run(self._purge_orphaned_state, write=True)
+                    if getattr(self.conn_mgr, "holds_catalog", True)
+                    else 0
+                ),
+                "orphaned_rollups": (
+                    await self.conn_mgr.run(rollups.purge_orphaned, write=True)
+                    if getattr(self.conn_mgr, "holds_messages", True)
+                    else 0
+                ),
+                "orphaned_archives": 0,
+                "archived_sessions": 0,
+                "vacuumed": False,
+                "analyzed": False,
+                "reclaimed_bytes": 0,
+            }
+
+            archive = getattr(self.conn_mgr, "archive", None)
+            if archive:
+                report["orphaned_archives"] = await archive.purge_orphaned()
+                report["archived_sessions"] = await archive.archive_idle()
+
+            if quiet:
+                report.update(await self.conn_mgr.run(self._compact, write=True))
+
+            for job in self._shard_jobs:
+                self._merge(report, await job.run_once(force))
+
+            report["duration_ms"] = round((time.perf_counter() - started) * 1000, 3)
+            self._record(report)
+            return report
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.config.maintenance_enabled,
+            "running": self._task is not None and not self._task.done(),
+            "interval": self.config.maintenance_interval,
+            "runs": self._runs,
+            "vacuums": self._vacuums,
+            "purged_rows": self._purged_rows,
+            "reclaimed_bytes": self._reclaimed_bytes,
+            "last_run": self._last_report,
+        }
+
+    async def _run_forever(self):
+        while True:
+            await asyncio.sleep(self.config.maintenance_interval)
+            try:
+                report = await self.run_once()
+                orphaned = (
+                    report["orphaned_messages"]
+                    + report["orphaned_state"]
+                    + report["orphaned_rollups"]
+                )
+                logger.info(
+                    f"Database maintenance: purged {report['superseded_messages']} superseded "
+                    f"and {orphaned} orphaned rows, archived {report['archived_sessions']} "
+                    f"sessions, reclaimed {report['reclaimed_bytes']} bytes"
+                )
+            except Exception as e:
+                logger.error(f"Database maintenance failed: {e}", exc_info=True)
+
+    async def _purge_superseded(self) -> int:
+        placeholders = ", ".join("?" for _ in SUPERSEDED_STATE_TYPES)
+        batch = max(1, self.config.maintenance_batch_size)
+
+        def op(conn: sqlite3.Connection) -> int:
+            cursor = conn.execute(
+                f"""
+                DELETE FROM messages WHERE rowid IN (
+                    SELECT rowid FROM messages
+                    WHERE type IN ({placeholders}) AND is_recalled = TRUE
+                      AND {UNSHARED_SQL}
+                    LIMIT ?
+                )
+                """,
+                (*SUPERSEDED_STATE_TYPES, batch),
+            )
+            return cursor.rowcount
+
+        return await self._delete_in_batches(op, batch)
+
+    async def _purge_orphaned_messages(self) -> int:
+        def find(conn: sqlite3.Connection) -> List[str]:
+            cursor = conn.execute("""
+                SELECT DISTINCT m.session_id FROM messages m
+                WHERE NOT EXISTS (SELECT 1 FROM sessions s WHERE s.id = m.session_id)
+            """)
+            return [row[0] for row in cursor.fetchall()]
+
+        batch = max(1, self.config.maintenance_batch_size)
+        purged = 0
+        for session_id in await self.conn_mgr.run(find):
+            def op(conn: sqlite3.Connection, session_id: str = session_id) -> int:
+                cursor = conn.execute(
+                    """
+                    DELETE FROM messages WHERE rowid IN (
+                        SELECT rowid FROM messages WHERE session_id = ? LIMIT ?
+                    )
+                    """,
+                    (session_id, batch),
+                )
+                return cursor.rowcount
+
+            purged += await self._delete_in_batches(op, batch)
+
+        def purge_overrides(conn: sqlite3.Connection) -> int:
+            cursor = conn.execute("""
+                DELETE FROM branch_overrides
+                WHERE session_id NOT IN (SELECT id FROM sessions)
+            """)
+            return cursor.rowcount
+
+        return purged + await self.conn_mgr.run(purge_overrides, write=True)
+
+    async def _prune_changes(self) -> int:
+        cutoff = time.time() - self.config.change_feed_retention_seconds
+        batch = max(1, self.config.maintenance_batch_size)
+
+        def op(conn: sqlite3.Connection) -> int:
+            # Oldest changes have the lowest ids, so each batch is found at the
+            # front of the rowid order.
+            cursor = conn.execute(
+                """
+                DELETE FROM message_changes WHERE change_id IN (
+                    SELECT change_id FROM message_changes
+                    WHERE changed_at < ?
+                    ORDER BY change_id
+                    LIMIT ?
+                )
+                """,
+                (cutoff, batch),
+            )
+            return cursor.rowcount
+
+        return await self._delete_in_batches(op, batch)
+
+    @staticmethod
+    def _purge_orphaned_state(conn: sqlite3.Connection) -> int:
+        cursor = conn.execute("""
+            DELETE FROM session_state
+            WHERE session_id NOT IN (SELECT id FROM sessions)
+        """)
+        return cursor.rowcount
+
+    async def _delete_in_batches(self, op, batch: int) -> int:
+        # One short write transaction per batch keeps the writer thread free
+        # for regular traffic between batches.
+        total = 0
+        while True:
+            deleted = await self.conn_mgr.run(op, write=True)
+            total += deleted
+            if deleted < batch:
+                return total
+
+    def _compact(self, conn: sqlite3.Connection) -> Dict[str, Any]:
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        pages_before = conn.execute("PRAGMA page_count").fetchone()[0]
+        auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+
+        if auto_vacuum != 2:
+            # Databases created before incremental auto_vacuum was enabled need
+            # one full VACUUM to switch modes; later runs are incremental.
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        else:
+            pages = max(0, self.config.maintenance_vacuum_pages)
+            pragma = f"PRAGMA incremental_vacuum({pages})" if pages else "PRAGMA incremental_vacuum"
+            conn.execute(pragma).fetchall()
+        conn.execute("ANALYZE")
+
+        pages_after = conn.execute("PRAGMA page_count").fetchone()[0]
+        freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return {
+            "vacuumed": True,
+            "analyzed": True,
+            "reclaimed_bytes": max(0, pages_before - pages_after) * page_size,
+            "free_bytes": freelist * page_size,
+            "size_bytes": pages_after * page_size,
+        }
+
+    @staticmethod
+    def _merge(report: Dict[str, Any], shard_report: Dict[str, Any]):
+        for key in (
+            "superseded_messages", "orphaned_messages", "orphaned_state",
+            "orphaned_rollups", "pruned_changes", "orphaned_archives", "archived_sessions", "reclaimed_bytes",
+        ):
+            report[key] += shard_report[key]
+        report["vacuumed"] = report["vacuumed"] or shard_report["vacuumed"]
+        report["analyzed"] = report["analyzed"] or shard_report["analyzed"]
+
+    def _record(self, report: Dict[str, Any]):
+        self._runs += 1
+        self._vacuums += int(report["vacuumed"])
+        self._purged_rows += (
+            report["superseded_messages"]
+            + report["orphaned_messages"]
+            + report["orphaned_state"]
+            + report["orphaned_rollups"]
+            + report["pruned_changes"]
+        )
+        self._reclaimed_bytes += report["reclaimed_bytes"]
+        self._last_report = report
@@ -0,0 +1,242 @@
+import contextvars
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Generator, List, Optional
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open.
+LATENCY_BUCKETS_MS = (0.1, 0.5, 1.0, 5.0, 10.0, 50.0, 100.0, 500.0)
+
+# How many recent user turns queries-per-turn is computed over.
+RECENT_TURNS = 200
+
+_EXPLAINABLE = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|WITH|REPLACE)\b", re.IGNORECASE)
+_TABLE_SCAN = re.compile(r"^SCAN (?!CONSTANT ROW)(\S+)(?!.*\b(INDEX|VIRTUAL TABLE)\b)")
+
+
+class _Turn:
+    __slots__ = ("started_at", "queries", "rows", "db_time")
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.queries = 0
+        self.rows = 0
+        self.db_time = 0.0
+
+
+_current_turn: contextvars.ContextVar[Optional[_Turn]] = contextvars.ContextVar(
+    "db_current_turn", default=None
+)
+_recent_turns: Deque[_Turn] = deque(maxlen=RECENT_TURNS)
+_turns_lock = threading.Lock()
+
+
+@contextmanager
+def user_turn() -> Generator[None, None, None]:
+    """
+    Attribute the statements run inside this block to one user turn.
+
+    The turn travels in a context variable, so tasks spawned inside the block
+    (e.g. the reply timeline) keep adding to it after the block exits.
+    """
+    turn = _Turn()
+    with _turns_lock:
+        _recent_turns.append(turn)
+    token = _current_turn.set(turn)
+    try:
+        yield
+    finally:
+        _current_turn.reset(token)
+
+
+def turn_stats() -> Dict[str, Any]:
+    with _turns_lock:
+        turns = list(_recent_turns)
+    if not turns:
+        return {"turns": 0}
+    queries = sorted(turn.queries for turn in turns)
+    return {
+        "turns": len(turns),
+        "avg_queries": round(sum(queries) / len(queries), 2),
+        "p95_queries": queries[min(len(queries) - 1, int(len(queries) * 0.95))],
+        "max_queries": queries[-1],
+        "max_rows": max(turn.rows for turn in turns),
+        "avg_db_ms": round(sum(turn.db_time for turn in turns) / len(turns) * 1000, 3),
+    }
+
+
+class _StatementStats:
+    __slots__ = ("sql", "count", "total_time", "max_time", "rows", "buckets", "sample_params")
+
+    def __init__(self, sql: str):
+        self.sql = sql
+        self.count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.rows = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.sample_params: Any = ()
+
+
+class QueryProfiler:
+    """
+    Per-statement counters for one database file.
+
+    Statements are keyed by their whitespace-normalized SQL. Time spent in
+    ``execute`` and in the ``fetch*`` calls that follow it are both charged
+    to the statement; rows are counted as they are fetched. Rows read by
+    iterating a cursor directly are not counted.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._statements: Dict[str, _StatementStats] = {}
+
+    def record(self, sql: str, params: Any, elapsed: float) -> _StatementStats:
+        key = " ".join(sql.split())
+        bucket = next(
+            (i for i, bound in enumerate(LATENCY_BUCKETS_MS) if elapsed * 1000 <= bound),
+            len(LATENCY_BUCKETS_MS),
+        )
+        with self._lock:
+            stats = self._statements.get(key)
+            if stats is None:
+                stats = self._statements[key] = _StatementStats(key)
+            stats.count += 1
+            stats.total_time += elapsed
+            stats.max_time = max(stats.max_time, elapsed)
+            stats.buckets[bucket] += 1
+            if params is not None:
+                stats.sample_params = params
+            turn = _current_turn.get()
+            if turn is not None:
+                turn.queries += 1
+                turn.db_time += elapsed
+        return stats
+
+    def record_fetch(self, stats: _StatementStats, rows: int, elapsed: float):
+        with self._lock:
+            stats.rows += rows
+            stats.total_time += elapsed
+            turn = _current_turn.get()
+            if turn is not None:
+                turn.rows += rows
+                turn.db_time += elapsed
+
+    def reset(self):
+        with self._lock:
+            self._statements.clear()
+
+    def stats(self, top: int = 50) -> List[Dict[str, Any]]:
+        """The ``top`` statements by total time."""
+        with self._lock:
+            statements = sorted(
+                self._statements.values(), key=lambda s: s.total_time, reverse=True
+            )[:top]
+            return [
+                {
+                    "sql": s.sql,
+                    "count": s.count,
+                    "total_ms": round(s.total_time * 1000, 3),
+                    "avg_ms": round(s.total_time / s.count * 1000, 3),
+                    "max_ms": round(s.max_time * 1000, 3),
+                    "rows": s.rows,
+                    "rows_per_call": round(s.rows / s.count, 2),
+                    "histogram_ms": dict(zip(
+                        [f"<={bound}" for bound in LATENCY_BUCKETS_MS] + ["inf"], s.buckets
+                    )),
+                }
+                for s in statements
+            ]
+
+    def explain(self, conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+        """
+        ``EXPLAIN QUERY PLAN`` for every recorded DML statement, using the
+        parameters of its last call. Plans that scan a whole table are flagged.
+        """
+        with self._lock:
+            statements = [(s.sql, s.sample_params) for s in self._statements.values()]
+
+        plans = []
+        for sql, params in statements:
+            if not _EXPLAINABLE.match(sql):
+                continue
+            try:
+                # A plain Cursor so the EXPLAIN itself is not profiled.
+                rows = sqlite3.Cursor(conn).execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+            except sqlite3.Error as e:
+                plans.append({"sql": sql, "error": str(e)})
+                continue
+            details = [row[3] for row in rows]
+            plans.append({
+                "sql": sql,
+                "plan": details,
+                "full_scans": [m.group(1) for m in map(_TABLE_SCAN.match, details) if m],
+                "temp_btree": any("TEMP B-TREE" in detail for detail in details),
+            })
+        plans.sort(key=lambda plan: not plan.get("full_scans"))
+        return plans
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    _stats: Optional[_StatementStats] = None
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._stats = self.connection.profiler.record(
+                sql, parameters, time.perf_counter() - started
+            )
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            # Keep the first parameter set as the sample for EXPLAIN.
+            sample = (
+                seq_of_parameters[0]
+                if isinstance(seq_of_parameters, (list, tuple)) and seq_of_parameters
+                else None
+            )
+            self._stats = self.connection.profiler.record(
+                sql, sample, time.perf_counter() - started
+            )
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._record_fetch(1 if row is not None else 0, started)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        started = time.perf_counter()
+        rows = super().fetchmany(*args, **kwargs)
+        self._record_fetch(len(rows), started)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._record_fetch(len(rows), started)
+        return rows
+
+    def _record_fetch(self, rows: int, started: float):
+        if self._stats is not None:
+            self.connection.profiler.record_fetch(
+                self._stats, rows, time.perf_counter() - started
+            )
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """Connection whose cursors report to ``self.profiler``; set after connecting."""
+
+    profiler: QueryProfiler
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
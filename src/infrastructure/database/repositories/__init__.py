@@ -1,13 +1,17 @@
 from src.infrastructure.database.repositories.base import BaseRepository
 from src.infrastructure.database.repositories.message_repo import MessageRepository
+from src.infrastructure.database.repositories.sharded_message_repo import ShardedMessageRepository
 from src.infrastructure.database.repositories.character_repo import CharacterRepository
 from src.infrastructure.database.repositories.session_repo import SessionRepository
 from src.infrastructure.database.repositories.config_repo import ConfigRepository
+from src.infrastructure.database.repositories.session_state_repo import SessionStateRepository
 
 __all__ = [
     'BaseRepository',
     'MessageRepository',
+    'ShardedMessageRepository',
     'CharacterRepository',
     'SessionRepository',
     'ConfigRepository',
+    'SessionStateRepository',
 ]
@@ -1,13 +1,65 @@
+import sqlite3
 from abc import ABC, abstractmethod
-from typing import Generic, TypeVar, Optional, List
+from typing import Any, Awaitable, Callable, Dict, Generic, Hashable, Tuple, TypeVar, Optional, List, Type
+from pydantic import BaseModel
 
 T = TypeVar('T')
+R = TypeVar('R')
+M = TypeVar('M', bound=BaseModel)
+
+
+def construct_trusted(model: Type[M], values: Dict[str, Any]) -> M:
+    """
+    Build a model from values we validated when writing them.
+
+    Unlike ``model_construct`` this fills no defaults and runs no Python-level
+    field loop, so ``values`` must contain every field of ``model``. Only use
+    it for rows read back from our own tables.
+    """
+    instance = model.__new__(model)
+    object.__setattr__(instance, "__dict__", values)
+    object.__setattr__(instance, "__pydantic_fields_set__", set(values))
+    object.__setattr__(instance, "__pydantic_extra__", None)
+    object.__setattr__(instance, "__pydantic_private__", None)
+    return instance
 
 
 class BaseRepository(ABC, Generic[T]):
     def __init__(self, connection_manager):
         self.conn_mgr = connection_manager
 
+    async def _read(self, fn: Callable[[sqlite3.Connection], R]) -> R:
+        """Run a read-only callable on a DB reader thread."""
+        return await self.conn_mgr.run(fn)
+
+    async def _write(
+        self, fn: Callable[[sqlite3.Connection], R], invalidates: Tuple[str, ...] = ()
+    ) -> R:
+        """
+        Run a callable in a transaction on the DB writer thread.
+
+        ``invalidates`` names the read-cache regions the write makes stale.
+        """
+        try:
+            return await self.conn_mgr.run(fn, write=True)
+        finally:
+            self._invalidate(*invalidates)
+
+    async def _cached(
+        self, region: str, key: Hashable, load: Callable[[], Awaitable[R]]
+    ) -> R:
+        """Serve ``load()`` through the connection's read cache, if it has one."""
+        cache = getattr(self.conn_mgr, "read_cache", None)
+        if cache is None:
+            return await load()
+        return await cache.get_or_load(region, key, load)
+
+    def _invalidate(self, *regions: str):
+        """Drop cached reads of ``regions`` after a write to them."""
+        cache = getattr(self.conn_mgr, "read_cache", None)
+        if cache is not None:
+            cache.invalidate(*regions)
+
     @abstractmethod
     async def get_by_id(self, id: str) -> Optional[T]:
         pass
@@ -1,88 +1,260 @@
 import json
 import logging
-from typing import List, Optional
-from src.core.models.message import Message, MessageType
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+from src.core.models.message import Message, MessageChanges, MessageType, SessionStats
 from src.core.interfaces.repositories import IMessageRepository
-from src.infrastructure.database.repositories.base import BaseRepository
+from src.infrastructure.database import rollups
+from src.infrastructure.database.branches import (
+    SNAPSHOT_OVERRIDES_SQL,
+    Segment,
+    override_sql,
+)
+from src.infrastructure.database.compression import unpack
+from src.infrastructure.database.repositories.base import BaseRepository, construct_trusted
+from src.utils.search_tokenizer import (
+    build_match_expression,
+    tokenize_for_index,
+    tokenize_query,
+)
 
 logger = logging.getLogger(__name__)
 
+INSERT_MESSAGE_SQL = """
+    INSERT INTO messages (
+        id, session_id, sender_id, type, content,
+        metadata, is_recalled, is_read, timestamp, seq, idempotency_key
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+FIND_BY_IDEMPOTENCY_KEY_SQL = """
+    SELECT * FROM messages WHERE session_id = ? AND idempotency_key = ?
+"""
+
+INDEX_MESSAGE_SQL = """
+    INSERT INTO messages_fts (rowid, session_key, body)
+    SELECT rowid, session_id, ? FROM messages WHERE id = ?
+"""
+
+# Inserts and updates reach message_changes through triggers; deletes are
+# logged explicitly (append a WHERE clause) so archiving stays invisible.
+LOG_DELETES_SQL = """
+    INSERT INTO message_changes (session_id, message_id, op, changed_at)
+    SELECT session_id, id, 'delete', ? FROM messages
+"""
+
 
 class MessageRepository(BaseRepository[Message], IMessageRepository):
+    """
+    Message storage.
+
+    When group commit is enabled on the connection, inserts and status
+    updates are queued in its write buffer and committed in batches; each
+    call returns once its batch is committed, so failures reach the caller.
+    Every read first waits for the relevant buffered writes, so a session
+    always sees what it wrote.
+
+    Sessions moved to the cold archive are rehydrated the first time any
+    session-scoped method touches them.
+
+    New messages get their per-session ``seq`` from the connection's
+    :class:`MessageSequences` before they are written; it is set on the
+    passed-in model so callers can hand it to clients straight away.
+
+    A branch session stores only the messages written after it forked.
+    :meth:`get_by_session` and :meth:`get_latest` read the shared prefix
+    from its parent chain (see :class:`SessionBranches`); every other method
+    sees only the branch's own rows. Recalled status is kept per side of a
+    fork: a branch recalling a prefix row, or its parent recalling or
+    superseding one after the fork, does not change what the other sees.
+    """
+
+    @property
+    def _buffer(self):
+        return getattr(self.conn_mgr, "write_buffer", None)
+
+    @property
+    def _archive(self):
+        return getattr(self.conn_mgr, "archive", None)
+
+    async def _ensure_hot(self, session_id: Optional[str]):
+        if session_id and self._archive:
+            await self._archive.ensure_hot(session_id)
+
+    async def _assign_seq(self, messages: List[Message]):
+        sequences = getattr(self.conn_mgr, "sequences", None)
+        if not sequences:
+            return
+        by_session: Dict[str, List[Message]] = defaultdict(list)
+        for message in messages:
+            by_session[message.session_id].append(message)
+        for session_id, batch in by_session.items():
+            first = await sequences.allocate(session_id, len(batch))
+            for offset, message in enumerate(batch):
+                message.seq = first + offset
+
+    async def _segments(self, session_id: str) -> List[Segment]:
+        branches = getattr(self.conn_mgr, "branches", None)
+        if not branches:
+            return [(session_id, None)]
+        return await branches.segments(session_id)
+
+    async def _sync_writes(self, session_id: Optional[str] = None):
+        await self._ensure_hot(session_id)
+        if self._buffer:
+            await self._buffer.barrier(session_id)
+
     async def get_by_id(self, id: str) -> Optional[Message]:
+        def op(conn):
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM messages WHERE id = ?", (id,))
+            row = cursor.fetchone()
+            if row:
+                return self._row_to_message(row)
+            return None
+
         try:
-            with self.conn_mgr.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT * FROM messages WHERE id = ?", (id,))
-                row = cursor.fetchone()
-                if row:
-                    return self._row_to_message(row)
-                return None
+            await self._sync_writes()
+            return await self._read(op)
         except Exception as e:
             logger.error(f"Error getting message by id: {e}", exc_info=True)
             return None
 
     async def get_all(self) -> List[Message]:
+        def op(conn):
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM messages ORDER BY timestamp ASC")
+            rows = cursor.fetchall()
+            return [self._row_to_message(row) for row in rows]
+
         try:
-            with self.conn_mgr.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT * FROM messages ORDER BY timestamp ASC")
-                rows = cursor.fetchall()
-                return [self._row_to_message(row) for row in rows]
+            await self._sync_writes()
+            return await self._read(op)
         except Exception as e:
             logger.error(f"Error getting all messages: {e}", exc_info=True)
             return []
 
     async def create(self, message: Message) -> bool:
+        if message.idempotency_key:
+            return await self.create_many([message])
+
+        def op(conn):
+            cursor = conn.cursor()
+            cursor.execute(INSERT_MESSAGE_SQL, self._message_params(message))
+            index_params = self._index_params(message)
+            if index_params:
+                cursor.execute(INDEX_MESSAGE_SQL, index_params)
+            self._record_rollups(cursor, [message])
+            return True
+
         try:
-            with self.conn_mgr.transaction() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO messages (
-                        id, session_id, sender_id, type, content,
-                        metadata, is_recalled, is_read, timestamp
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    message.id,
-                    message.session_id,
-                    message.sender_id,
-                    message.type,
-                    message.content,
-                    json.dumps(message.metadata),
-                    message.is_recalled,
-                    message.is_read,
-                    message.timestamp
-                ))
-                return True
+            await self._ensure_hot(message.session_id)
+            await self._assign_seq([message])
+            if self._buffer:
+                # Committed with the next group flush; waiting for it lets a
+                # failed flush reach the caller before the message is sent on.
+                return await self._buffer.submit(message.session_id, op)
+            return await self._write(op)
         except Exception as e:
             logger.error(f"Error creating message: {e}", exc_info=True)
             return False
 
+    async def create_many(self, messages: List[Message]) -> bool:
+        """
+        Insert several messages in one transaction; all or none are written.
+
+        Returns False without writing anything if a message carries an
+        ``idempotency_key`` its session already has a message for.
+        """
+        if not messages:
+            return True
+
+        session_ids = {message.session_id for message in messages}
+        session_id = session_ids.pop() if len(session_ids) == 1 else None
+        keys = [
+            (message.session_id, message.idempotency_key)
+            for message in messages if message.idempotency_key
+        ]
+
+        def op(conn):
+            cursor = conn.cursor()
+            for key in keys:
+                if cursor.execute(FIND_BY_IDEMPOTENCY_KEY_SQL, key).fetchone():
+                    # Written by an earlier send with the same key.
+                    return False
+            cursor.executemany(
+                INSERT_MESSAGE_SQL, [self._message_params(message) for message in messages]
+            )
+            index_params = [p for p in map(self._index_params, messages) if p]
+            if index_params:
+                cursor.executemany(INDEX_MESSAGE_SQL, index_params)
+            self._record_rollups(cursor, messages)
+            return True
+
+        try:
+            for message_session_id in {message.session_id for message in messages}:
+                await self._ensure_hot(message_session_id)
+            await self._assign_seq(messages)
+            if self._buffer:
+                if not keys:
+                    return await self._buffer.submit(session_id, op)
+                # Keyed sends bypass the buffer so the caller learns about a
+                # duplicate; the session's queued writes go first.
+                await self._buffer.barrier(session_id)
+            return await self._write(op)
+        except Exception as e:
+            logger.error(f"Error creating messages: {e}", exc_info=True)
+            return False
+
     async def update(self, message: Message) -> bool:
+        def op(conn):
+            cursor = conn.cursor()
+            cursor.execute(
+                SNAPSHOT_OVERRIDES_SQL + " WHERE messages.id = ? AND messages.is_recalled != ?",
+                (message.id, message.is_recalled),
+            )
+            cursor.execute("""
+                UPDATE messages SET
+                    session_id = ?, sender_id = ?, type = ?, content = ?,
+                    metadata = ?, is_recalled = ?, is_read = ?, timestamp = ?
+                WHERE id = ?
+            """, (
+                message.session_id, message.sender_id, message.type, message.content,
+                self._pack_metadata(message), message.is_recalled, message.is_read,
+                message.timestamp, message.id
+            ))
+            if cursor.rowcount == 0:
+                return False
+            cursor.execute("""
+                DELETE FROM messages_fts
+                WHERE rowid = (SELECT rowid FROM messages WHERE id = ?)
+            """, (message.id,))
+            index_params = self._index_params(message)
+            if index_params:
+                cursor.execute(INDEX_MESSAGE_SQL, index_params)
+            return True
+
         try:
-            with self.conn_mgr.transaction() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    UPDATE messages SET
-                        session_id = ?, sender_id = ?, type = ?, content = ?,
-                        metadata = ?, is_recalled = ?, is_read = ?, timestamp = ?
-                    WHERE id = ?
-                """, (
-                    message.session_id, message.sender_id, message.type, message.content,
-                    json.dumps(message.metadata), message.is_recalled, message.is_read,
-                    message.timestamp, message.id
-                ))
-                return cursor.rowcount > 0
+            await self._sync_writes(message.session_id)
+            return await self._write(op)
         except Exception as e:
             logger.error(f"Error updating message: {e}", exc_info=True)
             return False
 
     async def delete(self, id: str) -> bool:
+        def op(conn):
+            cursor = conn.cursor()
+            cursor.execute(LOG_DELETES_SQL + " WHERE id = ?", (time.time(), id))
+            cursor.execute("DELETE FROM messages WHERE id = ?", (id,))
+            deleted = cursor.rowcount > 0
+            # Branches reading the row lose it too; only recalls are per side.
+            cursor.execute("DELETE FROM branch_overrides WHERE message_id = ?", (id,))
+            return deleted
+
         try:
-            with self.conn_mgr.transaction() as conn:
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM messages WHERE id = ?", (id,))
-                return cursor.rowcount > 0
+            await self._sync_writes()
+            return await self._write(op)
         except Exception as e:
             logger.error(f"Error deleting message: {e}", exc_info=True)
             return False
@@ -91,47 +263,369 @@ class MessageRepository(BaseRepository[Message], IMessageRepository):
         self,
         session_id: str,
         after_timestamp: Optional[float] = None,
-        limit: Optional[int] = None
+        limit: Optional[int] = None,
+        before_timestamp: Optional[float] = None,
+        after_seq: Optional[int] = None,
+        before_seq: Optional[int] = None,
     ) -> List[Message]:
-        try:
-            with self.conn_mgr.get_connection() as conn:
-                cursor = conn.cursor()
+        """
+        Return a session's messages in ``seq`` order.
+
+        ``after_timestamp``/``before_timestamp``/``after_seq``/``before_seq``
+        are exclusive cursors. With a ``limit`` and no forward cursor the
+        newest ``limit`` messages are returned (a backwards page); with
+        ``after_timestamp`` or ``after_seq`` the oldest ``limit`` messages
+        after it are. Prefer the seq cursors for resyncs and backfill: they
+        are exact where timestamps can tie.
 
-                query = "SELECT * FROM messages WHERE session_id = ?"
-                params = [session_id]
+        For a branch session this is the shared prefix of its parent chain,
+        with the branch's own recalled status, followed by its own messages.
+        """
+        newest_first = (
+            limit is not None and after_timestamp is None and after_seq is None
+        )
+
+        def op(conn):
+            cursor = conn.cursor()
+            # Segments cover disjoint seq ranges, newest first, so a page is
+            # filled by walking them in order and stopping once it is full.
+            depths = range(len(segments))
+            ordered = depths if newest_first else reversed(depths)
+            messages = []
+            for depth in ordered:
+                segment_session_id, upto_seq = segments[depth]
+                remaining = None if limit is None else limit - len(messages)
+                if remaining is not None and remaining <= 0:
+                    break
+
+                if depth:
+                    override, params = override_sql(
+                        [viewer for viewer, _ in segments[:depth]]
+                    )
+                    query = f"SELECT *, {override} AS branch_recalled FROM messages"
+                else:
+                    query, params = "SELECT * FROM messages", []
+                query += " WHERE session_id = ?"
+                params.append(segment_session_id)
+
+                if upto_seq is not None:
+                    query += " AND seq <= ?"
+                    params.append(upto_seq)
 
                 if after_timestamp is not None:
                     query += " AND timestamp > ?"
                     params.append(after_timestamp)
 
-                query += " ORDER BY timestamp ASC"
+                if before_timestamp is not None:
+                    query += " AND timestamp < ?"
+                    params.append(before_timestamp)
+
+                if after_seq is not None:
+                    query += " AND seq > ?"
+                    params.append(after_seq)
+
+                if before_seq is not None:
+                    query += " AND seq < ?"
+                    params.append(before_seq)
 
-                if limit is not None:
+                query += " ORDER BY seq DESC" if newest_first else " ORDER BY seq ASC"
+
+                if remaining is not None:
                     query += " LIMIT ?"
-                    params.append(limit)
+                    params.append(remaining)
 
                 cursor.execute(query, params)
-                rows = cursor.fetchall()
+                messages.extend(
+                    self._row_to_message(row, overridden=bool(depth)) for row in cursor
+                )
+
+            if newest_first:
+                messages.reverse()
+            return messages
 
-                return [self._row_to_message(row) for row in rows]
+        try:
+            segments = await self._segments(session_id)
+            for segment_session_id, _ in segments:
+                await self._sync_writes(segment_session_id)
+            return await self._read(op)
         except Exception as e:
             logger.error(f"Error getting messages by session: {e}", exc_info=True)
             return []
 
-    async def update_recalled_status(self, message_id: str, is_recalled: bool) -> bool:
+    async def get_by_idempotency_key(
+        self, session_id: str, idempotency_key: str
+    ) -> Optional[Message]:
+        def op(conn):
+            row = conn.execute(
+                FIND_BY_IDEMPOTENCY_KEY_SQL, (session_id, idempotency_key)
+            ).fetchone()
+            return self._row_to_message(row) if row else None
+
         try:
-            with self.conn_mgr.transaction() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    UPDATE messages
-                    SET is_recalled = ?
-                    WHERE id = ?
-                """, (is_recalled, message_id))
-                return cursor.rowcount > 0
+            await self._sync_writes(session_id)
+            return await self._read(op)
+        except Exception as e:
+            logger.error(f"Error getting message by idempotency key: {e}", exc_info=True)
+            return None
+
+    async def get_latest(self, session_id: str) -> Optional[Message]:
+        """Return the newest message in a session, including a branch's shared prefix."""
+        def op(conn):
+            cursor = conn.cursor()
+            for depth, (segment_session_id, upto_seq) in enumerate(segments):
+                if upto_seq is None:
+                    cursor.execute("""
+                        SELECT * FROM messages
+                        WHERE session_id = ?
+                        ORDER BY seq DESC
+                        LIMIT 1
+                    """, (segment_session_id,))
+                else:
+                    override, params = override_sql(
+                        [viewer for viewer, _ in segments[:depth]]
+                    )
+                    cursor.execute(f"""
+                        SELECT *, {override} AS branch_recalled FROM messages
+                        WHERE session_id = ? AND seq <= ?
+                        ORDER BY seq DESC
+                        LIMIT 1
+                    """, (*params, segment_session_id, upto_seq))
+                row = cursor.fetchone()
+                if row:
+                    return self._row_to_message(row, overridden=upto_seq is not None)
+            return None
+
+        try:
+            segments = await self._segments(session_id)
+            for segment_session_id, _ in segments:
+                await self._sync_writes(segment_session_id)
+            return await self._read(op)
+        except Exception as e:
+            logger.error(f"Error getting latest message: {e}", exc_info=True)
+            return None
+
+    async def get_latest_by_type(
+        self, session_id: str, message_type: str
+    ) -> Optional[Message]:
+        """Return the newest message of a type in a session."""
+        def op(conn):
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT * FROM messages
+                WHERE session_id = ? AND type = ?
+                ORDER BY timestamp DESC
+                LIMIT 1
+            """, (session_id, message_type))
+            row = cursor.fetchone()
+            return self._row_to_message(row) if row else None
+
+        try:
+            await self._sync_writes(session_id)
+            return await self._read(op)
+        except Exception as e:
+            logger.error(f"Error getting latest message by type: {e}", exc_info=True)
+            return None
+
+    async def exists_by_type(self, session_id: str, message_type: str) -> bool:
+        def op(conn):
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT 1 FROM messages
+                WHERE session_id = ? AND type = ?
+                LIMIT 1
+            """, (session_id, message_type))
+            return cursor.fetchone() is not None
+
+        try:
+            await self._sync_writes(session_id)
+            return await self._read(op)
+        except Exception as e:
+            logger.error(f"Error checking message type: {e}", exc_info=True)
+            return False
+
+    async def get_by_type(
+        self, session_id: str, message_type: str, include_recalled: bool = True
+    ) -> List[Message]:
+        """Return all messages of a type in a session, oldest first."""
+        def op(conn):
+            cursor = conn.cursor()
+            query = "SELECT * FROM messages WHERE session_id = ? AND type = ?"
+            if not include_recalled:
+                query += " AND is_recalled = FALSE"
+            query += " ORDER BY timestamp ASC"
+            cursor.execute(query, (session_id, message_type))
+            return [self._row_to_message(row) for row in cursor.fetchall()]
+
+        try:
+            await self._sync_writes(session_id)
+            return await self._read(op)
+        except Exception as e:
+            logger.error(f"Error getting messages by type: {e}", exc_info=True)
+            return []
+
+    async def get_by_sender_since(
+        self, session_id: str, sender_id: str, since_timestamp: float
+    ) -> List[Message]:
+        """Return a sender's messages in a session at or after a timestamp."""
+        def op(conn):
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT * FROM messages
+                WHERE session_id = ? AND timestamp >= ? AND sender_id = ?
+                ORDER BY timestamp ASC
+            """, (session_id, since_timestamp, sender_id))
+            return [self._row_to_message(row) for row in cursor.fetchall()]
+
+        try:
+            await self._sync_writes(session_id)
+            return await self._read(op)
+        except Exception as e:
+            logger.error(f"Error getting messages by sender: {e}", exc_info=True)
+            return []
+
+    async def search(
+        self,
+        session_id: str,
+        query: str,
+        limit: int,
+        before_timestamp: Optional[float] = None,
+    ) -> List[Message]:
+        """
+        Full-text search over a session's text messages, newest first.
+
+        Every word of ``query`` must match. Recalled messages are excluded.
+        """
+        tokens = tokenize_query(query)
+        if not tokens:
+            return []
+        match = (
+            f"{build_match_expression('session_key', [session_id])}"
+            f" AND {build_match_expression('body', tokens)}"
+        )
+
+        def op(conn):
+            cursor = conn.cursor()
+            sql = """
+                SELECT m.* FROM messages_fts f
+                JOIN messages m ON m.rowid = f.rowid
+                WHERE messages_fts MATCH ?
+                  AND m.session_id = ?
+                  AND m.is_recalled = FALSE
+            """
+            params = [match, session_id]
+            if before_timestamp is not None:
+                sql += " AND m.timestamp < ?"
+                params.append(before_timestamp)
+            sql += " ORDER BY m.timestamp DESC LIMIT ?"
+            params.append(limit)
+            cursor.execute(sql, params)
+            return [self._row_to_message(row) for row in cursor.fetchall()]
+
+        try:
+            await self._sync_writes(session_id)
+            return await self._read(op)
+        except Exception as e:
+            logger.error(f"Error searching messages: {e}", exc_info=True)
+            return []
+
+    async def update_recalled_status(
+        self, message_id: str, is_recalled: bool, session_id: Optional[str] = None
+    ) -> bool:
+        """
+        Set a message's recalled status as ``session_id`` sees it.
+
+        If the message is in the prefix a branch ``session_id`` shares with
+        its parent, only the branch's view changes; otherwise the row does.
+        Branches reading the row keep the status they saw either way.
+        """
+        def op(conn):
+            cursor = conn.cursor()
+            row = cursor.execute(
+                "SELECT session_id, seq FROM messages WHERE id = ?", (message_id,)
+            ).fetchone()
+            if row is None:
+                return False
+            depth = next(
+                (
+                    depth for depth, (segment_session_id, upto_seq) in enumerate(segments)
+                    if depth and segment_session_id == row["session_id"] and row["seq"] <= upto_seq
+                ),
+                None,
+            )
+            if depth is None:
+                cursor.execute(
+                    SNAPSHOT_OVERRIDES_SQL + " WHERE messages.id = ? AND messages.is_recalled != ?",
+                    (message_id, is_recalled),
+                )
+                cursor.execute(
+                    "UPDATE messages SET is_recalled = ? WHERE id = ?", (is_recalled, message_id)
+                )
+                return True
+
+            override, params = override_sql([viewer for viewer, _ in segments[:depth]])
+            seen = cursor.execute(
+                f"SELECT COALESCE({override}, is_recalled) FROM messages WHERE id = ?",
+                (*params, message_id),
+            ).fetchone()[0]
+            if bool(seen) == is_recalled:
+                return True
+            # The branch's own branches that read the row keep what they saw.
+            cursor.execute("""
+                INSERT OR IGNORE INTO branch_overrides (message_id, session_id, is_recalled)
+                SELECT ?, id, ? FROM sessions WHERE parent_session_id = ? AND fork_seq >= ?
+            """, (message_id, seen, session_id, row["seq"]))
+            cursor.execute("""
+                INSERT INTO branch_overrides (message_id, session_id, is_recalled)
+                VALUES (?, ?, ?)
+                ON CONFLICT (message_id, session_id) DO UPDATE SET is_recalled = excluded.is_recalled
+            """, (message_id, session_id, is_recalled))
+            cursor.execute("""
+                INSERT INTO message_changes (session_id, message_id, op, changed_at)
+                VALUES (?, ?, 'update', ?)
+            """, (session_id, message_id, time.time()))
+            return True
+
+        try:
+            segments = await self._segments(session_id) if session_id else []
+            if self._buffer:
+                return await self._buffer.submit(None, op)
+            return await self._write(op)
         except Exception as e:
             logger.error(f"Error updating recalled status: {e}", exc_info=True)
             return False
 
+    async def supersede_state_messages(
+        self, session_id: str, message_type: str, keep_id: str
+    ) -> int:
+        """
+        Mark all unrecalled messages of a type up to ``keep_id`` as recalled,
+        except ``keep_id`` itself, in one statement. Returns rows updated.
+
+        Branches that read the superseded rows keep seeing them unrecalled.
+        """
+        where = """
+            WHERE messages.session_id = ?
+              AND messages.type = ?
+              AND messages.is_recalled = FALSE
+              AND messages.id != ?
+              AND messages.timestamp <= (SELECT timestamp FROM messages WHERE id = ?)
+        """
+        params = (session_id, message_type, keep_id, keep_id)
+
+        def op(conn):
+            cursor = conn.cursor()
+            cursor.execute(SNAPSHOT_OVERRIDES_SQL + where, params)
+            cursor.execute("UPDATE messages SET is_recalled = TRUE" + where, params)
+            return cursor.rowcount or 0
+
+        try:
+            if self._buffer:
+                return await self._buffer.submit(session_id, op)
+            return await self._write(op)
+        except Exception as e:
+            logger.error(f"Error superseding state messages: {e}", exc_info=True)
+            return 0
+
     async def update_read_status_until(
         self, session_id: str, until_timestamp: float, is_read: bool = True
     ) -> int:
@@ -139,78 +633,249 @@ class MessageRepository(BaseRepository[Message], IMessageRepository):
         Mark messages in a session as read/unread up to a timestamp.
         Returns number of affected rows.
         """
+        def op(conn):
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                UPDATE messages
+                SET is_read = ?
+                WHERE session_id = ?
+                  AND timestamp <= ?
+                  AND is_recalled = FALSE
+                """,
+                (is_read, session_id, until_timestamp),
+            )
+            return cursor.rowcount or 0
+
         try:
-            with self.conn_mgr.transaction() as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    """
-                    UPDATE messages
-                    SET is_read = ?
-                    WHERE session_id = ?
-                      AND timestamp <= ?
-                      AND is_recalled = FALSE
-                    """,
-                    (is_read, session_id, until_timestamp),
-                )
-                return cursor.rowcount or 0
+            if self._buffer:
+                return await self._buffer.submit(session_id, op)
+            return await self._write(op)
         except Exception as e:
             logger.error(f"Error updating read status: {e}", exc_info=True)
             return 0
 
     async def get_last_read_timestamp(self, session_id: str) -> float:
         """Return latest timestamp among read messages in a session."""
+        def op(conn):
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT MAX(timestamp) AS ts
+                FROM messages
+                WHERE session_id = ?
+                  AND is_read = TRUE
+                  AND is_recalled = FALSE
+                """,
+                (session_id,),
+            )
+            row = cursor.fetchone()
+            return float(row["ts"]) if row and row["ts"] is not None else 0.0
+
         try:
-            with self.conn_mgr.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    """
-                    SELECT MAX(timestamp) AS ts
-                    FROM messages
-                    WHERE session_id = ?
-                      AND is_read = TRUE
-                      AND is_recalled = FALSE
-                    """,
-                    (session_id,),
-                )
-                row = cursor.fetchone()
-                return float(row["ts"]) if row and row["ts"] is not None else 0.0
+            await self._sync_writes(session_id)
+            return await self._read(op)
         except Exception as e:
             logger.error(f"Error getting last read timestamp: {e}", exc_info=True)
             return 0.0
 
+    async def get_changes(
+        self, session_id: str, after_change: int, limit: int
+    ) -> MessageChanges:
+        """
+        Return what changed in a session after the change-feed cursor
+        ``after_change``, covering at most ``limit`` logged changes.
+
+        A message changed several times is returned once, in its current
+        state. Change ids are shared by all sessions in the file, so cursors
+        only ever move forward but are not contiguous per session. A branch's
+        feed includes its recalls of shared prefix rows.
+        """
+        def op(conn):
+            cursor = conn.cursor()
+            head = self._change_head(cursor)
+            oldest = cursor.execute(
+                "SELECT MIN(change_id) FROM message_changes"
+            ).fetchone()[0]
+            if after_change < (oldest or head + 1) - 1:
+                # Changes after the cursor have already been pruned.
+                return MessageChanges(cursor=head, reset=True)
+
+            override, params = override_sql([viewer for viewer, _ in segments])
+            cursor.execute(f"""
+                SELECT c.change_id, c.message_id, messages.*, {override} AS branch_recalled
+                FROM message_changes c
+                LEFT JOIN messages ON messages.id = c.message_id
+                WHERE c.session_id = ? AND c.change_id > ?
+                ORDER BY c.change_id ASC
+                LIMIT ?
+            """, (*params, session_id, after_change, limit + 1))
+            rows = cursor.fetchall()
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+
+            # Last change per message wins; keep them in change order.
+            latest = {}
+            for row in rows:
+                latest.pop(row["message_id"], None)
+                latest[row["message_id"]] = row
+            return MessageChanges(
+                messages=[
+                    self._row_to_message(row, overridden=True)
+                    for row in latest.values() if row["id"] is not None
+                ],
+                deleted_ids=[
+                    message_id for message_id, row in latest.items() if row["id"] is None
+                ],
+                cursor=rows[-1]["change_id"] if rows else after_change,
+                has_more=has_more,
+            )
+
+        try:
+            segments = await self._segments(session_id)
+            await self._sync_writes(session_id)
+            return await self._read(op)
+        except Exception as e:
+            logger.error(f"Error getting message changes: {e}", exc_info=True)
+            return MessageChanges(cursor=after_change)
+
+    async def get_change_cursor(self, session_id: str) -> int:
+        """Return the newest change-feed cursor; sync from it to get only later changes."""
+        def op(conn):
+            return self._change_head(conn.cursor())
+
+        try:
+            await self._sync_writes(session_id)
+            return await self._read(op)
+        except Exception as e:
+            logger.error(f"Error getting change cursor: {e}", exc_info=True)
+            return 0
+
+    async def get_stats(self, session_id: str, days: int = 30) -> SessionStats:
+        def op(conn):
+            return rollups.read_stats(conn, session_id, days)
+
+        try:
+            # Rollups stay in the hot file, so archived sessions are answered
+            # without rehydrating them.
+            if self._buffer:
+                await self._buffer.barrier(session_id)
+            return await self._read(op)
+        except Exception as e:
+            logger.error(f"Error getting session stats: {e}", exc_info=True)
+            return SessionStats(session_id=session_id)
+
     async def delete_by_session(self, session_id: str) -> bool:
+        def op(conn):
+            cursor = conn.cursor()
+            cursor.execute("""
+                DELETE FROM branch_overrides WHERE session_id = ? OR message_id IN (
+                    SELECT id FROM messages WHERE session_id = ?
+                )
+            """, (session_id, session_id))
+            cursor.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            cursor.execute("DELETE FROM message_changes WHERE session_id = ?", (session_id,))
+            rollups.delete_session(cursor, session_id)
+            return True
+
         try:
-            with self.conn_mgr.transaction() as conn:
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
-                return True
+            if self._buffer:
+                await self._buffer.barrier(session_id)
+            if self._archive:
+                await self._archive.forget(session_id)
+            if getattr(self.conn_mgr, "sequences", None):
+                self.conn_mgr.sequences.forget(session_id)
+            if getattr(self.conn_mgr, "branches", None):
+                self.conn_mgr.branches.forget(session_id)
+            return await self._write(op)
         except Exception as e:
             logger.error(f"Error deleting messages by session: {e}", exc_info=True)
             return False
 
     async def delete_by_type(self, session_id: str, message_type: str) -> bool:
+        def op(conn):
+            cursor = conn.cursor()
+            cursor.execute(
+                LOG_DELETES_SQL + " WHERE session_id = ? AND type = ?",
+                (time.time(), session_id, message_type),
+            )
+            cursor.execute("""
+                DELETE FROM branch_overrides WHERE message_id IN (
+                    SELECT id FROM messages WHERE session_id = ? AND type = ?
+                )
+            """, (session_id, message_type))
+            cursor.execute("""
+                DELETE FROM messages
+                WHERE session_id = ? AND type = ?
+            """, (session_id, message_type))
+            return True
+
         try:
-            with self.conn_mgr.transaction() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    DELETE FROM messages
-                    WHERE session_id = ? AND type = ?
-                """, (session_id, message_type))
-                return True
+            await self._sync_writes(session_id)
+            return await self._write(op)
         except Exception as e:
             logger.error(f"Error deleting messages by type: {e}", exc_info=True)
             return False
 
-    def _row_to_message(self, row) -> Message:
-        metadata = json.loads(row['metadata']) if row['metadata'] else {}
-        return Message(
-            id=row['id'],
-            session_id=row['session_id'],
-            sender_id=row['sender_id'],
-            type=MessageType(row['type']),
-            content=row['content'],
-            metadata=metadata,
-            is_recalled=bool(row['is_recalled']),
-            is_read=bool(row['is_read']),
-            timestamp=row['timestamp']
+    @staticmethod
+    def _change_head(cursor) -> int:
+        row = cursor.execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'message_changes'"
+        ).fetchone()
+        return row[0] if row else 0
+
+    @staticmethod
+    def _record_rollups(cursor, messages: List[Message]):
+        counts = rollups.MessageRollups()
+        for message in messages:
+            counts.add_message(message)
+        counts.apply(cursor)
+
+    @staticmethod
+    def _index_params(message: Message) -> Optional[tuple]:
+        """INDEX_MESSAGE_SQL parameters, or None if the message is not searchable."""
+        if message.type != MessageType.TEXT or not message.content:
+            return None
+        return (tokenize_for_index(message.content), message.id)
+
+    def _pack_metadata(self, message: Message):
+        metadata = json.dumps(message.metadata)
+        compressor = getattr(self.conn_mgr, "compressor", None)
+        return compressor.pack(metadata) if compressor else metadata
+
+    def _message_params(self, message: Message) -> tuple:
+        return (
+            message.id,
+            message.session_id,
+            message.sender_id,
+            message.type,
+            message.content,
+            self._pack_metadata(message),
+            message.is_recalled,
+            message.is_read,
+            message.timestamp,
+            message.seq,
+            message.idempotency_key,
         )
+
+    def _row_to_message(self, row, overridden: bool = False) -> Message:
+        # Rows were validated when they were written, so skip re-validation.
+        # ``overridden`` rows carry a branch_recalled column (see override_sql).
+        raw_metadata = unpack(row['metadata'])
+        metadata = json.loads(raw_metadata) if raw_metadata and raw_metadata != "{}" else {}
+        is_recalled = row['is_recalled']
+        if overridden and row['branch_recalled'] is not None:
+            is_recalled = row['branch_recalled']
+        return construct_trusted(Message, {
+            'id': row['id'],
+            'session_id': row['session_id'],
+            'sender_id': row['sender_id'],
+            'type': row['type'],
+            'content': row['content'],
+            'metadata': metadata,
+            'is_recalled': bool(is_recalled),
+            'is_read': bool(row['is_read']),
+            'timestamp': row['timestamp'],
+            'seq': row['seq'],
+            'idempotency_key': row['idempotency_key'],
+        })
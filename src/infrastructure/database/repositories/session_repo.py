@@ -10,99 +10,148 @@ logger = logging.getLogger(__name__)
 
 class SessionRepository(BaseRepository[Session], ISessionRepository):
     async def get_by_id(self, id: str) -> Optional[Session]:
+        def op(conn):
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM sessions WHERE id = ?", (id,))
+            row = cursor.fetchone()
+            if row:
+                return self._row_to_session(row)
+            return None
+
         try:
-            with self.conn_mgr.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT * FROM sessions WHERE id = ?", (id,))
-                row = cursor.fetchone()
-                if row:
-                    return self._row_to_session(row)
-                return None
+            return await self._cached("sessions", ("id", id), lambda: self._read(op))
         except Exception as e:
             logger.error(f"Error getting session by id: {e}", exc_info=True)
             return None
 
     async def get_all(self) -> List[Session]:
+        def op(conn):
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM sessions ORDER BY created_at ASC")
+            rows = cursor.fetchall()
+            return [self._row_to_session(row) for row in rows]
+
         try:
-            with self.conn_mgr.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT * FROM sessions ORDER BY created_at ASC")
-                rows = cursor.fetchall()
-                return [self._row_to_session(row) for row in rows]
+            return await self._cached("sessions", ("all",), lambda: self._read(op))
         except Exception as e:
             logger.error(f"Error getting all sessions: {e}", exc_info=True)
             return []
 
     async def create(self, session: Session) -> bool:
+        def op(conn):
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO sessions (id, character_id, is_active, parent_session_id, fork_seq)
+                VALUES (?, ?, ?, ?, ?)
+            """, (
+                session.id, session.character_id, session.is_active,
+                session.parent_session_id, session.fork_seq,
+            ))
+            return True
+
         try:
-            with self.conn_mgr.transaction() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO sessions (id, character_id, is_active)
-                    VALUES (?, ?, ?)
-                """, (session.id, session.character_id, session.is_active))
-                return True
+            created = await self._write(op, invalidates=("sessions",))
+            shards = getattr(self.conn_mgr, "message_shards", None)
+            if created and shards and session.parent_session_id:
+                shards.register_branch(session.id, session.parent_session_id)
+            return created
         except Exception as e:
             logger.error(f"Error creating session: {e}", exc_info=True)
             return False
 
     async def update(self, session: Session) -> bool:
+        def op(conn):
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE sessions SET
+                    character_id = ?, is_active = ?
+                WHERE id = ?
+            """, (session.character_id, session.is_active, session.id))
+            return cursor.rowcount > 0
+
         try:
-            with self.conn_mgr.transaction() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    UPDATE sessions SET
-                        character_id = ?, is_active = ?
-                    WHERE id = ?
-                """, (session.character_id, session.is_active, session.id))
-                return cursor.rowcount > 0
+            return await self._write(op, invalidates=("sessions",))
         except Exception as e:
             logger.error(f"Error updating session: {e}", exc_info=True)
             return False
 
     async def delete(self, id: str) -> bool:
+        """Delete a session; its branches go with it (ON DELETE CASCADE)."""
+        def op(conn):
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM sessions WHERE id = ?", (id,))
+            return cursor.rowcount > 0
+
         try:
-            with self.conn_mgr.transaction() as conn:
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM sessions WHERE id = ?", (id,))
-                return cursor.rowcount > 0
+            return await self._write(op, invalidates=("sessions",))
         except Exception as e:
             logger.error(f"Error deleting session: {e}", exc_info=True)
             return False
 
     async def get_by_character(self, character_id: str) -> Optional[Session]:
+        def op(conn):
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT * FROM sessions WHERE character_id = ? AND parent_session_id IS NULL",
+                (character_id,),
+            )
+            row = cursor.fetchone()
+            if row:
+                return self._row_to_session(row)
+            return None
+
         try:
-            with self.conn_mgr.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT * FROM sessions WHERE character_id = ?", (character_id,))
-                row = cursor.fetchone()
-                if row:
-                    return self._row_to_session(row)
-                return None
+            return await self._cached("sessions", ("character", character_id), lambda: self._read(op))
         except Exception as e:
             logger.error(f"Error getting session by character: {e}", exc_info=True)
             return None
 
+    async def get_branches(self, session_id: str) -> List[Session]:
+        """Every branch forked from a session, directly or from one of its branches."""
+        def op(conn):
+            cursor = conn.cursor()
+            cursor.execute("""
+                WITH RECURSIVE branches(id) AS (
+                    SELECT id FROM sessions WHERE parent_session_id = ?
+                    UNION ALL
+                    SELECT s.id FROM sessions AS s
+                    JOIN branches ON s.parent_session_id = branches.id
+                )
+                SELECT * FROM sessions WHERE id IN (SELECT id FROM branches)
+                ORDER BY created_at ASC, rowid ASC
+            """, (session_id,))
+            return [self._row_to_session(row) for row in cursor.fetchall()]
+
+        try:
+            return await self._cached("sessions", ("branches", session_id), lambda: self._read(op))
+        except Exception as e:
+            logger.error(f"Error getting session branches: {e}", exc_info=True)
+            return []
+
     async def get_active_session(self) -> Optional[Session]:
+        def op(conn):
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM sessions WHERE is_active = TRUE LIMIT 1")
+            row = cursor.fetchone()
+            if row:
+                return self._row_to_session(row)
+            return None
+
         try:
-            with self.conn_mgr.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT * FROM sessions WHERE is_active = TRUE LIMIT 1")
-                row = cursor.fetchone()
-                if row:
-                    return self._row_to_session(row)
-                return None
+            return await self._cached("sessions", ("active",), lambda: self._read(op))
         except Exception as e:
             logger.error(f"Error getting active session: {e}", exc_info=True)
             return None
 
     async def set_active_session(self, session_id: str) -> bool:
+        def op(conn):
+            cursor = conn.cursor()
+            cursor.execute("UPDATE sessions SET is_active = FALSE")
+            cursor.execute("UPDATE sessions SET is_active = TRUE WHERE id = ?", (session_id,))
+            return cursor.rowcount > 0
+
         try:
-            with self.conn_mgr.transaction() as conn:
-                cursor = conn.cursor()
-                cursor.execute("UPDATE sessions SET is_active = FALSE")
-                cursor.execute("UPDATE sessions SET is_active = TRUE WHERE id = ?", (session_id,))
-                return cursor.rowcount > 0
+            return await self._write(op, invalidates=("sessions",))
         except Exception as e:
             logger.error(f"Error setting active session: {e}", exc_info=True)
             return False
@@ -112,5 +161,7 @@ class SessionRepository(BaseRepository[Session], ISessionRepository):
             id=row['id'],
             character_id=row['character_id'],
             is_active=bool(row['is_active']),
-            created_at=datetime.fromisoformat(row['created_at']) if row['created_at'] else None
+            created_at=datetime.fromisoformat(row['created_at']) if row['created_at'] else None,
+            parent_session_id=row['parent_session_id'],
+            fork_seq=row['fork_seq'],
         )
@@ -0,0 +1,118 @@
+import json
+import logging
+import time
+from typing import Any, Dict, List, Optional
+from src.core.interfaces.repositories import ISessionStateRepository
+from src.infrastructure.database.repositories.base import BaseRepository
+
+logger = logging.getLogger(__name__)
+
+
+class SessionStateRepository(BaseRepository[Dict], ISessionStateRepository):
+    """
+    Keyed per-session state stored in ``session_state``.
+
+    Values are JSON encoded. Every lookup and upsert is a primary-key access
+    on (session_id, key), independent of how long the session history is.
+    """
+
+    async def get_by_id(self, id: str) -> Optional[Dict]:
+        return await self.get_all_state(id)
+
+    async def get_all(self) -> List[Dict]:
+        def op(conn):
+            cursor = conn.cursor()
+            cursor.execute("SELECT session_id, key, value FROM session_state")
+            return [
+                {
+                    "session_id": row["session_id"],
+                    "key": row["key"],
+                    "value": self._decode(row["value"]),
+                }
+                for row in cursor.fetchall()
+            ]
+
+        try:
+            return await self._read(op)
+        except Exception as e:
+            logger.error(f"Error getting all session state: {e}", exc_info=True)
+            return []
+
+    async def create(self, entity: Dict) -> bool:
+        return await self.set_state(
+            entity.get("session_id"), entity.get("key"), entity.get("value")
+        )
+
+    async def update(self, entity: Dict) -> bool:
+        return await self.create(entity)
+
+    async def delete(self, id: str) -> bool:
+        return await self.delete_by_session(id)
+
+    async def get_state(self, session_id: str, key: str) -> Optional[Any]:
+        def op(conn):
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT value FROM session_state WHERE session_id = ? AND key = ?",
+                (session_id, key),
+            )
+            row = cursor.fetchone()
+            return self._decode(row["value"]) if row else None
+
+        try:
+            return await self._read(op)
+        except Exception as e:
+            logger.error(f"Error getting session state: {e}", exc_info=True)
+            return None
+
+    async def get_all_state(self, session_id: str) -> Dict[str, Any]:
+        def op(conn):
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT key, value FROM session_state WHERE session_id = ?",
+                (session_id,),
+            )
+            return {row["key"]: self._decode(row["value"]) for row in cursor.fetchall()}
+
+        try:
+            return await self._read(op)
+        except Exception as e:
+            logger.error(f"Error getting session state: {e}", exc_info=True)
+            return {}
+
+    async def set_state(self, session_id: str, key: str, value: Any) -> bool:
+        def op(conn):
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                INSERT INTO session_state (session_id, key, value, updated_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(session_id, key) DO UPDATE SET
+                    value = excluded.value,
+                    updated_at = excluded.updated_at
+                """,
+                (session_id, key, json.dumps(value), time.time()),
+            )
+            return True
+
+        try:
+            return await self._write(op)
+        except Exception as e:
+            logger.error(f"Error setting session state: {e}", exc_info=True)
+            return False
+
+    async def delete_by_session(self, session_id: str) -> bool:
+        def op(conn):
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM session_state WHERE session_id = ?", (session_id,))
+            return True
+
+        try:
+            return await self._write(op)
+        except Exception as e:
+            logger.error(f"Error deleting session state: {e}", exc_info=True)
+            return False
+
+    @staticmethod
+    def _decode(value: Optional[str]) -> Any:
+        return json.loads(value) if value is not None else None
@@ -0,0 +1,158 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Dict, List, Optional
+from src.core.models.message import Message, MessageChanges, SessionStats
+from src.core.interfaces.repositories import IMessageRepository
+from src.infrastructure.database.repositories.message_repo import MessageRepository
+
+logger = logging.getLogger(__name__)
+
+
+class ShardedMessageRepository(IMessageRepository):
+    """
+    Message storage spread over the catalog's message shards.
+
+    Session-scoped calls go to the one :class:`MessageRepository` that owns
+    the session; a branch session is owned by its root's shard, so the
+    prefixes it shares are resolved there too. Calls that only know a
+    message id fan out to every shard.
+    """
+
+    def __init__(self, shards):
+        self.shards = shards
+        self._repos = [MessageRepository(conn) for conn in shards.connections]
+
+    def _for(self, session_id: str) -> MessageRepository:
+        return self._repos[self.shards.index_for(session_id)]
+
+    async def get_by_id(self, id: str) -> Optional[Message]:
+        results = await asyncio.gather(*(repo.get_by_id(id) for repo in self._repos))
+        return next((message for message in results if message), None)
+
+    async def get_all(self) -> List[Message]:
+        results = await asyncio.gather(*(repo.get_all() for repo in self._repos))
+        messages = [message for shard in results for message in shard]
+        messages.sort(key=lambda message: message.timestamp)
+        return messages
+
+    async def create(self, message: Message) -> bool:
+        return await self._for(message.session_id).create(message)
+
+    async def create_many(self, messages: List[Message]) -> bool:
+        """Insert several messages; atomic per shard, not across shards."""
+        by_shard: Dict[int, List[Message]] = defaultdict(list)
+        for message in messages:
+            by_shard[self.shards.index_for(message.session_id)].append(message)
+        results = await asyncio.gather(
+            *(self._repos[index].create_many(batch) for index, batch in by_shard.items())
+        )
+        return all(results)
+
+    async def update(self, message: Message) -> bool:
+        return await self._for(message.session_id).update(message)
+
+    async def delete(self, id: str) -> bool:
+        results = await asyncio.gather(*(repo.delete(id) for repo in self._repos))
+        return any(results)
+
+    async def get_by_session(
+        self,
+        session_id: str,
+        after_timestamp: Optional[float] = None,
+        limit: Optional[int] = None,
+        before_timestamp: Optional[float] = None,
+        after_seq: Optional[int] = None,
+        before_seq: Optional[int] = None,
+    ) -> List[Message]:
+        return await self._for(session_id).get_by_session(
+            session_id, after_timestamp, limit, before_timestamp, after_seq, before_seq
+        )
+
+    async def get_by_idempotency_key(
+        self, session_id: str, idempotency_key: str
+    ) -> Optional[Message]:
+        return await self._for(session_id).get_by_idempotency_key(session_id, idempotency_key)
+
+    async def get_latest(self, session_id: str) -> Optional[Message]:
+        return await self._for(session_id).get_latest(session_id)
+
+    async def get_latest_by_type(
+        self, session_id: str, message_type: str
+    ) -> Optional[Message]:
+        return await self._for(session_id).get_latest_by_type(session_id, message_type)
+
+    async def exists_by_type(self, session_id: str, message_type: str) -> bool:
+        return await self._for(session_id).exists_by_type(session_id, message_type)
+
+    async def get_by_type(
+        self, session_id: str, message_type: str, include_recalled: bool = True
+    ) -> List[Message]:
+        return await self._for(session_id).get_by_type(
+            session_id, message_type, include_recalled
+        )
+
+    async def get_by_sender_since(
+        self, session_id: str, sender_id: str, since_timestamp: float
+    ) -> List[Message]:
+        return await self._for(session_id).get_by_sender_since(
+            session_id, sender_id, since_timestamp
+        )
+
+    async def search(
+        self,
+        session_id: str,
+        query: str,
+        limit: int,
+        before_timestamp: Optional[float] = None,
+    ) -> List[Message]:
+        return await self._for(session_id).search(
+            session_id, query, limit, before_timestamp
+        )
+
+    async def update_recalled_status(
+        self, message_id: str, is_recalled: bool, session_id: Optional[str] = None
+    ) -> bool:
+        if session_id:
+            # A branch's prefix lives in its root's shard, as the branch does.
+            return await self._for(session_id).update_recalled_status(
+                message_id, is_recalled, session_id
+            )
+        results = await asyncio.gather(
+            *(repo.update_recalled_status(message_id, is_recalled) for repo in self._repos)
+        )
+        return any(results)
+
+    async def supersede_state_messages(
+        self, session_id: str, message_type: str, keep_id: str
+    ) -> int:
+        return await self._for(session_id).supersede_state_messages(
+            session_id, message_type, keep_id
+        )
+
+    async def update_read_status_until(
+        self, session_id: str, until_timestamp: float, is_read: bool = True
+    ) -> int:
+        return await self._for(session_id).update_read_status_until(
+            session_id, until_timestamp, is_read
+        )
+
+    async def get_last_read_timestamp(self, session_id: str) -> float:
+        return await self._for(session_id).get_last_read_timestamp(session_id)
+
+    async def get_changes(
+        self, session_id: str, after_change: int, limit: int
+    ) -> MessageChanges:
+        return await self._for(session_id).get_changes(session_id, after_change, limit)
+
+    async def get_change_cursor(self, session_id: str) -> int:
+        return await self._for(session_id).get_change_cursor(session_id)
+
+    async def get_stats(self, session_id: str, days: int = 30) -> SessionStats:
+        return await self._for(session_id).get_stats(session_id, days)
+
+    async def delete_by_session(self, session_id: str) -> bool:
+        return await self._for(session_id).delete_by_session(session_id)
+
+    async def delete_by_type(self, session_id: str, message_type: str) -> bool:
+        return await self._for(session_id).delete_by_type(session_id, message_type)
@@ -0,0 +1,300 @@
+import datetime
+import json
+import logging
+import sqlite3
+from collections import defaultdict
+from typing import Any, Dict, Optional
+
+from src.core.models.constants import DEFAULT_USER_ID
+from src.core.models.message import (
+    DailyMessageStats,
+    Message,
+    MessageCounts,
+    MessageType,
+    SessionStats,
+)
+from src.infrastructure.database.archive import ARCHIVE_SCHEMA, ARCHIVED_COLUMNS, decompress
+from src.infrastructure.database.compression import unpack
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = tuple(MessageCounts.model_fields)
+
+ROLLUP_TABLES = ("session_stats", "session_daily_stats", "session_emotion_stats")
+
+VISIBLE_TYPES = {
+    MessageType.TEXT.value,
+    MessageType.IMAGE.value,
+    MessageType.VIDEO.value,
+    MessageType.AUDIO.value,
+}
+
+# Stickers are image messages pointing at the sticker route.
+STICKER_URL_PREFIX = "/api/stickers/"
+
+_ADD_COUNTERS = ", ".join(f"{name} = {name} + excluded.{name}" for name in COUNTERS)
+
+UPSERT_SESSION_SQL = f"""
+    INSERT INTO session_stats (
+        session_id, {", ".join(COUNTERS)}, first_timestamp, last_timestamp
+    ) VALUES (?, {", ".join("?" for _ in COUNTERS)}, ?, ?)
+    ON CONFLICT (session_id) DO UPDATE SET
+        {_ADD_COUNTERS},
+        first_timestamp = MIN(first_timestamp, excluded.first_timestamp),
+        last_timestamp = MAX(last_timestamp, excluded.last_timestamp)
+"""
+
+UPSERT_DAY_SQL = f"""
+    INSERT INTO session_daily_stats (session_id, day, {", ".join(COUNTERS)})
+    VALUES (?, ?, {", ".join("?" for _ in COUNTERS)})
+    ON CONFLICT (session_id, day) DO UPDATE SET {_ADD_COUNTERS}
+"""
+
+UPSERT_EMOTION_SQL = """
+    INSERT INTO session_emotion_stats (session_id, emotion, level, count)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT (session_id, emotion, level) DO UPDATE SET count = count + excluded.count
+"""
+
+
+def ensure_schema(cursor: sqlite3.Cursor):
+    counters = ",\n".join(f"{name} INTEGER NOT NULL DEFAULT 0" for name in COUNTERS)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS session_stats (
+            session_id TEXT PRIMARY KEY,
+            {counters},
+            first_timestamp REAL,
+            last_timestamp REAL
+        )
+    """)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS session_daily_stats (
+            session_id TEXT NOT NULL,
+            day TEXT NOT NULL,
+            {counters},
+            PRIMARY KEY (session_id, day)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS session_emotion_stats (
+            session_id TEXT NOT NULL,
+            emotion TEXT NOT NULL,
+            level TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (session_id, emotion, level)
+        ) WITHOUT ROWID
+    """)
+
+
+def day_of(timestamp: float) -> str:
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).strftime("%Y-%m-%d")
+
+
+class MessageRollups:
+    """
+    Per-session, per-day and per-emotion counters for a set of messages.
+
+    The repository adds every message it inserts and :meth:`apply` adds the
+    counts to the rollup tables in the same transaction, so the tables always
+    match what was written. They count messages as they were written: later
+    recalls, purges of superseded state rows and archiving do not change
+    them, and rows re-inserted by archive restores or shard moves are not
+    counted again because those paths do not go through the repository.
+    Deleting a session drops its rollups.
+    """
+
+    def __init__(self):
+        # session_id -> {"totals": {...}, "days": {day: {...}}, "emotions": {(emotion, level): n}}
+        self.sessions: Dict[str, Dict[str, Any]] = {}
+
+    def add_message(self, message: Message):
+        self.add(
+            message.session_id, message.sender_id, message.type,
+            message.content, message.metadata, message.timestamp,
+        )
+
+    def add(
+        self,
+        session_id: str,
+        sender_id: str,
+        message_type: str,
+        content: str,
+        metadata: Optional[Dict[str, Any]],
+        timestamp: float,
+    ):
+        metadata = metadata if isinstance(metadata, dict) else {}
+        counts = self._counts(sender_id, message_type, content, metadata)
+
+        session = self.sessions.get(session_id)
+        if session is None:
+            totals = dict.fromkeys(COUNTERS, 0)
+            totals["first_timestamp"] = totals["last_timestamp"] = timestamp
+            session = self.sessions[session_id] = {
+                "totals": totals, "days": {}, "emotions": defaultdict(int),
+            }
+        totals = session["totals"]
+        totals["first_timestamp"] = min(totals["first_timestamp"], timestamp)
+        totals["last_timestamp"] = max(totals["last_timestamp"], timestamp)
+
+        day = session["days"].setdefault(day_of(timestamp), dict.fromkeys(COUNTERS, 0))
+        for name, value in counts.items():
+            totals[name] += value
+            day[name] += value
+
+        if message_type == MessageType.SYSTEM_EMOTION.value:
+            for emotion, level in metadata.items():
+                session["emotions"][(str(emotion), str(level))] += 1
+
+    def apply(self, cursor: sqlite3.Cursor):
+        """Add these counts to the rollup tables."""
+        if not self.sessions:
+            return
+        cursor.executemany(UPSERT_SESSION_SQL, [
+            (
+                session_id, *(s["totals"][name] for name in COUNTERS),
+                s["totals"]["first_timestamp"], s["totals"]["last_timestamp"],
+            )
+            for session_id, s in self.sessions.items()
+        ])
+        cursor.executemany(UPSERT_DAY_SQL, [
+            (session_id, day, *(d[name] for name in COUNTERS))
+            for session_id, s in self.sessions.items()
+            for day, d in s["days"].items()
+        ])
+        cursor.executemany(UPSERT_EMOTION_SQL, [
+            (session_id, emotion, level, count)
+            for session_id, s in self.sessions.items()
+            for (emotion, level), count in s["emotions"].items()
+        ])
+
+    def forget(self, session_id: str):
+        self.sessions.pop(session_id, None)
+
+    def session_stats(self, session_id: str, days: int) -> SessionStats:
+        """One session's totals, read from these counters instead of the tables."""
+        session = self.sessions.get(session_id)
+        if session is None:
+            return SessionStats(session_id=session_id)
+        emotions: Dict[str, Dict[str, int]] = {}
+        for (emotion, level), count in session["emotions"].items():
+            emotions.setdefault(emotion, {})[level] = count
+        recent = sorted(session["days"], reverse=True)[:max(0, days)]
+        return SessionStats(
+            session_id=session_id,
+            **session["totals"],
+            emotions=emotions,
+            days=[DailyMessageStats(day=day, **session["days"][day]) for day in recent],
+        )
+
+    @staticmethod
+    def _counts(
+        sender_id: str, message_type: str, content: str, metadata: Dict[str, Any]
+    ) -> Dict[str, int]:
+        visible = message_type in VISIBLE_TYPES
+        return {
+            "message_count": int(visible),
+            "user_message_count": int(visible and sender_id == DEFAULT_USER_ID),
+            "sticker_count": int(
+                message_type == MessageType.IMAGE.value
+                and (content or "").startswith(STICKER_URL_PREFIX)
+            ),
+            "recall_count": int(message_type == MessageType.SYSTEM_RECALL.value),
+            "correction_count": int(visible and metadata.get("is_correction") is True),
+            "emotion_count": int(message_type == MessageType.SYSTEM_EMOTION.value),
+        }
+
+
+def read_stats(conn: sqlite3.Connection, session_id: str, days: int) -> SessionStats:
+    """A session's rollups; primary-key lookups, independent of its message count."""
+    select = ", ".join(COUNTERS)
+    row = conn.execute(
+        f"SELECT {select}, first_timestamp, last_timestamp FROM session_stats WHERE session_id = ?",
+        (session_id,),
+    ).fetchone()
+    totals = dict(zip(COUNTERS + ("first_timestamp", "last_timestamp"), row)) if row else {}
+
+    emotions: Dict[str, Dict[str, int]] = {}
+    for emotion, level, count in conn.execute(
+        "SELECT emotion, level, count FROM session_emotion_stats WHERE session_id = ?",
+        (session_id,),
+    ):
+        emotions.setdefault(emotion, {})[level] = count
+
+    daily = conn.execute(
+        f"""
+        SELECT day, {select} FROM session_daily_stats
+        WHERE session_id = ? ORDER BY day DESC LIMIT ?
+        """,
+        (session_id, max(0, days)),
+    ).fetchall()
+
+    return SessionStats(
+        session_id=session_id,
+        **totals,
+        emotions=emotions,
+        days=[DailyMessageStats(**dict(zip(("day",) + COUNTERS, row))) for row in daily],
+    )
+
+
+def delete_session(cursor: sqlite3.Cursor, session_id: str):
+    for table in ROLLUP_TABLES:
+        cursor.execute(f"DELETE FROM {table} WHERE session_id = ?", (session_id,))
+
+
+def purge_orphaned(conn: sqlite3.Connection) -> int:
+    """Drop the rollups of sessions that no longer exist."""
+    purged = 0
+    for table in ROLLUP_TABLES:
+        cursor = conn.execute(f"""
+            DELETE FROM {table}
+            WHERE session_id NOT IN (SELECT id FROM sessions)
+        """)
+        purged += cursor.rowcount
+    return purged
+
+
+def rebuild(cursor: sqlite3.Cursor, include_archive: bool, batch_size: int = 1000) -> int:
+    """Recompute every rollup from the stored messages, hot and archived."""
+    for table in ROLLUP_TABLES:
+        cursor.execute(f"DELETE FROM {table}")
+
+    rollups = MessageRollups()
+    counted = 0
+
+    def add(session_id, sender_id, message_type, content, metadata, timestamp):
+        raw = unpack(metadata)
+        try:
+            parsed = json.loads(raw) if raw else {}
+        except ValueError:
+            parsed = {}
+        rollups.add(session_id, sender_id, message_type, content, parsed, timestamp)
+
+    rows = cursor.connection.execute(
+        "SELECT session_id, sender_id, type, content, metadata, timestamp FROM messages"
+    )
+    while True:
+        batch = rows.fetchmany(batch_size)
+        if not batch:
+            break
+        for row in batch:
+            add(*row)
+        counted += len(batch)
+
+    if include_archive:
+        columns = ("session_id", "sender_id", "type", "content", "metadata", "timestamp")
+        positions = [ARCHIVED_COLUMNS.index(name) for name in columns]
+        hot_sessions = set(rollups.sessions)
+        blobs = cursor.connection.execute(
+            f"SELECT session_id, codec, payload FROM {ARCHIVE_SCHEMA}.archived_sessions"
+        )
+        for session_id, codec, payload in blobs:
+            if session_id in hot_sessions:
+                # Caught mid-move; its hot copy was counted already.
+                continue
+            for values in json.loads(decompress(payload, codec)):
+                add(*(values[i] for i in positions))
+                counted += 1
+
+    rollups.apply(cursor)
+    logger.info(f"Rebuilt message rollups from {counted} messages")
+    return counted
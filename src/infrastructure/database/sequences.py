@@ -0,0 +1,51 @@
+import sqlite3
+from typing import Dict
+
+
+class MessageSequences:
+    """
+    Allocates the per-session ``seq`` of new messages.
+
+    Numbers are handed out in the event loop when a message is created, before
+    its insert is queued, so a message carries its ``seq`` even while it waits
+    in the group-commit buffer. Each session's counter is seeded once from
+    ``MAX(seq)`` (or, for a branch without rows yet, its ``fork_seq``) and
+    then kept in memory; every message of a session is written through the
+    one :class:`DatabaseConnection` that owns it, so nothing else hands out
+    numbers for it. A failed insert leaves a gap, which
+    is fine: ``seq`` is strictly increasing, not dense.
+    """
+
+    def __init__(self, conn_mgr):
+        self.conn_mgr = conn_mgr
+        self._next: Dict[str, int] = {}
+
+    async def allocate(self, session_id: str, count: int = 1) -> int:
+        """Reserve ``count`` consecutive numbers for a session; returns the first."""
+        if session_id not in self._next:
+            top = await self.conn_mgr.run(lambda conn: self._max_seq(conn, session_id))
+            # Another allocation may have seeded it while we were reading.
+            self._next.setdefault(session_id, top + 1)
+        first = self._next[session_id]
+        self._next[session_id] = first + count
+        return first
+
+    def forget(self, session_id: str):
+        self._next.pop(session_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {"tracked_sessions": len(self._next)}
+
+    @staticmethod
+    def _max_seq(conn: sqlite3.Connection, session_id: str) -> int:
+        # A branch continues numbering after the prefix it shares.
+        row = conn.execute(
+            """
+            SELECT MAX(
+                COALESCE((SELECT MAX(seq) FROM messages WHERE session_id = ?), 0),
+                COALESCE((SELECT fork_seq FROM sessions WHERE id = ?), 0)
+            )
+            """,
+            (session_id, session_id),
+        ).fetchone()
+        return row[0] or 0
@@ -0,0 +1,193 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import zlib
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List
+
+from src.infrastructure.database.archive import (
+    ARCHIVED_COLUMNS,
+    RESTORE_MESSAGE_SQL,
+    decompress,
+    restore_params,
+)
+from src.infrastructure.database import rollups
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_BATCH_SIZE = 1000
+
+# Hot rows move with their idempotency key, so a resend still pending across
+# the restart is answered with the stored message; archive blobs have none.
+HOT_COLUMNS = ARCHIVED_COLUMNS + ("idempotency_key",)
+
+RESTORE_KEY_SQL = """
+    UPDATE messages SET idempotency_key = ?
+    WHERE id = ? AND idempotency_key IS NULL
+"""
+
+BRANCH_ROOTS_SQL = """
+    WITH RECURSIVE roots(id, root) AS (
+        SELECT id, id FROM sessions WHERE parent_session_id IS NULL
+        UNION ALL
+        SELECT s.id, roots.root
+        FROM sessions AS s JOIN roots ON s.parent_session_id = roots.id
+    )
+    SELECT id, root FROM roots WHERE id != root
+"""
+
+
+def shard_index(session_id: str, shard_count: int) -> int:
+    """Stable shard number for a session; must not change between releases."""
+    return zlib.crc32(session_id.encode("utf-8")) % shard_count
+
+
+def shard_path(path: str, index: int) -> Path:
+    p = Path(path)
+    return p.with_name(f"{p.stem}.shard{index}{p.suffix}")
+
+
+class MessageShards:
+    """
+    The message shard files of a catalog :class:`DatabaseConnection`.
+
+    Each shard is a full ``DatabaseConnection`` with its own writer thread,
+    connection pool, group-commit buffer and archive file, so sessions in
+    different shards never wait on each other's write lock. A session always
+    maps to the same shard via :func:`shard_index`. Branch sessions map to
+    the shard of their root session, so a branch and every prefix it shares
+    live in one file and are read with plain range scans.
+
+    Messages left in the catalog from an unsharded layout (including
+    archived sessions) are moved into their shards on first start.
+    """
+
+    def __init__(self, catalog):
+        # Imported here: connection.py creates MessageShards lazily.
+        from src.infrastructure.database.connection import DatabaseConnection
+
+        self.catalog = catalog
+        config = catalog.config
+        # branch session_id -> root session_id
+        self._roots: Dict[str, str] = self._load_branch_roots()
+        self.connections = []
+        for index in range(config.message_shards):
+            shard_config = config.model_copy(update={
+                "path": str(shard_path(config.path, index)),
+                "archive_path": str(shard_path(config.archive_path, index)),
+            })
+            self.connections.append(DatabaseConnection(
+                shard_config.path, shard_config, catalog_path=catalog.db_path
+            ))
+        self._migrate_unsharded()
+
+    def __len__(self) -> int:
+        return len(self.connections)
+
+    def index_for(self, session_id: str) -> int:
+        root = self._roots.get(session_id, session_id)
+        return shard_index(root, len(self.connections))
+
+    def register_branch(self, session_id: str, parent_session_id: str):
+        """Route a new branch to its root's shard; call before it gets messages."""
+        self._roots[session_id] = self._roots.get(parent_session_id, parent_session_id)
+
+    def for_session(self, session_id: str):
+        return self.connections[self.index_for(session_id)]
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [conn.stats() for conn in self.connections]
+
+    async def drain(self):
+        await asyncio.gather(*(conn.drain() for conn in self.connections))
+
+    def close(self):
+        for conn in self.connections:
+            conn.close()
+
+    def _load_branch_roots(self) -> Dict[str, str]:
+        with self.catalog._borrow() as conn:
+            return {row[0]: row[1] for row in conn.execute(BRANCH_ROOTS_SQL)}
+
+    def _migrate_unsharded(self):
+        columns = ", ".join(HOT_COLUMNS)
+        moved = 0
+        with self.catalog._borrow(write=True) as conn:
+            rows = conn.execute(f"SELECT {columns} FROM messages")
+            while True:
+                batch = rows.fetchmany(MIGRATION_BATCH_SIZE)
+                if not batch:
+                    break
+                self._copy_rows([tuple(row) for row in batch])
+                moved += len(batch)
+            moved += self._migrate_archived(conn)
+            if not moved:
+                return
+            self._copy_overrides(conn)
+            # Copies are committed in the shards first, so a crash before this
+            # delete only repeats the (idempotent) copy on the next start.
+            conn.execute("DELETE FROM messages")
+            conn.execute("DELETE FROM branch_overrides")
+            for table in rollups.ROLLUP_TABLES:
+                conn.execute(f"DELETE FROM {table}")
+
+        for shard in self.connections:
+            with shard._borrow(write=True) as conn:
+                shard._backfill_message_search(conn.cursor())
+                shard._backfill_message_rollups(conn.cursor())
+        logger.info(f"Moved {moved} messages into {len(self)} shards")
+
+    def _migrate_archived(self, conn: sqlite3.Connection) -> int:
+        archive_path = Path(self.catalog.config.archive_path)
+        if not archive_path.exists():
+            return 0
+
+        conn.execute("ATTACH DATABASE ? AS legacy_archive", (str(archive_path),))
+        try:
+            exists = conn.execute("""
+                SELECT 1 FROM legacy_archive.sqlite_master
+                WHERE type = 'table' AND name = 'archived_sessions'
+            """).fetchone()
+            if not exists:
+                return 0
+            moved = 0
+            blobs = conn.execute(
+                "SELECT codec, payload FROM legacy_archive.archived_sessions"
+            ).fetchall()
+            for blob in blobs:
+                rows = [tuple(row) for row in json.loads(decompress(blob["payload"], blob["codec"]))]
+                self._copy_rows(rows)
+                moved += len(rows)
+            conn.execute("DELETE FROM legacy_archive.archived_sessions")
+            conn.commit()
+            return moved
+        finally:
+            conn.execute("DETACH DATABASE legacy_archive")
+
+    def _copy_overrides(self, conn: sqlite3.Connection):
+        by_shard: Dict[int, List[tuple]] = defaultdict(list)
+        for row in conn.execute("SELECT message_id, session_id, is_recalled FROM branch_overrides"):
+            by_shard[self.index_for(row[1])].append(tuple(row))
+        for index, shard_rows in by_shard.items():
+            with self.connections[index]._borrow(write=True) as shard_conn:
+                shard_conn.executemany(
+                    "INSERT OR IGNORE INTO branch_overrides VALUES (?, ?, ?)", shard_rows
+                )
+
+    def _copy_rows(self, rows: List[tuple]):
+        """Copy hot (``HOT_COLUMNS``) or archived (``ARCHIVED_COLUMNS``) rows."""
+        width = len(ARCHIVED_COLUMNS)
+        by_shard: Dict[int, List[tuple]] = defaultdict(list)
+        keys_by_shard: Dict[int, List[tuple]] = defaultdict(list)
+        for row in rows:
+            index = self.index_for(row[1])
+            by_shard[index].append(restore_params(row[:width], self.catalog.compressor))
+            if len(row) > width and row[width] is not None:
+                keys_by_shard[index].append((row[width], row[0]))
+        for index, shard_rows in by_shard.items():
+            with self.connections[index]._borrow(write=True) as conn:
+                conn.executemany(RESTORE_MESSAGE_SQL, shard_rows)
+                if keys_by_shard[index]:
+                    conn.executemany(RESTORE_KEY_SQL, keys_by_shard[index])
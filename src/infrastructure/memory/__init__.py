@@ -0,0 +1,17 @@
+from src.infrastructure.memory.store import MemoryStore
+from src.infrastructure.memory.repositories import (
+    MemoryMessageRepository,
+    MemoryCharacterRepository,
+    MemorySessionRepository,
+    MemoryConfigRepository,
+    MemorySessionStateRepository,
+)
+
+__all__ = [
+    'MemoryStore',
+    'MemoryMessageRepository',
+    'MemoryCharacterRepository',
+    'MemorySessionRepository',
+    'MemoryConfigRepository',
+    'MemorySessionStateRepository',
+]
@@ -0,0 +1,588 @@
+import copy
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.core.interfaces.repositories import (
+    ICharacterRepository,
+    IConfigRepository,
+    IMessageRepository,
+    ISessionRepository,
+    ISessionStateRepository,
+)
+from src.core.models.character import Character
+from src.core.models.message import Message, MessageChanges, MessageType, SessionStats
+from src.core.models.session import Session
+from src.infrastructure.memory.store import MemoryStore
+from src.utils.search_tokenizer import tokenize_for_index, tokenize_query
+
+
+def _seq(message: Message) -> int:
+    return message.seq
+
+
+def _time_order(message: Message) -> Tuple[float, int]:
+    return (message.timestamp, message.seq)
+
+
+def _copy(model):
+    # Callers may mutate what they get back, as they may with SQLite rows.
+    return model.model_copy(deep=True)
+
+
+class MemoryMessageRepository(IMessageRepository):
+    """
+    :class:`IMessageRepository` over a :class:`MemoryStore`.
+
+    Mirrors :class:`MessageRepository`: messages get a per-session ``seq`` on
+    insert (set on the passed-in model), reads are in ``seq`` order, and
+    inserts, updates and deletes are logged to the change feed. Search
+    matches the same jieba tokens the FTS index would, by linear scan.
+    Branch sessions read their shared prefix the same way too, bisecting
+    each segment of the chain in place, and keep their own recalled status
+    for prefix rows as the ``branch_overrides`` table does.
+    """
+
+    def __init__(self, store: MemoryStore):
+        self.store = store
+
+    def _session(self, session_id: str) -> List[Message]:
+        return self.store.session_messages.get(session_id, [])
+
+    def _of_type(self, session_id: str, message_type: str) -> List[Message]:
+        types = self.store.type_messages.get(session_id)
+        return types.get(message_type, []) if types else []
+
+    def _insert(self, message: Message):
+        """Add a stored message to the session list and its indexes."""
+        messages = self.store.session_messages[message.session_id]
+        if not messages or messages[-1].seq < message.seq:
+            messages.append(message)
+        else:
+            messages.insert(bisect_left(messages, message.seq, key=_seq), message)
+        for index in (
+            self.store.type_messages[message.session_id][message.type],
+            self.store.sender_messages[message.session_id][message.sender_id],
+        ):
+            index.insert(bisect_right(index, _time_order(message), key=_time_order), message)
+        self.store.messages[message.id] = message
+        if message.idempotency_key:
+            self.store.idempotency_keys[message.session_id][message.idempotency_key] = message.id
+
+    def _remove(self, message: Message):
+        messages = self._session(message.session_id)
+        del messages[bisect_left(messages, message.seq, key=_seq)]
+        for index in (
+            self.store.type_messages[message.session_id][message.type],
+            self.store.sender_messages[message.session_id][message.sender_id],
+        ):
+            del index[bisect_left(index, _time_order(message), key=_time_order)]
+        del self.store.messages[message.id]
+        if message.idempotency_key:
+            self.store.idempotency_keys[message.session_id].pop(message.idempotency_key, None)
+
+    def _bounds(
+        self,
+        messages: List[Message],
+        upto_seq: Optional[int],
+        after_seq: Optional[int] = None,
+        before_seq: Optional[int] = None,
+    ) -> Tuple[int, int]:
+        """Index range of ``messages`` with after_seq < seq <= upto_seq, seq < before_seq."""
+        lo = bisect_right(messages, after_seq, key=_seq) if after_seq is not None else 0
+        hi = len(messages)
+        if upto_seq is not None:
+            hi = bisect_right(messages, upto_seq, key=_seq, lo=lo, hi=hi)
+        if before_seq is not None:
+            hi = bisect_left(messages, before_seq, key=_seq, lo=lo, hi=hi)
+        return lo, max(lo, hi)
+
+    def _seen(self, message: Message, viewers: List[str]) -> Message:
+        """A copy of ``message`` as the first of ``viewers`` (a chain) sees it."""
+        copied = _copy(message)
+        overrides = self.store.overrides.get(message.id)
+        if overrides:
+            copied.is_recalled = next(
+                (overrides[viewer] for viewer in viewers if viewer in overrides),
+                message.is_recalled,
+            )
+        return copied
+
+    def _snapshot(self, message: Message, session_id: str, is_recalled: bool):
+        """Keep ``is_recalled`` for branches of ``session_id`` that read ``message``."""
+        overrides = self.store.overrides[message.id]
+        for branch in self.store.sessions.values():
+            if branch.parent_session_id == session_id and (branch.fork_seq or 0) >= message.seq:
+                overrides.setdefault(branch.id, is_recalled)
+
+    async def get_by_id(self, id: str) -> Optional[Message]:
+        message = self.store.messages.get(id)
+        return _copy(message) if message else None
+
+    async def get_all(self) -> List[Message]:
+        messages = sorted(self.store.messages.values(), key=lambda m: m.timestamp)
+        return [_copy(message) for message in messages]
+
+    async def create(self, message: Message) -> bool:
+        return await self.create_many([message])
+
+    async def create_many(self, messages: List[Message]) -> bool:
+        """Insert several messages; all or none are written."""
+        ids = {message.id for message in messages}
+        if len(ids) < len(messages) or any(id in self.store.messages for id in ids):
+            return False
+        if any(
+            message.idempotency_key in self.store.idempotency_keys[message.session_id]
+            for message in messages if message.idempotency_key
+        ):
+            return False
+        for message in messages:
+            if message.session_id not in self.store.next_seq:
+                # A branch continues numbering after the prefix it shares.
+                self.store.next_seq[message.session_id] = self.store.first_seq(message.session_id)
+            message.seq = self.store.next_seq[message.session_id]
+            self.store.next_seq[message.session_id] += 1
+            stored = _copy(message)
+            self._insert(stored)
+            self.store.log_change(stored.session_id, stored.id, "insert")
+            self.store.rollups.add_message(stored)
+        return True
+
+    async def update(self, message: Message) -> bool:
+        existing = self.store.messages.get(message.id)
+        if existing is None:
+            return False
+        stored = _copy(message)
+        stored.seq = existing.seq
+        if stored.is_recalled != existing.is_recalled:
+            self._snapshot(existing, existing.session_id, existing.is_recalled)
+        self._remove(existing)
+        self._insert(stored)
+        self.store.log_change(stored.session_id, stored.id, "update")
+        return True
+
+    async def delete(self, id: str) -> bool:
+        message = self.store.messages.get(id)
+        if message is None:
+            return False
+        self._remove(message)
+        # Branches reading the row lose it too; only recalls are per side.
+        self.store.overrides.pop(message.id, None)
+        self.store.log_change(message.session_id, message.id, "delete")
+        return True
+
+    async def get_by_session(
+        self,
+        session_id: str,
+        after_timestamp: Optional[float] = None,
+        limit: Optional[int] = None,
+        before_timestamp: Optional[float] = None,
+        after_seq: Optional[int] = None,
+        before_seq: Optional[int] = None,
+    ) -> List[Message]:
+        def matching(message: Message) -> bool:
+            if after_timestamp is not None and message.timestamp <= after_timestamp:
+                return False
+            if before_timestamp is not None and message.timestamp >= before_timestamp:
+                return False
+            return True
+
+        # Segments cover disjoint seq ranges, newest first; each is walked
+        # in place between its bisected bounds until the page is full.
+        newest_first = limit is not None and after_timestamp is None and after_seq is None
+        segments = self.store.segments(session_id)
+        viewers = [viewer for viewer, _ in segments]
+        if not newest_first:
+            segments = list(reversed(segments))
+
+        page: List[Message] = []
+        for segment_session_id, upto_seq in segments:
+            messages = self._session(segment_session_id)
+            lo, hi = self._bounds(messages, upto_seq, after_seq, before_seq)
+            positions = range(hi - 1, lo - 1, -1) if newest_first else range(lo, hi)
+            for position in positions:
+                if limit is not None and len(page) >= limit:
+                    break
+                if matching(messages[position]):
+                    page.append(messages[position])
+            if limit is not None and len(page) >= limit:
+                break
+
+        if newest_first:
+            page.reverse()
+        return [self._seen(message, viewers) for message in page]
+
+    async def get_by_idempotency_key(
+        self, session_id: str, idempotency_key: str
+    ) -> Optional[Message]:
+        message_id = self.store.idempotency_keys.get(session_id, {}).get(idempotency_key)
+        return await self.get_by_id(message_id) if message_id else None
+
+    async def get_latest(self, session_id: str) -> Optional[Message]:
+        segments = self.store.segments(session_id)
+        for segment_session_id, upto_seq in segments:
+            messages = self._session(segment_session_id)
+            lo, hi = self._bounds(messages, upto_seq)
+            if hi > lo:
+                return self._seen(messages[hi - 1], [viewer for viewer, _ in segments])
+        return None
+
+    async def get_latest_by_type(
+        self, session_id: str, message_type: str
+    ) -> Optional[Message]:
+        messages = self._of_type(session_id, message_type)
+        return _copy(messages[-1]) if messages else None
+
+    async def exists_by_type(self, session_id: str, message_type: str) -> bool:
+        return bool(self._of_type(session_id, message_type))
+
+    async def get_by_type(
+        self, session_id: str, message_type: str, include_recalled: bool = True
+    ) -> List[Message]:
+        return [
+            _copy(m) for m in self._of_type(session_id, message_type)
+            if include_recalled or not m.is_recalled
+        ]
+
+    async def get_by_sender_since(
+        self, session_id: str, sender_id: str, since_timestamp: float
+    ) -> List[Message]:
+        senders = self.store.sender_messages.get(session_id)
+        messages = senders.get(sender_id, []) if senders else []
+        start = bisect_left(messages, since_timestamp, key=lambda m: m.timestamp)
+        return [_copy(m) for m in messages[start:]]
+
+    async def search(
+        self,
+        session_id: str,
+        query: str,
+        limit: int,
+        before_timestamp: Optional[float] = None,
+    ) -> List[Message]:
+        tokens = [token.lower() for token in tokenize_query(query)]
+        if not tokens:
+            return []
+        results = []
+        for message in reversed(self._session(session_id)):
+            if len(results) >= limit:
+                break
+            if message.type != MessageType.TEXT or message.is_recalled or not message.content:
+                continue
+            if before_timestamp is not None and message.timestamp >= before_timestamp:
+                continue
+            words = set(tokenize_for_index(message.content).lower().split())
+            if all(token in words for token in tokens):
+                results.append(_copy(message))
+        return results
+
+    async def update_recalled_status(
+        self, message_id: str, is_recalled: bool, session_id: Optional[str] = None
+    ) -> bool:
+        message = self.store.messages.get(message_id)
+        if message is None:
+            return False
+        segments = self.store.segments(session_id) if session_id else []
+        depth = next(
+            (
+                depth for depth, (segment_session_id, upto_seq) in enumerate(segments)
+                if depth and segment_session_id == message.session_id and message.seq <= upto_seq
+            ),
+            None,
+        )
+        if depth is None:
+            if message.is_recalled != is_recalled:
+                self._snapshot(message, message.session_id, message.is_recalled)
+                message.is_recalled = is_recalled
+                self.store.log_change(message.session_id, message.id, "update")
+            return True
+
+        seen = self._seen(message, [viewer for viewer, _ in segments[:depth]]).is_recalled
+        if seen != is_recalled:
+            self._snapshot(message, session_id, seen)
+            self.store.overrides[message.id][session_id] = is_recalled
+            self.store.log_change(session_id, message.id, "update")
+        return True
+
+    async def supersede_state_messages(
+        self, session_id: str, message_type: str, keep_id: str
+    ) -> int:
+        keep = self.store.messages.get(keep_id)
+        if keep is None:
+            return 0
+        updated = 0
+        for message in self._of_type(session_id, message_type):
+            if (
+                not message.is_recalled
+                and message.id != keep_id
+                and message.timestamp <= keep.timestamp
+            ):
+                self._snapshot(message, session_id, False)
+                message.is_recalled = True
+                self.store.log_change(session_id, message.id, "update")
+                updated += 1
+        return updated
+
+    async def update_read_status_until(
+        self, session_id: str, until_timestamp: float, is_read: bool = True
+    ) -> int:
+        updated = 0
+        for message in self._session(session_id):
+            if message.timestamp <= until_timestamp and not message.is_recalled:
+                if message.is_read != is_read:
+                    message.is_read = is_read
+                    self.store.log_change(session_id, message.id, "update")
+                updated += 1
+        return updated
+
+    async def get_last_read_timestamp(self, session_id: str) -> float:
+        return max(
+            (
+                m.timestamp for m in self._session(session_id)
+                if m.is_read and not m.is_recalled
+            ),
+            default=0.0,
+        )
+
+    async def get_changes(
+        self, session_id: str, after_change: int, limit: int
+    ) -> MessageChanges:
+        changes = self.store.changes.get(session_id, [])
+        start = bisect_right(changes, after_change, key=lambda change: change[0])
+        page = changes[start:start + limit + 1]
+        has_more = len(page) > limit
+        page = page[:limit]
+
+        latest: Dict[str, int] = {}
+        for change_id, message_id, _ in page:
+            latest.pop(message_id, None)
+            latest[message_id] = change_id
+        messages = [self.store.messages.get(message_id) for message_id in latest]
+        viewers = [viewer for viewer, _ in self.store.segments(session_id)]
+        return MessageChanges(
+            messages=[self._seen(message, viewers) for message in messages if message is not None],
+            deleted_ids=[
+                message_id for message_id in latest if message_id not in self.store.messages
+            ],
+            cursor=page[-1][0] if page else after_change,
+            has_more=has_more,
+        )
+
+    async def get_change_cursor(self, session_id: str) -> int:
+        return self.store.change_head
+
+    async def get_stats(self, session_id: str, days: int = 30) -> SessionStats:
+        return self.store.rollups.session_stats(session_id, days)
+
+    async def delete_by_session(self, session_id: str) -> bool:
+        for message in self.store.session_messages.pop(session_id, []):
+            del self.store.messages[message.id]
+            self.store.overrides.pop(message.id, None)
+        for overrides in self.store.overrides.values():
+            overrides.pop(session_id, None)
+        self.store.type_messages.pop(session_id, None)
+        self.store.sender_messages.pop(session_id, None)
+        self.store.changes.pop(session_id, None)
+        self.store.next_seq.pop(session_id, None)
+        self.store.idempotency_keys.pop(session_id, None)
+        self.store.rollups.forget(session_id)
+        return True
+
+    async def delete_by_type(self, session_id: str, message_type: str) -> bool:
+        for message in list(self._of_type(session_id, message_type)):
+            self._remove(message)
+            self.store.overrides.pop(message.id, None)
+            self.store.log_change(session_id, message.id, "delete")
+        return True
+
+
+class MemoryCharacterRepository(ICharacterRepository):
+    def __init__(self, store: MemoryStore):
+        self.store = store
+
+    async def get_by_id(self, id: str) -> Optional[Character]:
+        character = self.store.characters.get(id)
+        return _copy(character) if character else None
+
+    async def get_all(self) -> List[Character]:
+        return [_copy(character) for character in self.store.characters.values()]
+
+    async def create(self, character: Character) -> bool:
+        if character.id in self.store.characters:
+            return False
+        stored = _copy(character)
+        stored.created_at = stored.created_at or datetime.now()
+        stored.updated_at = stored.updated_at or stored.created_at
+        self.store.characters[stored.id] = stored
+        self.store.bump("characters")
+        return True
+
+    async def update(self, character: Character) -> bool:
+        existing = self.store.characters.get(character.id)
+        if existing is None:
+            return False
+        stored = _copy(character)
+        stored.created_at = existing.created_at
+        stored.updated_at = datetime.now()
+        self.store.characters[stored.id] = stored
+        self.store.bump("characters")
+        return True
+
+    async def delete(self, id: str) -> bool:
+        if self.store.characters.pop(id, None) is None:
+            return False
+        self.store.bump("characters")
+        # Sessions reference characters with ON DELETE CASCADE.
+        orphaned = [s.id for s in self.store.sessions.values() if s.character_id == id]
+        for session_id in orphaned:
+            del self.store.sessions[session_id]
+        if orphaned:
+            self.store.bump("sessions")
+        return True
+
+
+class MemorySessionRepository(ISessionRepository):
+    def __init__(self, store: MemoryStore):
+        self.store = store
+
+    async def get_by_id(self, id: str) -> Optional[Session]:
+        session = self.store.sessions.get(id)
+        return _copy(session) if session else None
+
+    async def get_all(self) -> List[Session]:
+        return [_copy(session) for session in self.store.sessions.values()]
+
+    async def create(self, session: Session) -> bool:
+        if session.id in self.store.sessions or session.character_id not in self.store.characters:
+            return False
+        if session.parent_session_id is None:
+            if any(
+                s.character_id == session.character_id and s.parent_session_id is None
+                for s in self.store.sessions.values()
+            ):
+                return False
+        elif session.parent_session_id not in self.store.sessions:
+            return False
+        stored = _copy(session)
+        stored.created_at = stored.created_at or datetime.now()
+        self.store.sessions[stored.id] = stored
+        self.store.bump("sessions")
+        return True
+
+    async def update(self, session: Session) -> bool:
+        existing = self.store.sessions.get(session.id)
+        if existing is None:
+            return False
+        existing.character_id = session.character_id
+        existing.is_active = session.is_active
+        self.store.bump("sessions")
+        return True
+
+    async def delete(self, id: str) -> bool:
+        if id not in self.store.sessions:
+            return False
+        for branch in self._branches(id):
+            del self.store.sessions[branch.id]
+        del self.store.sessions[id]
+        self.store.bump("sessions")
+        return True
+
+    async def get_by_character(self, character_id: str) -> Optional[Session]:
+        session = next(
+            (
+                s for s in self.store.sessions.values()
+                if s.character_id == character_id and s.parent_session_id is None
+            ),
+            None,
+        )
+        return _copy(session) if session else None
+
+    async def get_branches(self, session_id: str) -> List[Session]:
+        return [_copy(session) for session in self._branches(session_id)]
+
+    def _branches(self, session_id: str) -> List[Session]:
+        found, parents = [], {session_id}
+        for session in sorted(self.store.sessions.values(), key=lambda s: s.created_at):
+            if session.parent_session_id in parents:
+                found.append(session)
+                parents.add(session.id)
+        return found
+
+    async def get_active_session(self) -> Optional[Session]:
+        session = next((s for s in self.store.sessions.values() if s.is_active), None)
+        return _copy(session) if session else None
+
+    async def set_active_session(self, session_id: str) -> bool:
+        for session in self.store.sessions.values():
+            session.is_active = session.id == session_id
+        self.store.bump("sessions")
+        return session_id in self.store.sessions
+
+
+class MemoryConfigRepository(IConfigRepository):
+    def __init__(self, store: MemoryStore):
+        self.store = store
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self.get_config(key)
+
+    async def set(self, key: str, value: str) -> bool:
+        return await self.set_config(key, value)
+
+    async def delete(self, key: str) -> bool:
+        if self.store.config.pop(key, None) is None:
+            return False
+        self.store.bump("app_config")
+        return True
+
+    async def get_config(self, key: str) -> Optional[str]:
+        return self.store.config.get(key)
+
+    async def get_all_config(self) -> Dict[str, str]:
+        return dict(self.store.config)
+
+    async def set_config(self, key: str, value: str) -> bool:
+        self.store.config[key] = value
+        self.store.bump("app_config")
+        return True
+
+    async def set_config_batch(self, config: Dict[str, str]) -> bool:
+        self.store.config.update(config)
+        self.store.bump("app_config")
+        return True
+
+    async def get_user_avatar(self, user_id: str) -> Optional[str]:
+        return self.store.avatars.get(user_id)
+
+    async def set_user_avatar(self, avatar_data: str, user_id: str) -> bool:
+        self.store.avatars[user_id] = avatar_data
+        self.store.bump("user_settings")
+        return True
+
+    async def delete_user_avatar(self, user_id: str) -> bool:
+        if user_id in self.store.avatars:
+            self.store.avatars[user_id] = None
+            self.store.bump("user_settings")
+        return True
+
+    async def get_table_versions(self) -> Dict[str, int]:
+        return dict(self.store.table_versions)
+
+
+class MemorySessionStateRepository(ISessionStateRepository):
+    def __init__(self, store: MemoryStore):
+        self.store = store
+
+    async def get_state(self, session_id: str, key: str) -> Optional[Any]:
+        state = self.store.session_state.get(session_id, {})
+        return copy.deepcopy(state.get(key))
+
+    async def get_all_state(self, session_id: str) -> Dict[str, Any]:
+        return copy.deepcopy(self.store.session_state.get(session_id, {}))
+
+    async def set_state(self, session_id: str, key: str, value: Any) -> bool:
+        self.store.session_state[session_id][key] = copy.deepcopy(value)
+        return True
+
+    async def delete_by_session(self, session_id: str) -> bool:
+        self.store.session_state.pop(session_id, None)
+        return True
@@ -0,0 +1,84 @@
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.core.models.character import Character
+from src.core.models.message import Message
+from src.core.models.session import Session
+from src.infrastructure.database.branches import Segment, chain_segments
+from src.infrastructure.database.rollups import MessageRollups
+
+
+class MemoryStore:
+    """
+    Process-local tables behind the in-memory repositories.
+
+    One instance plays the role of a :class:`DatabaseConnection`: every
+    in-memory repository built on it sees the same data. Nothing is
+    persisted. All access happens on the event loop and no method awaits
+    while it mutates state, so no locking is needed.
+
+    Each session's messages are kept in one list in ``seq`` order, the order
+    they were inserted in, so cursors are bisections into that list. Per
+    session there are also lists by type and by sender, ordered by
+    ``(timestamp, seq)`` like the SQLite indexes the same queries use, so
+    those lookups bisect rather than scan.
+    """
+
+    def __init__(self):
+        self.characters: Dict[str, Character] = {}
+        self.sessions: Dict[str, Session] = {}
+        self.config: Dict[str, str] = {}
+        self.avatars: Dict[str, Optional[str]] = {}
+        self.session_state: Dict[str, Dict[str, Any]] = defaultdict(dict)
+
+        self.messages: Dict[str, Message] = {}
+        self.session_messages: Dict[str, List[Message]] = defaultdict(list)
+        # session_id -> type / sender_id -> messages by (timestamp, seq)
+        self.type_messages: Dict[str, Dict[str, List[Message]]] = defaultdict(
+            lambda: defaultdict(list)
+        )
+        self.sender_messages: Dict[str, Dict[str, List[Message]]] = defaultdict(
+            lambda: defaultdict(list)
+        )
+        self.next_seq: Dict[str, int] = defaultdict(lambda: 1)
+        # message id -> branch session_id -> recalled status it sees
+        self.overrides: Dict[str, Dict[str, bool]] = defaultdict(dict)
+        # session_id -> idempotency key -> message id
+        self.idempotency_keys: Dict[str, Dict[str, str]] = defaultdict(dict)
+
+        # Per-session change feed entries: (change_id, message_id, op).
+        self.changes: Dict[str, List[Tuple[int, str, str]]] = defaultdict(list)
+        self.change_head = 0
+        self.rollups = MessageRollups()
+
+        self.table_versions: Dict[str, int] = {
+            "app_config": 0, "user_settings": 0, "characters": 0, "sessions": 0,
+        }
+
+    def log_change(self, session_id: str, message_id: str, op: str):
+        self.change_head += 1
+        self.changes[session_id].append((self.change_head, message_id, op))
+
+    def segments(self, session_id: str) -> List[Segment]:
+        """Where a session's history is read from; see :class:`SessionBranches`."""
+        chain = []
+        session = self.sessions.get(session_id)
+        while session is not None:
+            chain.append((session.id, session.fork_seq))
+            session = self.sessions.get(session.parent_session_id or "")
+        return chain_segments(chain) if chain else [(session_id, None)]
+
+    def first_seq(self, session_id: str) -> int:
+        session = self.sessions.get(session_id)
+        return (session.fork_seq or 0) + 1 if session else 1
+
+    def bump(self, table: str):
+        self.table_versions[table] += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "characters": len(self.characters),
+            "sessions": len(self.sessions),
+            "messages": len(self.messages),
+            "changes": sum(len(changes) for changes in self.changes.values()),
+        }
@@ -178,13 +178,68 @@ class CharacterService:
 
         session = await self.session_repo.get_by_character(character_id)
         if session:
-            await self.session_repo.delete(session.id)
+            await self._delete_session(session.id)
 
         return await self.character_repo.delete(character_id)
 
     async def get_character_session(self, character_id: str) -> Optional[Session]:
         return await self.session_repo.get_by_character(character_id)
 
+    async def get_branches(self, session_id: str) -> List[Session]:
+        return await self.session_repo.get_branches(session_id)
+
+    async def fork_session(
+        self, session_id: str, at_seq: Optional[int] = None
+    ) -> Optional[Session]:
+        """
+        Branch a session after message ``at_seq`` (default: its newest message).
+
+        The branch shares the parent's history up to ``at_seq`` instead of
+        copying it and stores only the messages written to it afterwards.
+        Returns None if the session does not exist; raises ValueError if
+        ``at_seq`` is not in its history.
+        """
+        parent = await self.session_repo.get_by_id(session_id)
+        if not parent:
+            return None
+
+        latest = await self.message_service.get_latest_message(session_id)
+        if not latest:
+            raise ValueError(f"Session {session_id} has no messages to branch from")
+        if at_seq is None:
+            at_seq = latest.seq
+        if not 0 < at_seq <= latest.seq:
+            raise ValueError(f"seq must be between 1 and {latest.seq}")
+
+        branch = Session(
+            id=f"session-{uuid.uuid4().hex[:12]}",
+            character_id=parent.character_id,
+            is_active=False,
+            parent_session_id=parent.id,
+            fork_seq=at_seq,
+        )
+        if not await self.session_repo.create(branch):
+            return None
+        await self.message_service.init_branch_state(branch.id)
+
+        logger.info(f"Branched session {session_id} at seq {at_seq} into {branch.id}")
+        return await self.session_repo.get_by_id(branch.id)
+
+    async def delete_branch(self, session_id: str) -> bool:
+        """Delete a branch session and the branches forked from it."""
+        session = await self.session_repo.get_by_id(session_id)
+        if not session or not session.parent_session_id:
+            return False
+        await self._delete_session(session_id)
+        return True
+
+    async def _delete_session(self, session_id: str):
+        # Branch rows go with their parent by cascade; their messages do not.
+        branches = await self.session_repo.get_branches(session_id)
+        await self.session_repo.delete(session_id)
+        for sid in [session_id] + [branch.id for branch in branches]:
+            await self.message_service.delete_session(sid)
+
     async def switch_active_session(self, session_id: str) -> bool:
         return await self.session_repo.set_active_session(session_id)
 
@@ -196,7 +251,7 @@ class CharacterService:
 
             old_session = await self.session_repo.get_by_character(character_id)
             if old_session:
-                await self.session_repo.delete(old_session.id)
+                await self._delete_session(old_session.id)
 
             new_session_id = f"session-{uuid.uuid4().hex[:12]}"
             session = Session(
@@ -1,3 +1,5 @@
+import hashlib
+import json
 import logging
 from typing import Dict, Optional
 from src.core.interfaces.repositories import IConfigRepository
@@ -50,14 +52,11 @@ class ConfigService:
 
     async def compute_hash(self) -> str:
         try:
-            app_hash = await self.config_repo.compute_hash("app_config")
-            user_hash = await self.config_repo.compute_hash("user_settings")
-            char_hash = await self.config_repo.compute_hash("characters")
-            session_hash = await self.config_repo.compute_hash("sessions")
-
-            combined = f"{app_hash}{user_hash}{char_hash}{session_hash}"
-            import hashlib
+            versions = await self.config_repo.get_table_versions()
+            if not versions:
+                return ""
 
+            combined = json.dumps(versions, sort_keys=True)
             return hashlib.sha256(combined.encode()).hexdigest()
         except Exception as e:
             logger.error(f"Error computing hash: {e}", exc_info=True)
@@ -1,13 +1,18 @@
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta, timezone
 import random
 import uuid
 from src.core.models.message import (
     Message,
+    MessageChanges,
     MessageType,
+    SessionStats,
     ALLOWED_SYSTEM_MESSAGE_TYPES,
 )
-from src.core.interfaces.repositories import IMessageRepository
+from src.core.interfaces.repositories import (
+    IMessageRepository,
+    ISessionStateRepository,
+)
 from src.core.utils.logger import (
     unified_logger,
     broadcast_log_if_needed,
@@ -17,10 +22,20 @@ from src.core.utils.logger import (
 # Time message interval in seconds - SINGLE SOURCE OF TRUTH
 TIME_MESSAGE_INTERVAL = 300
 
+# Keys in the per-session state store
+STATE_EMOTION = "emotion"
+STATE_BLOCKED = "blocked"
+STATE_TYPING_PREFIX = "typing:"
+
 
 class MessageService:
-    def __init__(self, message_repo: IMessageRepository):
+    def __init__(
+        self,
+        message_repo: IMessageRepository,
+        state_repo: ISessionStateRepository,
+    ):
         self.message_repo = message_repo
+        self.state_repo = state_repo
 
     async def _ensure_system_invariants(
         self, session_id: str, sender_id: str, message_type: MessageType
@@ -51,7 +66,8 @@ class MessageService:
         content: str,
         metadata: Dict = None,
         message_id: Optional[str] = None,
-    ) -> Message:
+    ) -> Optional[Message]:
+        """Send a message; returns None if it could not be stored."""
         messages = await self.send_message_with_time(
             session_id=session_id,
             sender_id=sender_id,
@@ -60,7 +76,7 @@ class MessageService:
             metadata=metadata,
             message_id=message_id,
         )
-        return messages[-1]
+        return messages[-1] if messages else None
 
     async def send_message_with_time(
         self,
@@ -73,14 +89,68 @@ class MessageService:
     ) -> List[Message]:
         """
         Send a message and, if needed, insert a system-time message before it.
-        Returns ordered list: [time_msg?, message].
+        Returns ordered list: [time_msg?, message], or [] if nothing could be
+        stored.
+        """
+        messages, created = await self._send_with_time(
+            session_id, sender_id, message_type, content, metadata, message_id
+        )
+        return messages if created else []
+
+    async def send_message_idempotent(
+        self,
+        session_id: str,
+        sender_id: str,
+        message_type: MessageType,
+        content: str,
+        metadata: Dict = None,
+        idempotency_key: Optional[str] = None,
+    ) -> Tuple[List[Message], bool]:
         """
+        Like send_message_with_time, but a resend with an idempotency key the
+        session already has writes nothing. Returns (messages, created); for
+        a duplicate that is ([the message sent first], False), and if nothing
+        could be stored it is ([], False).
+        """
+        idempotency_key = (idempotency_key or "").strip() or None
+        if idempotency_key:
+            existing = await self.message_repo.get_by_idempotency_key(
+                session_id, idempotency_key
+            )
+            if existing:
+                return [existing], False
+
+        messages, created = await self._send_with_time(
+            session_id, sender_id, message_type, content, metadata,
+            idempotency_key=idempotency_key,
+        )
+        if created:
+            return messages, True
+        if idempotency_key:
+            # A concurrent send with the same key got in first.
+            existing = await self.message_repo.get_by_idempotency_key(
+                session_id, idempotency_key
+            )
+            if existing:
+                return [existing], False
+        return [], False
+
+    async def _send_with_time(
+        self,
+        session_id: str,
+        sender_id: str,
+        message_type: MessageType,
+        content: str,
+        metadata: Dict = None,
+        message_id: Optional[str] = None,
+        idempotency_key: Optional[str] = None,
+    ) -> Tuple[List[Message], bool]:
         metadata = metadata or {}
         timestamp = datetime.now(timezone.utc).timestamp()
 
         await self._ensure_system_invariants(session_id, sender_id, message_type)
 
-        time_msg = await self._insert_time_message_if_needed(session_id, timestamp)
+        time_msg = await self._build_time_message_if_needed(session_id, timestamp)
 
         if message_id is None:
             message_id = f"msg-{uuid.uuid4().hex[:12]}"
@@ -96,12 +166,14 @@ class MessageService:
             is_recalled=False,
             is_read=False,
             timestamp=timestamp,
+            idempotency_key=idempotency_key,
         )
 
-        await self.message_repo.create(message)
+        messages = [m for m in [time_msg, message] if m is not None]
+        created = await self.message_repo.create_many(messages)
         await self.set_typing_state(session_id, sender_id, False)
 
-        return [m for m in [time_msg, message] if m is not None]
+        return messages, created
 
     async def recall_message(
         self, session_id: str, message_id: str, timestamp: float, recalled_by: str
@@ -123,7 +195,7 @@ class MessageService:
             await broadcast_log_if_needed(log_entry)
             return None
 
-        await self.message_repo.update_recalled_status(message_id, True)
+        await self.message_repo.update_recalled_status(message_id, True, session_id)
 
         recall_id = f"recall-{uuid.uuid4().hex[:12]}"
         recall_message = Message(
@@ -142,7 +214,8 @@ class MessageService:
             timestamp=datetime.now(timezone.utc).timestamp(),
         )
 
-        await self.message_repo.create(recall_message)
+        if not await self.message_repo.create(recall_message):
+            return None
         return recall_message
 
     async def create_session(
@@ -170,7 +243,6 @@ class MessageService:
                 is_read=False,
                 timestamp=base_timestamp,
             )
-            await self.message_repo.create(time_msg)
 
             hint_msg = Message(
                 id=f"hint-{uuid.uuid4().hex[:12]}",
@@ -183,10 +255,9 @@ class MessageService:
                 is_read=True,
                 timestamp=base_timestamp + 1,
             )
-            await self.message_repo.create(hint_msg)
 
             user_nickname = user_nickname or "用户"
-            greeting_msg = Message(
+            user_greeting_msg = Message(
                 id=f"greeting-{uuid.uuid4().hex[:12]}",
                 session_id=session_id,
                 sender_id="user",
@@ -197,9 +268,8 @@ class MessageService:
                 is_read=True,
                 timestamp=base_timestamp + 2,
             )
-            await self.message_repo.create(greeting_msg)
 
-            greeting_msg = Message(
+            assistant_greeting_msg = Message(
                 id=f"greeting-{uuid.uuid4().hex[:12]}",
                 session_id=session_id,
                 sender_id="assistant",
@@ -210,9 +280,8 @@ class MessageService:
                 is_read=True,
                 timestamp=base_timestamp + 3,
             )
-            await self.message_repo.create(greeting_msg)
 
-            hint_msg = Message(
+            intro_hint_msg = Message(
                 id=f"hint-{uuid.uuid4().hex[:12]}",
                 session_id=session_id,
                 sender_id="system",
@@ -223,9 +292,17 @@ class MessageService:
                 is_read=True,
                 timestamp=base_timestamp + 4,
             )
-            await self.message_repo.create(hint_msg)
 
-            return True
+            # All greeting messages are written in one transaction.
+            return await self.message_repo.create_many(
+                [
+                    time_msg,
+                    hint_msg,
+                    user_greeting_msg,
+                    assistant_greeting_msg,
+                    intro_hint_msg,
+                ]
+            )
         except Exception as e:
             log_entry = unified_logger.error(
                 f"Error creating session: {e}",
@@ -236,16 +313,106 @@ class MessageService:
             return False
 
     async def delete_session(self, session_id: str) -> bool:
+        await self.state_repo.delete_by_session(session_id)
         return await self.message_repo.delete_by_session(session_id)
 
+    async def init_branch_state(self, branch_session_id: str):
+        """
+        Set a new branch's emotion and blocked state from the history it shares.
+
+        The state is what the shared prefix says at the fork point, not the
+        parent's current state, which may have moved on since.
+        """
+        history = await self.message_repo.get_by_session(branch_session_id)
+        emotion = next(
+            (m.metadata for m in reversed(history) if m.type == MessageType.SYSTEM_EMOTION),
+            None,
+        )
+        if emotion:
+            await self.state_repo.set_state(branch_session_id, STATE_EMOTION, emotion)
+        if any(m.type == MessageType.SYSTEM_BLOCKED for m in history):
+            await self.state_repo.set_state(branch_session_id, STATE_BLOCKED, True)
+
     async def get_message(self, message_id: str) -> Optional[Message]:
         return await self.message_repo.get_by_id(message_id)
 
+    async def get_latest_message(self, session_id: str) -> Optional[Message]:
+        return await self.message_repo.get_latest(session_id)
+
     async def get_messages(
         self, session_id: str, after_timestamp: Optional[float] = None
     ) -> List[Message]:
         return await self.message_repo.get_by_session(session_id, after_timestamp)
 
+    async def get_message_page(
+        self,
+        session_id: str,
+        limit: int,
+        before_timestamp: Optional[float] = None,
+        after_timestamp: Optional[float] = None,
+        after_seq: Optional[int] = None,
+        before_seq: Optional[int] = None,
+    ) -> Tuple[List[Message], bool]:
+        """
+        Return one page of messages and whether more exist past it.
+
+        Pages walk backwards from ``before_seq``/``before_timestamp`` (or the
+        newest message) unless ``after_seq`` or ``after_timestamp`` is given,
+        in which case they walk forwards. ``before_seq`` is exact; several
+        messages can share a timestamp, and a page boundary falling between
+        them skips the rest with ``before_timestamp``.
+        """
+        messages = await self.message_repo.get_by_session(
+            session_id,
+            after_timestamp=after_timestamp,
+            limit=limit + 1,
+            before_timestamp=before_timestamp,
+            after_seq=after_seq,
+            before_seq=before_seq,
+        )
+        has_more = len(messages) > limit
+        if not has_more:
+            return messages, False
+        if after_timestamp is None and after_seq is None:
+            return messages[1:], True
+        return messages[:limit], True
+
+    async def get_message_changes(
+        self, session_id: str, after_change: int, limit: int
+    ) -> MessageChanges:
+        return await self.message_repo.get_changes(session_id, after_change, limit)
+
+    async def get_change_cursor(self, session_id: str) -> int:
+        return await self.message_repo.get_change_cursor(session_id)
+
+    async def get_session_stats(self, session_id: str, days: int = 30) -> SessionStats:
+        return await self.message_repo.get_stats(session_id, days)
+
+    async def search_messages(
+        self,
+        session_id: str,
+        query: str,
+        limit: int,
+        before_timestamp: Optional[float] = None,
+    ) -> Tuple[List[Message], bool]:
+        """Return one page of search hits (newest first) and whether more exist."""
+        messages = await self.message_repo.search(
+            session_id, query, limit + 1, before_timestamp
+        )
+        return messages[:limit], len(messages) > limit
+
+    async def get_latest_message_by_type(
+        self, session_id: str, message_type: MessageType
+    ) -> Optional[Message]:
+        return await self.message_repo.get_latest_by_type(session_id, message_type)
+
+    async def get_messages_by_sender_since(
+        self, session_id: str, sender_id: str, since_timestamp: float
+    ) -> List[Message]:
+        return await self.message_repo.get_by_sender_since(
+            session_id, sender_id, since_timestamp
+        )
+
     async def mark_read_until(self, session_id: str, until_timestamp: float) -> float:
         """
         Mark all non-recalled messages with timestamp <= until_timestamp as read.
@@ -262,6 +429,12 @@ class MessageService:
     async def set_typing_state(
         self, session_id: str, user_id: str, is_typing: bool
     ) -> Message:
+        """
+        Record typing state in the session state store.
+
+        Typing is ephemeral and is not written to the message log; the
+        returned message is only meant for broadcasting to clients.
+        """
         typing_id = f"typing-{uuid.uuid4().hex[:12]}"
         typing_msg = Message(
             id=typing_id,
@@ -275,8 +448,9 @@ class MessageService:
             timestamp=datetime.now(timezone.utc).timestamp(),
         )
 
-        await self.message_repo.create(typing_msg)
-        await self._cleanup_old_state_messages(session_id, MessageType.SYSTEM_TYPING)
+        await self.state_repo.set_state(
+            session_id, f"{STATE_TYPING_PREFIX}{user_id}", is_typing
+        )
 
         return typing_msg
 
@@ -296,49 +470,58 @@ class MessageService:
             timestamp=datetime.now(timezone.utc).timestamp(),
         )
 
+        # The emotion row stays in the log as a conversation event (LLM history
+        # and the client theme read it); the current state is keyed separately.
+        await self.state_repo.set_state(session_id, STATE_EMOTION, emotion_map)
         await self.message_repo.create(emotion_msg)
-        await self._cleanup_old_state_messages(session_id, MessageType.SYSTEM_EMOTION)
+        await self.message_repo.supersede_state_messages(
+            session_id, MessageType.SYSTEM_EMOTION, emotion_msg.id
+        )
 
         return emotion_msg
 
+    async def block_session(self, session_id: str) -> Optional[Message]:
+        """
+        Append a SYSTEM_BLOCKED message and mark the session as blocked.
+        Returns None, leaving the session unblocked, if it could not be stored.
+        """
+        blocked_msg = await self.send_message(
+            session_id=session_id,
+            sender_id="system",
+            message_type=MessageType.SYSTEM_BLOCKED,
+            content="",
+            metadata={},
+        )
+        if blocked_msg:
+            await self.state_repo.set_state(session_id, STATE_BLOCKED, True)
+        return blocked_msg
+
     async def get_latest_emotion_state(
         self, session_id: str
     ) -> Optional[Dict[str, str]]:
-        messages = await self.message_repo.get_by_session(session_id)
-        for msg in reversed(messages):
-            if msg.type == MessageType.SYSTEM_EMOTION:
-                return msg.metadata
-        return None
+        return await self.state_repo.get_state(session_id, STATE_EMOTION)
 
     async def get_latest_typing_state(self, session_id: str, user_id: str) -> bool:
-        messages = await self.message_repo.get_by_session(session_id)
-        for msg in reversed(messages):
-            if (
-                msg.type == MessageType.SYSTEM_TYPING
-                and msg.metadata.get("user_id") == user_id
-            ):
-                return msg.metadata.get("is_typing", False)
-        return False
+        state = await self.state_repo.get_state(
+            session_id, f"{STATE_TYPING_PREFIX}{user_id}"
+        )
+        return bool(state)
 
     async def is_session_blocked(self, session_id: str) -> bool:
         """
         Check if a session is in blocked state.
-        A session is blocked if there's any SYSTEM_BLOCKED message in history.
+        A session is blocked once block_session has been called for it.
         """
-        messages = await self.message_repo.get_by_session(session_id)
-        for msg in messages:
-            if msg.type == MessageType.SYSTEM_BLOCKED:
-                return True
-        return False
+        return bool(await self.state_repo.get_state(session_id, STATE_BLOCKED))
 
-    async def _insert_time_message_if_needed(
+    async def _build_time_message_if_needed(
         self, session_id: str, reference_timestamp: float
     ) -> Optional[Message]:
-        messages = await self.message_repo.get_by_session(session_id)
-        if not messages:
+        """Return an unsaved SYSTEM_TIME message if the gap since the last message warrants one."""
+        last_message = await self.message_repo.get_latest(session_id)
+        if not last_message:
             return None
 
-        last_message = messages[-1]
         time_gap = reference_timestamp - last_message.timestamp
 
         if time_gap > TIME_MESSAGE_INTERVAL:
@@ -352,26 +535,10 @@ class MessageService:
                 metadata={},
                 is_recalled=False,
                 is_read=False,
-                # Slightly earlier to ensure ordering before the real message.
+                # Inserted just before the real message, so it already sorts
+                # first by seq; the earlier timestamp keeps the two consistent.
                 timestamp=reference_timestamp - 0.001,
             )
-
-            await self.message_repo.create(time_msg)
             return time_msg
 
         return None
-
-    async def _cleanup_old_state_messages(
-        self, session_id: str, message_type: MessageType
-    ):
-        messages = await self.message_repo.get_by_session(session_id)
-
-        state_messages = [msg for msg in messages if msg.type == message_type]
-
-        if len(state_messages) <= 1:
-            return
-
-        state_messages.sort(key=lambda m: m.timestamp)
-
-        for old_msg in state_messages[:-1]:
-            await self.message_repo.update_recalled_status(old_msg.id, True)
@@ -178,11 +178,11 @@ class SessionService:
                             # Handle special side effects (blocking, recalling)
                             if tool_name == "block_user" and result.get("success"):
                                 # Broadcast the blocked message
-                                messages = await self.message_service.get_messages(user_message.session_id)
-                                for msg in reversed(messages):
-                                    if msg.type == MessageType.SYSTEM_BLOCKED:
-                                        await self._broadcast_message(msg)
-                                        break
+                                blocked_msg = await self.message_service.get_latest_message_by_type(
+                                    user_message.session_id, MessageType.SYSTEM_BLOCKED
+                                )
+                                if blocked_msg:
+                                    await self._broadcast_message(blocked_msg)
                                 
                                 # Set flag to terminate loop after blocking
                                 should_terminate = True
@@ -520,6 +520,7 @@ class SessionService:
                 "is_recalled": message.is_recalled,
                 "is_read": message.is_read,
                 "timestamp": message.timestamp,
+                "seq": message.seq,
             },
         }
         await self.ws_manager.send_to_conversation(message.session_id, event)
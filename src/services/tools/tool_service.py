@@ -144,18 +144,18 @@ class ToolService:
         Returns:
             Dictionary with list of recallable messages
         """
-        messages = await self.message_service.get_messages(session_id)
         current_time = datetime.now(timezone.utc).timestamp()
         # Claim 2 minutes but actually return 1.5 minutes (90 seconds)
         ninety_seconds_ago = current_time - 90
+        messages = await self.message_service.get_messages_by_sender_since(
+            session_id, "assistant", ninety_seconds_ago
+        )
 
         recallable = []
         for msg in messages:
-            # Must be assistant role, not recalled, and within 1.5 minutes
+            # Must not be recalled and must be a text or image message
             if (
-                msg.sender_id == "assistant"
-                and not msg.is_recalled
-                and msg.timestamp >= ninety_seconds_ago
+                not msg.is_recalled
                 and msg.type in [MessageType.TEXT, MessageType.IMAGE]
             ):
                 recallable.append(
@@ -229,14 +229,10 @@ class ToolService:
         Returns:
             Dictionary with block result
         """
-        # Create a blocked message
-        blocked_msg = await self.message_service.send_message(
-            session_id=session_id,
-            sender_id="system",
-            message_type=MessageType.SYSTEM_BLOCKED,
-            content="",
-            metadata={},
-        )
+        # Create a blocked message and record the blocked state
+        blocked_msg = await self.message_service.block_session(session_id)
+        if not blocked_msg:
+            return {"error": "Failed to block user", "success": False}
 
         return {
             "success": True,
@@ -0,0 +1,35 @@
+"""
+Jieba-based tokenization for the SQLite FTS5 message index.
+
+SQLite cannot call a Python tokenizer, so text is segmented here and stored
+space-separated; the FTS table's unicode61 tokenizer then only splits on
+those spaces. Segmentation uses jieba's default tokenizer, the same
+instance (and dictionary) the typo engine loads.
+"""
+from typing import List
+
+import jieba
+
+
+def _is_word(token: str) -> bool:
+    return any(ch.isalnum() for ch in token)
+
+
+def tokenize_for_index(text: str) -> str:
+    """Segment text for indexing, including sub-words of long CJK words."""
+    if not text:
+        return ""
+    return " ".join(t for t in jieba.cut_for_search(text) if _is_word(t))
+
+
+def tokenize_query(text: str) -> List[str]:
+    """Segment a search query into the words that must all match."""
+    if not text:
+        return []
+    return [t.strip() for t in jieba.cut(text) if _is_word(t)]
+
+
+def build_match_expression(column: str, tokens: List[str]) -> str:
+    """FTS5 MATCH expression requiring every token in ``column``."""
+    phrases = " AND ".join('"' + t.replace('"', '""') + '"' for t in tokens)
+    return f"{column} : ({phrases})"
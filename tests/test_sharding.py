@@ -0,0 +1,59 @@
+import asyncio
+import time
+
+from src.core.configs import DatabaseConfig
+from src.core.models.character import Character
+from src.core.models.message import Message, MessageType
+from src.core.models.session import Session
+from src.infrastructure.database.connection import DatabaseConnection
+from src.infrastructure.database.repositories import (
+    CharacterRepository,
+    MessageRepository,
+    SessionRepository,
+    ShardedMessageRepository,
+)
+
+
+def _keyed_message(message_id: str) -> Message:
+    return Message(
+        id=message_id,
+        session_id="session-1",
+        sender_id="user",
+        type=MessageType.TEXT,
+        content="hello",
+        timestamp=time.time(),
+        idempotency_key="send-1",
+    )
+
+
+def test_moving_into_shards_keeps_idempotency_keys(tmp_path):
+    config = DatabaseConfig(
+        path=str(tmp_path / "chat.db"), archive_path=str(tmp_path / "archive.db")
+    )
+
+    async def scenario():
+        conn = DatabaseConnection(config.path, config)
+        await CharacterRepository(conn).create(
+            Character(id="character-1", name="C", avatar="", persona="p")
+        )
+        await SessionRepository(conn).create(
+            Session(id="session-1", character_id="character-1")
+        )
+        assert await MessageRepository(conn).create(_keyed_message("message-1"))
+        await conn.drain()
+        conn.close()
+
+        sharded = DatabaseConnection(
+            config.path, config.model_copy(update={"message_shards": 2})
+        )
+        try:
+            repo = ShardedMessageRepository(sharded.message_shards)
+            moved = await repo.get_by_idempotency_key("session-1", "send-1")
+            assert moved is not None and moved.id == "message-1"
+            # The pending resend after the restart is recognised, not stored again.
+            assert not await repo.create(_keyed_message("message-2"))
+            assert [m.id for m in await repo.get_by_session("session-1")] == ["message-1"]
+        finally:
+            sharded.close()
+
+    asyncio.run(scenario())